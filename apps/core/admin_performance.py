@@ -0,0 +1,150 @@
+from typing import Callable, Dict, Optional
+
+from django.conf import settings
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+CURSOR_VAR = 'cursor'
+
+_ESTIMATE_SQL = {
+    'postgresql': 'SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)',
+    'mysql': 'SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s',
+    # only filled in after ANALYZE; the first number is the row count
+    'sqlite': 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+}
+
+
+def performance_mode() -> bool:
+    return getattr(settings, 'ADMIN_PERFORMANCE_MODE', True)
+
+
+def estimated_row_count(model, using: str = 'default') -> Optional[int]:
+    connection = connections[using]
+    sql = _ESTIMATE_SQL.get(connection.vendor)
+    if sql is None:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [model._meta.db_table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if not row or row[0] is None:
+        return None
+    try:
+        estimate = int(str(row[0]).split()[0])
+    except ValueError:
+        return None
+    # postgres reports -1 for tables that were never analyzed
+    return estimate if estimate >= 0 else None
+
+
+#unfiltered lists of big tables use the planner's row estimate, everything else
+#counts at most ADMIN_COUNT_CAP rows, so no changelist ever scans the whole table to count it
+class EstimatedCountPaginator(Paginator):
+    count_is_estimate = False
+    count_is_capped = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= getattr(settings, 'ADMIN_ESTIMATED_COUNT_THRESHOLD', 100000):
+                self.count_is_estimate = True
+                return estimate
+        cap = getattr(settings, 'ADMIN_COUNT_CAP', 10000)
+        count = queryset.order_by()[:cap + 1].count()
+        if count > cap:
+            self.count_is_capped = True
+            return cap
+        return count
+
+
+#with the default -pk ordering, pages continue from the last primary key shown
+#(WHERE pk < cursor) instead of OFFSET, so the millionth row costs the same as the first
+class KeysetChangeList(ChangeList):
+    def get_queryset(self, request):
+        if not hasattr(self, 'cursor'):
+            # taken out of params so filter, sort and search links never carry a stale cursor
+            cursor = self.params.pop(CURSOR_VAR, None)
+            try:
+                self.cursor = int(cursor) if cursor is not None else None
+            except ValueError:
+                self.cursor = None
+            self.request = request
+        return super().get_queryset(request)
+
+    @property
+    def keyset(self) -> bool:
+        return (
+            ORDER_VAR not in self.params
+            and tuple(self.model_admin.get_ordering(self.request)) == ('-pk',)
+            and not self.list_editable
+            and not self.show_all
+        )
+
+    def get_results(self, request):
+        self.next_cursor = None
+        if not self.keyset:
+            super().get_results(request)
+            return
+        per_page = self.list_per_page
+        queryset = self.queryset if self.cursor is None else self.queryset.filter(pk__lt=self.cursor)
+        rows = list(queryset[:per_page + 1])
+        self.result_list = rows[:per_page]
+        if len(rows) > per_page:
+            self.next_cursor = self.result_list[-1].pk
+        self.paginator = self.model_admin.get_paginator(request, self.queryset, per_page)
+        self.result_count = self.paginator.count
+        self.show_full_result_count = False
+        self.full_result_count = None
+        self.show_admin_actions = True
+        self.can_show_all = False
+        self.multi_page = self.cursor is not None or self.next_cursor is not None
+
+    @property
+    def first_page_url(self) -> str:
+        return self.get_query_string()
+
+    @property
+    def next_page_url(self) -> str:
+        return self.get_query_string({CURSOR_VAR: self.next_cursor})
+
+
+#ModelAdmin mixin: select_related everywhere (changelist, autocomplete, __str__),
+#estimated counts, keyset pages and index-only search. ADMIN_PERFORMANCE_MODE=False
+#restores django's stock behaviour
+class PerformanceAdminMixin:
+    ordering = ('-pk',)
+    show_full_result_count = False
+    # lookup -> function that normalizes the search term for it (or None); digits also match the pk
+    indexed_search_fields: Dict[str, Optional[Callable[[str], str]]] = {}
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if performance_mode() and self.list_select_related and not isinstance(self.list_select_related, bool):
+            queryset = queryset.select_related(*self.list_select_related)
+        return queryset
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        if not performance_mode():
+            return super().get_paginator(request, queryset, per_page, orphans, allow_empty_first_page)
+        return EstimatedCountPaginator(queryset, per_page, orphans, allow_empty_first_page)
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList if performance_mode() else super().get_changelist(request, **kwargs)
+
+    def get_search_results(self, request, queryset, search_term):
+        if not performance_mode() or not self.indexed_search_fields:
+            return super().get_search_results(request, queryset, search_term)
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        condition = Q(pk=int(term)) if term.isdigit() else Q()
+        for lookup, normalize in self.indexed_search_fields.items():
+            condition |= Q(**{lookup: normalize(term) if normalize else term})
+        return queryset.filter(condition), False
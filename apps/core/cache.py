@@ -0,0 +1,120 @@
+import logging
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+#process-wide hit/miss counters, one pair per namespace
+class CacheStats:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, int]] = defaultdict(lambda: {'hits': 0, 'misses': 0})
+
+    def record(self, namespace: str, *, hits: int = 0, misses: int = 0) -> None:
+        with self._lock:
+            counts = self._counts[namespace]
+            counts['hits'] += hits
+            counts['misses'] += misses
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            result = {}
+            for namespace, counts in self._counts.items():
+                total = counts['hits'] + counts['misses']
+                result[namespace] = {
+                    **counts,
+                    'hit_ratio': counts['hits'] / total if total else None,
+                }
+            return result
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
+
+
+cache_stats = CacheStats()
+
+
+#namespaced, versioned view over one configured cache
+class CacheNamespace:
+    def __init__(self, name: str, *, version: int = 1, timeout=DEFAULT_TIMEOUT, alias: str = DEFAULT_CACHE_ALIAS) -> None:
+        self.name = name
+        self.version = version
+        self.timeout = timeout
+        self.alias = alias
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def key(self, key: Any) -> str:
+        parts = key if isinstance(key, tuple) else (key,)
+        suffix = ':'.join(str(part) for part in parts)
+        return f"{self.name}:v{self.version}:{suffix}"
+
+    def _timeout(self, timeout):
+        return self.timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        value = self.backend.get(self.key(key), _MISSING)
+        if value is _MISSING:
+            cache_stats.record(self.name, misses=1)
+            return default
+        cache_stats.record(self.name, hits=1)
+        return value
+
+    def get_many(self, keys: Iterable[Any]) -> Dict[Any, Any]:
+        mapping = {self.key(key): key for key in keys}
+        found = self.backend.get_many(list(mapping))
+        cache_stats.record(self.name, hits=len(found), misses=len(mapping) - len(found))
+        return {mapping[key]: value for key, value in found.items()}
+
+    def set(self, key: Any, value: Any, timeout=DEFAULT_TIMEOUT) -> None:
+        self.backend.set(self.key(key), value, self._timeout(timeout))
+
+    def set_many(self, mapping: Dict[Any, Any], timeout=DEFAULT_TIMEOUT) -> None:
+        self.backend.set_many({self.key(key): value for key, value in mapping.items()}, self._timeout(timeout))
+
+    def add(self, key: Any, value: Any, timeout=DEFAULT_TIMEOUT) -> bool:
+        return self.backend.add(self.key(key), value, self._timeout(timeout))
+
+    def delete(self, key: Any) -> None:
+        self.backend.delete(self.key(key))
+
+    def delete_many(self, keys: Iterable[Any]) -> None:
+        self.backend.delete_many([self.key(key) for key in keys])
+
+    def get_or_set(self, key: Any, default: Callable[[], Any], timeout=DEFAULT_TIMEOUT) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = default()
+            self.set(key, value, timeout)
+        return value
+
+    #creates the counter when missing. only atomic across processes on redis and memcached;
+    #locmem is per process and the db and file backends read then write, so anything that
+    #enforces a limit should keep its counter in the database instead (see quota_service)
+    def incr(self, key: Any, delta: int = 1, timeout=DEFAULT_TIMEOUT) -> int:
+        full_key = self.key(key)
+        if self.backend.add(full_key, delta, self._timeout(timeout)):
+            return delta
+        try:
+            return self.backend.incr(full_key, delta)
+        except ValueError:
+            # expired between add() and incr()
+            self.backend.set(full_key, delta, self._timeout(timeout))
+            return delta
+
+    def stats(self) -> Optional[Dict[str, Any]]:
+        return cache_stats.snapshot().get(self.name)
+
+
+def get_namespace(name: str, **kwargs) -> CacheNamespace:
+    return CacheNamespace(name, **kwargs)
@@ -0,0 +1,172 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone as dt_timezone
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.decorators import sync_and_async_middleware
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+_REQUEST_ID_META = 'HTTP_' + REQUEST_ID_HEADER.upper().replace('-', '_')
+_REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+correlation_id: contextvars.ContextVar[str] = contextvars.ContextVar('correlation_id', default='-')
+
+# attributes every LogRecord has; anything else came in through extra= and is emitted as-is
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'correlation_id'}
+
+
+def get_correlation_id() -> str:
+    return correlation_id.get()
+
+
+def _request_id(request) -> str:
+    incoming = request.META.get(_REQUEST_ID_META, '')
+    return incoming if _REQUEST_ID_RE.match(incoming) else uuid.uuid4().hex
+
+
+#takes a sane X-Request-ID from the caller or makes one, and echoes it on the response;
+#the context variable follows sync views into the thread sync_to_async runs them on
+@sync_and_async_middleware
+class CorrelationIdMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        request_id = _request_id(request)
+        token = correlation_id.set(request_id)
+        try:
+            response = self.get_response(request)
+        finally:
+            correlation_id.reset(token)
+        response[REQUEST_ID_HEADER] = request_id
+        return response
+
+    async def __acall__(self, request):
+        request_id = _request_id(request)
+        token = correlation_id.set(request_id)
+        try:
+            response = await self.get_response(request)
+        finally:
+            correlation_id.reset(token)
+        response[REQUEST_ID_HEADER] = request_id
+        return response
+
+
+class CorrelationIdFilter(logging.Filter):
+    def filter(self, record):
+        record.correlation_id = correlation_id.get()
+        return True
+
+
+#per message template: `burst` records per `period` seconds, then drop until the window
+#ends; the next record that passes carries how many were dropped. warnings always pass
+class RateLimitFilter(logging.Filter):
+    def __init__(self, burst: int = 20, period: float = 60.0, max_level: int = logging.INFO) -> None:
+        super().__init__()
+        self.burst = burst
+        self.period = period
+        self.max_level = max_level
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > self.max_level:
+            return True
+        key = (record.name, record.msg if isinstance(record.msg, str) else repr(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            started, passed, dropped = self._windows.get(key, (now, 0, 0))
+            if now - started >= self.period:
+                started, passed = now, 0
+            if passed >= self.burst:
+                self._windows[key] = (started, passed, dropped + 1)
+                return False
+            self._windows[key] = (started, passed + 1, 0)
+        if dropped:
+            record.suppressed = dropped
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {
+            'ts': datetime.fromtimestamp(record.created, dt_timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'correlation_id': getattr(record, 'correlation_id', '-'),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and key not in payload:
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload['exc'] = record.exc_text
+        return json.dumps(payload, default=str)
+
+
+#the request thread only interpolates the message and enqueues it; formatting and the
+#write to the stream happen on the listener thread. A full queue drops instead of blocking.
+#threads don't survive fork(), so a forked worker (gunicorn --preload) starts its own
+#listener on a fresh queue instead of filling one nobody drains
+class QueueLogHandler(logging.handlers.QueueHandler):
+    def __init__(self, stream=None, queue_size: int = 10000) -> None:
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.queue_size = queue_size
+        self.target = logging.StreamHandler(stream or sys.stderr)
+        self.dropped = 0
+        self._start_listener()
+        atexit.register(self._stop_listener)
+        os.register_at_fork(after_in_child=self._restart_after_fork)
+
+    def _start_listener(self) -> None:
+        self.listener = logging.handlers.QueueListener(self.queue, self.target)
+        self.listener.start()
+
+    def _stop_listener(self) -> None:
+        listener, self.listener = self.listener, None
+        if listener is not None:
+            listener.stop()
+
+    def _restart_after_fork(self) -> None:
+        # the inherited queue's lock may have been held by the parent's listener
+        self.queue = queue.Queue(maxsize=self.queue_size)
+        self.dropped = 0
+        self._start_listener()
+
+    def setFormatter(self, fmt):
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # args may be mutated after the call returns, so they are bound now
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
@@ -0,0 +1,294 @@
+import cProfile
+import contextvars
+import hmac
+import io
+import json
+import logging
+import pstats
+import random
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils.decorators import sync_and_async_middleware
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_KINDS = ('json', 'prof')
+_PROFILE_ID_RE = re.compile(r'^[0-9]{8}T[0-9]{6}-[0-9a-f]{8}$')
+
+
+class BudgetExceeded(AssertionError):
+    """Raised when a request goes over its declared query or time budget."""
+
+
+@dataclass(frozen=True)
+class PerformanceBudget:
+    queries: Optional[int] = None
+    ms: Optional[float] = None
+
+    def violations(self, query_count: int, elapsed_ms: float) -> List[str]:
+        problems = []
+        if self.queries is not None and query_count > self.queries:
+            problems.append(f"{query_count} queries (budget {self.queries})")
+        if self.ms is not None and elapsed_ms > self.ms:
+            problems.append(f"{elapsed_ms:.1f} ms (budget {self.ms:g} ms)")
+        return problems
+
+
+#declares a budget on a function view or a view class, for one method or all of them;
+#stack the decorator to give GET and POST different budgets
+def performance_budget(*, queries: Optional[int] = None, ms: Optional[float] = None, method: str = '*'):
+    def decorate(view):
+        budgets = dict(getattr(view, 'performance_budgets', None) or {})
+        budgets[method.upper()] = PerformanceBudget(queries=queries, ms=ms)
+        view.performance_budgets = budgets
+        return view
+    return decorate
+
+
+def _budget_for(view_func, method: str) -> Optional[PerformanceBudget]:
+    for owner in (view_func, getattr(view_func, 'view_class', None), getattr(view_func, 'cls', None)):
+        budgets = getattr(owner, 'performance_budgets', None)
+        if budgets:
+            return budgets.get(method) or budgets.get('*')
+    return None
+
+
+# recorders active in the current context; sync_to_async copies the context into the
+# thread that runs a sync view, so queries made there are seen by an async caller too
+_active_recorders: contextvars.ContextVar[Tuple['QueryRecorder', ...]] = contextvars.ContextVar(
+    'query_recorders', default=(),
+)
+
+
+def _dispatch_to_recorders(execute, sql, params, many, context):
+    for recorder in _active_recorders.get():
+        execute = partial(recorder, execute)
+    return execute(sql, params, many, context)
+
+
+#connections are per thread, so every one gets the dispatcher when it connects
+def _install_dispatcher(sender=None, connection=None, **kwargs):
+    if _dispatch_to_recorders not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _dispatch_to_recorders)
+
+
+connection_created.connect(_install_dispatcher, dispatch_uid='core.query-recorders')
+
+
+#execute_wrapper hook; counts every query and keeps the sql only when asked to
+class QueryRecorder:
+    def __init__(self, *, capture_sql: bool = False) -> None:
+        self.capture_sql = capture_sql
+        self.count = 0
+        self.total_ms = 0.0
+        self.queries: List[Dict[str, Any]] = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.count += 1
+            self.total_ms += elapsed
+            if self.capture_sql:
+                self.queries.append({
+                    'alias': context['connection'].alias,
+                    'sql': sql,
+                    'ms': round(elapsed, 3),
+                    'many': many,
+                })
+
+    @contextmanager
+    def installed(self):
+        # connections this thread opened before the signal was connected
+        for connection in connections.all(initialized_only=True):
+            _install_dispatcher(connection=connection)
+        token = _active_recorders.set(_active_recorders.get() + (self,))
+        try:
+            yield self
+        finally:
+            _active_recorders.reset(token)
+
+
+#for tests and scripts: fails the block when it goes over budget
+@contextmanager
+def query_budget(*, queries: Optional[int] = None, ms: Optional[float] = None, label: str = 'block'):
+    budget = PerformanceBudget(queries=queries, ms=ms)
+    recorder = QueryRecorder(capture_sql=True)
+    started = time.perf_counter()
+    with recorder.installed():
+        yield recorder
+    problems = budget.violations(recorder.count, (time.perf_counter() - started) * 1000)
+    if problems:
+        statements = '\n'.join(query['sql'] for query in recorder.queries)
+        raise BudgetExceeded(f"{label} over budget: {', '.join(problems)}\n{statements}")
+
+
+class ProfileStore:
+    def __init__(self, directory=None, max_artifacts=None) -> None:
+        self.directory = Path(directory or getattr(settings, 'PROFILING_DIR', settings.BASE_DIR / '.cache' / 'profiles'))
+        self.max_artifacts = max_artifacts or getattr(settings, 'PROFILING_MAX_ARTIFACTS', 200)
+
+    def path(self, profile_id: str, kind: str) -> Optional[Path]:
+        if kind not in ARTIFACT_KINDS or not _PROFILE_ID_RE.match(profile_id):
+            return None
+        path = self.directory / f"{profile_id}.{kind}"
+        return path if path.exists() else None
+
+    def save(self, summary: Dict[str, Any], profiler: cProfile.Profile) -> str:
+        profile_id = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}-{uuid.uuid4().hex[:8]}"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(str(self.directory / f"{profile_id}.prof"))
+        (self.directory / f"{profile_id}.json").write_text(json.dumps({'id': profile_id, **summary}, indent=2, default=str))
+        self._prune()
+        return profile_id
+
+    def list(self) -> List[Dict[str, Any]]:
+        entries = []
+        for path in sorted(self.directory.glob('*.json'), reverse=True):
+            try:
+                data = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            entries.append({key: data.get(key) for key in ('id', 'method', 'path', 'status', 'total_ms', 'query_count', 'query_ms')})
+        return entries
+
+    def _prune(self) -> None:
+        summaries = sorted(self.directory.glob('*.json'))
+        for path in summaries[:-self.max_artifacts]:
+            for kind in ARTIFACT_KINDS:
+                path.with_suffix(f".{kind}").unlink(missing_ok=True)
+
+
+profile_store = ProfileStore()
+
+
+def _top_functions(profiler: cProfile.Profile, limit: int = 30) -> List[Dict[str, Any]]:
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    rows = []
+    for (filename, line, name), (_, calls, own, cumulative, _) in stats.stats.items():
+        rows.append({
+            'function': f"{filename}:{line}({name})",
+            'calls': calls,
+            'own_ms': round(own * 1000, 3),
+            'cumulative_ms': round(cumulative * 1000, 3),
+        })
+    rows.sort(key=lambda row: row['cumulative_ms'], reverse=True)
+    return rows[:limit]
+
+
+#profiles a request carrying PROFILING_HEADER (or picked by PROFILING_SAMPLE_RATE) and stores
+#its cProfile dump and SQL; views with a performance_budget are checked on every request,
+#and PERFORMANCE_BUDGETS=raise turns overruns into errors so test runs fail on them.
+#under ASGI cProfile only sees the event loop thread; queries and timings cover the request
+@sync_and_async_middleware
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.header = 'HTTP_' + getattr(settings, 'PROFILING_HEADER', 'X-Profile').upper().replace('-', '_')
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def _wants_profile(self, request) -> bool:
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            return False
+        value = request.META.get(self.header)
+        if value:
+            secret = getattr(settings, 'PROFILING_SECRET', '')
+            if secret:
+                return hmac.compare_digest(value, secret)
+            # without a shared secret only staff sessions (or DEBUG) may ask for a profile
+            user = getattr(request, 'user', None)
+            return settings.DEBUG or bool(getattr(user, 'is_staff', False))
+        rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+        return rate > 0 and random.random() < rate
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        profiling = self._wants_profile(request)
+        budgets = getattr(settings, 'PERFORMANCE_BUDGETS', 'warn')
+        if not profiling and budgets == 'off':
+            return self.get_response(request)
+
+        recorder = QueryRecorder(capture_sql=profiling)
+        profiler = cProfile.Profile() if profiling else None
+        started = time.perf_counter()
+        with recorder.installed():
+            if profiler:
+                profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                if profiler:
+                    profiler.disable()
+        return self._finish(request, response, recorder, profiler, started, budgets)
+
+    async def __acall__(self, request):
+        # the staff check may load the session user, which is a query
+        profiling = getattr(settings, 'PROFILING_ENABLED', False) and await sync_to_async(self._wants_profile)(request)
+        budgets = getattr(settings, 'PERFORMANCE_BUDGETS', 'warn')
+        if not profiling and budgets == 'off':
+            return await self.get_response(request)
+
+        recorder = QueryRecorder(capture_sql=profiling)
+        profiler = cProfile.Profile() if profiling else None
+        started = time.perf_counter()
+        with recorder.installed():
+            if profiler:
+                profiler.enable()
+            try:
+                response = await self.get_response(request)
+            finally:
+                if profiler:
+                    profiler.disable()
+        if profiler:
+            return await sync_to_async(self._finish)(request, response, recorder, profiler, started, budgets)
+        return self._finish(request, response, recorder, profiler, started, budgets)
+
+    def _finish(self, request, response, recorder, profiler, started, budgets):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        if profiler:
+            profile_id = profile_store.save(
+                {
+                    'method': request.method,
+                    'path': request.get_full_path(),
+                    'status': response.status_code,
+                    'total_ms': round(elapsed_ms, 3),
+                    'query_count': recorder.count,
+                    'query_ms': round(recorder.total_ms, 3),
+                    'queries': recorder.queries,
+                    'functions': _top_functions(profiler),
+                },
+                profiler,
+            )
+            response['X-Profile-Id'] = profile_id
+            response['Server-Timing'] = f"db;dur={recorder.total_ms:.1f}, total;dur={elapsed_ms:.1f}"
+
+        budget = getattr(request, '_performance_budget', None)
+        if budget is not None and budgets != 'off':
+            problems = budget.violations(recorder.count, elapsed_ms)
+            if problems:
+                message = f"{request.method} {request.path} over budget: {', '.join(problems)}"
+                if budgets == 'raise':
+                    raise BudgetExceeded(message)
+                logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._performance_budget = _budget_for(view_func, request.method)
+        return None
@@ -0,0 +1,299 @@
+import logging
+import os
+import runpy
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import path
+
+from apps.core.cache import CacheNamespace, cache_stats
+from apps.core.log import REQUEST_ID_HEADER, CorrelationIdMiddleware, QueueLogHandler, get_correlation_id
+from apps.core.profiling import BudgetExceeded, ProfilingMiddleware, performance_budget, query_budget
+
+SETTINGS_PATH = Path(settings.BASE_DIR) / 'config' / 'settings.py'
+
+
+#the same behaviour is checked against every backend CACHE_BACKEND can pick without a server
+class CacheNamespaceTestsMixin:
+    alias = 'default'
+
+    def setUp(self):
+        super().setUp()
+        caches[self.alias].clear()
+        cache_stats.reset()
+        self.namespace = CacheNamespace('tests.items', timeout=60, alias=self.alias)
+
+    def test_get_and_set(self):
+        self.assertIsNone(self.namespace.get('missing'))
+        self.assertEqual(self.namespace.get('missing', 'fallback'), 'fallback')
+        self.namespace.set(('user', 7), {'value': [1, 2]})
+        self.assertEqual(self.namespace.get(('user', 7)), {'value': [1, 2]})
+        self.assertEqual(caches[self.alias].get('tests.items:v1:user:7'), {'value': [1, 2]})
+
+    def test_falsy_values_are_hits(self):
+        self.namespace.set('empty', [])
+        self.assertEqual(self.namespace.get('empty', 'fallback'), [])
+        self.assertEqual(self.namespace.stats()['hits'], 1)
+
+    def test_get_many_and_set_many(self):
+        self.namespace.set_many({1: 'one', 2: 'two'})
+        self.assertEqual(self.namespace.get_many([1, 2, 3]), {1: 'one', 2: 'two'})
+        self.assertEqual(self.namespace.stats(), {'hits': 2, 'misses': 1, 'hit_ratio': 2 / 3})
+
+    def test_get_or_set_calls_default_once(self):
+        default = mock.Mock(return_value='built')
+        self.assertEqual(self.namespace.get_or_set('key', default), 'built')
+        self.assertEqual(self.namespace.get_or_set('key', default), 'built')
+        default.assert_called_once_with()
+
+    def test_add_keeps_existing_value(self):
+        self.assertTrue(self.namespace.add('key', 'first'))
+        self.assertFalse(self.namespace.add('key', 'second'))
+        self.assertEqual(self.namespace.get('key'), 'first')
+
+    def test_incr_creates_then_counts(self):
+        self.assertEqual(self.namespace.incr('counter'), 1)
+        self.assertEqual(self.namespace.incr('counter', 5), 6)
+        self.assertEqual(self.namespace.get('counter'), 6)
+
+    def test_incr_recreates_expired_counter(self):
+        self.namespace.incr('counter', 3)
+        self.namespace.delete('counter')
+        self.assertEqual(self.namespace.incr('counter', 2), 2)
+
+    def test_version_bump_invalidates(self):
+        self.namespace.set('key', 'old layout')
+        bumped = CacheNamespace('tests.items', version=2, timeout=60, alias=self.alias)
+        self.assertIsNone(bumped.get('key'))
+        bumped.set('key', 'new layout')
+        self.assertEqual(self.namespace.get('key'), 'old layout')
+        self.assertEqual(bumped.get('key'), 'new layout')
+
+    def test_namespaces_are_isolated(self):
+        other = CacheNamespace('tests.other', timeout=60, alias=self.alias)
+        self.namespace.set('key', 'mine')
+        self.assertIsNone(other.get('key'))
+        self.assertEqual(self.namespace.get('key'), 'mine')
+
+    def test_delete(self):
+        self.namespace.set('key', 'value')
+        self.namespace.delete('key')
+        self.assertIsNone(self.namespace.get('key'))
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'core-tests'},
+})
+class LocMemCacheNamespaceTests(CacheNamespaceTestsMixin, SimpleTestCase):
+    pass
+
+
+class FileCacheNamespaceTests(CacheNamespaceTestsMixin, SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.enterClassContext(override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': cls.directory},
+        }))
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+
+#settings.py is executed again with a patched environment, as a fresh worker would
+class CacheSettingsTests(SimpleTestCase):
+    def load_caches(self, **environ):
+        cleared = {name: '' for name in os.environ if name.startswith('CACHE_')}
+        with mock.patch.dict(os.environ, {**cleared, **environ}):
+            for name in cleared:
+                del os.environ[name]
+            return runpy.run_path(str(SETTINGS_PATH))['CACHES']['default']
+
+    def test_locmem_is_the_default(self):
+        default = self.load_caches()
+        self.assertEqual(default['BACKEND'], 'django.core.cache.backends.locmem.LocMemCache')
+        self.assertEqual(default['LOCATION'], 'widgera')
+        self.assertEqual(default['TIMEOUT'], 300)
+        self.assertEqual(default['OPTIONS'], {'MAX_ENTRIES': 10000})
+
+    def test_file_backend_uses_the_cache_directory(self):
+        default = self.load_caches(CACHE_BACKEND='file', CACHE_TIMEOUT='30', CACHE_MAX_ENTRIES='50')
+        self.assertEqual(default['BACKEND'], 'django.core.cache.backends.filebased.FileBasedCache')
+        self.assertEqual(default['LOCATION'], str(Path(settings.BASE_DIR) / '.cache'))
+        self.assertEqual(default['TIMEOUT'], 30)
+        self.assertEqual(default['OPTIONS'], {'MAX_ENTRIES': 50})
+
+    def test_database_backend_defaults_to_the_cache_table(self):
+        default = self.load_caches(CACHE_BACKEND='database')
+        self.assertEqual(default['BACKEND'], 'django.core.cache.backends.db.DatabaseCache')
+        self.assertEqual(default['LOCATION'], 'django_cache')
+
+    def test_redis_backend_takes_no_max_entries(self):
+        default = self.load_caches(CACHE_BACKEND='redis', CACHE_LOCATION='redis://cache:6379/2', CACHE_KEY_PREFIX='app')
+        self.assertEqual(default['BACKEND'], 'django.core.cache.backends.redis.RedisCache')
+        self.assertEqual(default['LOCATION'], 'redis://cache:6379/2')
+        self.assertEqual(default['KEY_PREFIX'], 'app')
+        self.assertEqual(default['OPTIONS'], {})
+
+    def test_unknown_backend_fails_at_startup(self):
+        with self.assertRaises(KeyError):
+            self.load_caches(CACHE_BACKEND='memcache')
+
+
+def _count_users(times):
+    for _ in range(times):
+        get_user_model().objects.count()
+
+
+@performance_budget(queries=1)
+def over_budget_view(request):
+    _count_users(2)
+    return HttpResponse(get_correlation_id())
+
+
+@performance_budget(queries=2)
+def within_budget_view(request):
+    _count_users(2)
+    return HttpResponse(get_correlation_id())
+
+
+@performance_budget(queries=5, method='GET')
+@performance_budget(queries=0, method='POST')
+def per_method_view(request):
+    _count_users(1)
+    return HttpResponse(get_correlation_id())
+
+
+urlpatterns = [
+    path('over/', over_budget_view),
+    path('within/', within_budget_view),
+    path('per-method/', per_method_view),
+]
+
+
+class QueryBudgetTests(TestCase):
+    def test_within_budget(self):
+        with query_budget(queries=2) as recorder:
+            _count_users(2)
+        self.assertEqual(recorder.count, 2)
+
+    def test_over_budget_lists_the_statements(self):
+        with self.assertRaisesMessage(BudgetExceeded, 'users over budget: 2 queries (budget 1)') as caught:
+            with query_budget(queries=1, label='users'):
+                _count_users(2)
+        self.assertIn('SELECT COUNT(*)', str(caught.exception))
+
+    def test_time_budget(self):
+        with self.assertRaisesMessage(BudgetExceeded, 'budget 0 ms'):
+            with query_budget(ms=0):
+                _count_users(1)
+
+    def test_nested_budgets_both_count(self):
+        with query_budget(queries=3) as outer:
+            _count_users(1)
+            with query_budget(queries=2) as inner:
+                _count_users(2)
+        self.assertEqual((outer.count, inner.count), (3, 2))
+
+
+#views in this module declare budgets; raise mode is what test runs use to fail on overruns
+@override_settings(ROOT_URLCONF='apps.core.tests', PERFORMANCE_BUDGETS='raise', PROFILING_ENABLED=False)
+class BudgetMiddlewareTests(TestCase):
+    def test_raise_mode_fails_the_request(self):
+        with self.assertRaisesMessage(BudgetExceeded, 'GET /over/ over budget: 2 queries (budget 1)'):
+            self.client.get('/over/')
+
+    def test_within_budget_passes(self):
+        self.assertEqual(self.client.get('/within/').status_code, 200)
+
+    def test_budget_per_method(self):
+        self.assertEqual(self.client.get('/per-method/').status_code, 200)
+        with self.assertRaises(BudgetExceeded):
+            self.client.post('/per-method/')
+
+    def test_warn_mode_logs_instead(self):
+        with override_settings(PERFORMANCE_BUDGETS='warn'), self.assertLogs('apps.core.profiling', 'WARNING') as logs:
+            self.assertEqual(self.client.get('/over/').status_code, 200)
+        self.assertIn('over budget', logs.output[0])
+
+    async def test_async_raise_mode_counts_queries_from_the_sync_view(self):
+        with self.assertRaisesMessage(BudgetExceeded, 'GET /over/ over budget: 2 queries (budget 1)'):
+            await self.async_client.get('/over/')
+
+    async def test_async_within_budget_passes(self):
+        response = await self.async_client.get('/within/')
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(ROOT_URLCONF='apps.core.tests', PERFORMANCE_BUDGETS='off')
+class AsyncMiddlewareTests(TestCase):
+    def test_middlewares_follow_the_handler_mode(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        def get_sync_response(request):
+            return HttpResponse()
+
+        for middleware in (CorrelationIdMiddleware, ProfilingMiddleware):
+            self.assertTrue(middleware.sync_capable and middleware.async_capable)
+            self.assertTrue(iscoroutinefunction(middleware(get_response)))
+            self.assertFalse(iscoroutinefunction(middleware(get_sync_response)))
+
+    async def test_correlation_id_reaches_the_sync_view(self):
+        response = await self.async_client.get('/within/', headers={REQUEST_ID_HEADER: 'async-request-1'})
+        self.assertEqual(response[REQUEST_ID_HEADER], 'async-request-1')
+        self.assertEqual(response.content, b'async-request-1')
+
+    def test_sync_correlation_id(self):
+        response = self.client.get('/within/', headers={REQUEST_ID_HEADER: 'not valid!'})
+        self.assertEqual(response.content.decode(), response[REQUEST_ID_HEADER])
+        self.assertRegex(response[REQUEST_ID_HEADER], r'^[0-9a-f]{32}$')
+
+
+class QueueLogHandlerTests(SimpleTestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        os.close(handle)
+        self.addCleanup(os.unlink, self.path)
+        self.stream = open(self.path, 'a')
+        self.addCleanup(self.stream.close)
+        self.handler = QueueLogHandler(stream=self.stream)
+        self.addCleanup(self.handler._stop_listener)
+        self.logger = logging.getLogger('core.tests.queue')
+        self.logger.propagate = False
+        self.logger.addHandler(self.handler)
+        self.addCleanup(self.logger.removeHandler, self.handler)
+
+    def written(self):
+        with open(self.path) as handle:
+            return handle.read()
+
+    def test_records_are_written_by_the_listener(self):
+        self.logger.warning('parent %s', 1)
+        self.handler._stop_listener()
+        self.assertIn('parent 1', self.written())
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'needs fork()')
+    def test_forked_child_gets_its_own_listener(self):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                self.logger.warning('from the child')
+                self.handler._stop_listener()
+                self.stream.flush()
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        self.assertIn('from the child', self.written())
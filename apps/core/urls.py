@@ -0,0 +1,10 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'core'
+
+urlpatterns = [
+    path('', views.profile_list, name='profile_list'),
+    path('<str:profile_id>.<str:kind>', views.profile_download, name='profile_download'),
+]
@@ -0,0 +1,18 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import FileResponse, Http404, JsonResponse
+
+from apps.core.profiling import profile_store
+
+
+@staff_member_required
+def profile_list(request):
+    return JsonResponse({'profiles': profile_store.list()})
+
+
+#.prof opens in snakeviz or pstats, .json holds the timings and the sql
+@staff_member_required
+def profile_download(request, profile_id, kind):
+    path = profile_store.path(profile_id, kind)
+    if path is None:
+        raise Http404('No such profile.')
+    return FileResponse(path.open('rb'), as_attachment=True, filename=path.name)
@@ -1,6 +1,9 @@
 from django.contrib import admin
 
-from .models import PromptSchema, SchemaField, UploadedImage, PromptExecution
+from apps.core.admin_performance import PerformanceAdminMixin
+from apps.users.models import normalize_username
+
+from .models import PromptSchema, SchemaField, UploadedImage, PromptExecution, UsageRollup, IdempotencyKey, CompressionDictionary
 
 
 class SchemaFieldInline(admin.TabularInline):
@@ -8,23 +11,79 @@ class SchemaFieldInline(admin.TabularInline):
     extra = 0
 
 
+#search_fields is the stock (LIKE) search used when ADMIN_PERFORMANCE_MODE is off
 @admin.register(PromptSchema)
-class PromptSchemaAdmin(admin.ModelAdmin):
+class PromptSchemaAdmin(PerformanceAdminMixin, admin.ModelAdmin):
     list_display = ('name', 'user', 'is_active', 'created_at')
     list_filter = ('is_active',)
+    list_select_related = ('user',)
     search_fields = ('name', 'user__username')
+    indexed_search_fields = {
+        'name__startswith': None,
+        'user__canonical_username__username': normalize_username,
+        # accounts that clash ignoring case are indexed under an alias; their exact name still works
+        'user__username': None,
+    }
+    search_help_text = 'Schema name prefix (case-sensitive), exact username or id.'
+    raw_id_fields = ('user',)
     inlines = [SchemaFieldInline]
 
 
 @admin.register(UploadedImage)
-class UploadedImageAdmin(admin.ModelAdmin):
+class UploadedImageAdmin(PerformanceAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'user', 'checksum', 'created_at')
+    list_select_related = ('user',)
     search_fields = ('user__username', 'checksum')
+    indexed_search_fields = {
+        'user__canonical_username__username': normalize_username,
+        'user__username': None,
+        'checksum__startswith': str.lower,
+    }
+    search_help_text = 'Exact username, checksum prefix or id.'
+    raw_id_fields = ('user',)
 
 
 @admin.register(PromptExecution)
-class PromptExecutionAdmin(admin.ModelAdmin):
+class PromptExecutionAdmin(PerformanceAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'user', 'status', 'provider', 'model_name', 'created_at')
     list_filter = ('status', 'provider')
-    search_fields = ('user__username', 'prompt_text')
+    list_select_related = ('user',)
+    # prompt_text is stored compressed past COMPRESSION_THRESHOLD_BYTES, so SQL can't search it
+    search_fields = ('user__username',)
+    indexed_search_fields = {
+        'user__canonical_username__username': normalize_username,
+        'user__username': None,
+    }
+    search_help_text = 'Exact username or execution id.'
+    raw_id_fields = ('user', 'prompt_body', 'field_set')
     autocomplete_fields = ('schema', 'image')
+    readonly_fields = ('prompt_text', 'structured_fields')
+
+
+@admin.register(UsageRollup)
+class UsageRollupAdmin(admin.ModelAdmin):
+    list_display = ('bucket_start', 'granularity', 'user', 'model_name', 'provider', 'request_count', 'error_count', 'total_tokens')
+    list_filter = ('granularity', 'provider')
+    list_select_related = ('user',)
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ('key', 'user', 'status', 'execution', 'created_at', 'expires_at')
+    list_filter = ('status',)
+    list_select_related = ('user', 'execution')
+    raw_id_fields = ('execution',)
+
+
+@admin.register(CompressionDictionary)
+class CompressionDictionaryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'field', 'algorithm', 'sample_count', 'is_active', 'created_at')
+    list_filter = ('field', 'algorithm', 'is_active')
+    # rows packed with a dictionary need it to decode; retire it instead of deleting
+    readonly_fields = ('field', 'algorithm', 'sample_count', 'created_at')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
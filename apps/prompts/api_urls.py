@@ -0,0 +1,21 @@
+from django.urls import path
+
+from .views import execution_event_stream
+
+from .views_api import (
+    PromptSchemaDetailView,
+    PromptSchemaListView,
+    SchemaAnalyticsView,
+    SchemaFieldBulkUpsertView,
+    UsageRollupView,
+)
+
+
+urlpatterns = [
+    path('schemas/', PromptSchemaListView.as_view(), name='schema_list'),
+    path('schemas/<int:schema_id>/', PromptSchemaDetailView.as_view(), name='schema_detail'),
+    path('schemas/<int:schema_id>/fields/', SchemaFieldBulkUpsertView.as_view(), name='schema_fields'),
+    path('schemas/<int:schema_id>/analytics/', SchemaAnalyticsView.as_view(), name='schema_analytics'),
+    path('usage/', UsageRollupView.as_view(), name='usage_rollups'),
+    path('executions/events/', execution_event_stream, name='execution_events'),
+]
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class PromptsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.prompts'
+
+    def ready(self):
+        from apps.prompts import signals  # noqa: F401
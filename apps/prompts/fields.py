@@ -0,0 +1,72 @@
+import json
+
+from django.apps import apps
+from django.db import models
+
+from apps.prompts.services.compression import is_packed, payload_compressor
+
+
+def _label(field) -> str:
+    return f"{field.model._meta.label}.{field.name}"
+
+
+#TextField stored compressed once it passes COMPRESSION_THRESHOLD_BYTES; same column
+#type, and rows written before the switch are read as they are. SQL lookups other than
+#exact on the whole value (contains, icontains, ...) no longer see compressed rows
+class CompressedTextField(models.TextField):
+    #stored form of a python value; compress=False writes it plain where that's unambiguous
+    def encode(self, value: str, *, compress: bool = True) -> str:
+        if compress or is_packed(value):
+            return payload_compressor.pack(value, _label(self))
+        return value
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        value = super().get_db_prep_value(value, connection, prepared)
+        return self.encode(value) if isinstance(value, str) else value
+
+    def from_db_value(self, value, expression, connection):
+        return payload_compressor.unpack(value) if is_packed(value) else value
+
+
+#JSONField whose serialized document is compressed past the threshold and stored as a
+#JSON string literal, so the column stays valid json/jsonb; key and containment lookups
+#only match rows that are still stored plain
+class CompressedJSONField(models.JSONField):
+    #the object handed to the json adapter: the value itself or its packed string
+    def encode(self, value, *, compress: bool = True):
+        # a bare string that looks packed has to be packed itself to read back unchanged
+        if not compress and not is_packed(value):
+            return value
+        serialized = json.dumps(value, cls=self.encoder)
+        packed = payload_compressor.pack(serialized, _label(self), force=is_packed(value))
+        return value if packed is serialized else packed
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if not prepared:
+            value = self.get_prep_value(value)
+        if value is None or hasattr(value, 'as_sql'):
+            return super().get_db_prep_value(value, connection, prepared=True)
+        return connection.ops.adapt_json_value(self.encode(value), self.encoder)
+
+    def from_db_value(self, value, expression, connection):
+        value = super().from_db_value(value, expression, connection)
+        if is_packed(value):
+            return json.loads(payload_compressor.unpack(value), cls=self.decoder)
+        return value
+
+
+def compressed_fields(model):
+    return [
+        field for field in model._meta.concrete_fields
+        if isinstance(field, (CompressedTextField, CompressedJSONField))
+    ]
+
+
+#the text a python value is compressed from, for training and benchmarks
+def compressible_text(field, value) -> str:
+    return json.dumps(value, cls=field.encoder) if isinstance(field, models.JSONField) else value
+
+
+#(model, its compressed fields) for every installed model that has any
+def compressed_models():
+    return [(model, fields) for model in apps.get_models() if (fields := compressed_fields(model))]
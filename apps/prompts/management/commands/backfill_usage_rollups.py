@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from apps.prompts.services.usage_rollups import usage_rollups
+
+
+class Command(BaseCommand):
+    help = 'Roll up finished PromptExecution rows that are not yet counted in UsageRollup.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Delete all rollups and recount every execution.',
+        )
+
+    def handle(self, *args, **options):
+        total = usage_rollups.backfill(batch_size=options['batch_size'], rebuild=options['rebuild'])
+        self.stdout.write(self.style.SUCCESS(f"Rolled up {total} executions."))
@@ -0,0 +1,51 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.prompts.services.llm_service import LLMService
+from apps.prompts.services.storage_service import StorageService
+
+
+def _timed(call):
+    started = time.perf_counter()
+    ok = call()
+    return ok, (time.perf_counter() - started) * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare a cold request (client construction plus TCP/TLS handshakes) with a warm one '
+        'on the pooled connection, for the OpenAI transport and optionally S3.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--url', default=None, help='Base URL to probe (default: OPENAI_API_BASE).')
+        parser.add_argument('--s3', action='store_true', help='Also probe the configured S3 bucket.')
+
+    def handle(self, *args, **options):
+        url = options['url'] or settings.OPENAI_API_BASE
+        targets = {
+            'openai': lambda: LLMService(api_key=settings.OPENAI_API_KEY or 'warmup-benchmark', base_url=url),
+        }
+        if options['s3']:
+            targets['s3'] = StorageService
+
+        self.stdout.write(f"{'target':<8} {'run':>4} {'cold ms':>10} {'warm ms':>10}")
+        for name, factory in targets.items():
+            cold_times, warm_times = [], []
+            for run in range(1, max(options['runs'], 1) + 1):
+                service = factory()
+                cold_ok, cold = _timed(service.warm_up)
+                warm_ok, warm = _timed(service.warm_up)
+                if not (cold_ok and warm_ok):
+                    raise CommandError(f"{name}: probe request failed; see the log for details.")
+                cold_times.append(cold)
+                warm_times.append(warm)
+                # the first openai run also pays for importing the SDK
+                self.stdout.write(f"{name:<8} {run:>4} {cold:>10.1f} {warm:>10.1f}")
+            self.stdout.write(
+                f"{name:<8} {'med':>4} {statistics.median(cold_times):>10.1f} {statistics.median(warm_times):>10.1f}"
+            )
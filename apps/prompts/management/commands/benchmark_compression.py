@@ -0,0 +1,75 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.prompts.fields import compressed_models, compressible_text
+from apps.prompts.services.compression import PayloadCompressor, ZlibCodec, ZstdCodec
+
+DICTIONARY_SIZE = 16 * 1024
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare stored size against encode/decode cost per compressed field for each '
+        'codec and level, with and without a dictionary trained on the other half of the sample.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=2000, help='Most recent rows to measure.')
+        parser.add_argument('--threshold', type=int, help='Defaults to COMPRESSION_THRESHOLD_BYTES.')
+
+    def handle(self, *args, **options):
+        threshold = options['threshold']
+        if threshold is None:
+            threshold = getattr(settings, 'COMPRESSION_THRESHOLD_BYTES', 512)
+        codecs = [('zlib-1', ZlibCodec(1)), ('zlib-6', ZlibCodec(6)), ('zlib-9', ZlibCodec(9))]
+        try:
+            codecs += [('zstd-3', ZstdCodec(3)), ('zstd-9', ZstdCodec(9))]
+        except RuntimeError:
+            self.stdout.write('zstandard is not installed; measuring zlib only')
+
+        self.stdout.write(f"threshold {threshold} bytes")
+        self.stdout.write(
+            f"{'field':<28} {'codec':<12} {'plain KB':>9} {'stored KB':>9} {'ratio':>6} "
+            f"{'packed':>7} {'enc us':>8} {'dec us':>8}"
+        )
+        for field in [field for _, fields in compressed_models() for field in fields]:
+            texts = [
+                compressible_text(field, value)
+                for value in field.model.objects.order_by('-pk').values_list(field.name, flat=True)[:options['samples']]
+            ]
+            label = f"{field.model.__name__}.{field.name}"
+            if len(texts) < 2:
+                self.stdout.write(f"{label}: fewer than 2 rows, skipped (see generate_synthetic_data)")
+                continue
+            # dictionaries are trained on one half and measured on the other
+            training, measured = texts[::2], texts[1::2]
+            self._row(label, 'plain', measured, None)
+            for name, codec in codecs:
+                self._row(label, name, measured, PayloadCompressor(codec=codec, threshold=threshold))
+                try:
+                    dictionary = codec.train([text.encode('utf-8') for text in training], DICTIONARY_SIZE)
+                except Exception:  # noqa: BLE001 - zstd refuses sample sets it can't learn from
+                    continue
+                compressor = PayloadCompressor(codec=codec, threshold=threshold, dictionary=(0, dictionary))
+                self._row(label, f"{name}+dict", measured, compressor)
+
+    def _row(self, field_name, name, texts, compressor):
+        plain = sum(len(text.encode('utf-8')) for text in texts)
+        if compressor is None:
+            stored, packed_share, encode_us, decode_us = plain, 0.0, 0.0, 0.0
+        else:
+            started = time.perf_counter()
+            packed = [compressor.pack(text) for text in texts]
+            encode_us = (time.perf_counter() - started) / len(texts) * 1e6
+            started = time.perf_counter()
+            for value in packed:
+                compressor.unpack(value)
+            decode_us = (time.perf_counter() - started) / len(texts) * 1e6
+            stored = sum(len(value.encode('utf-8')) for value in packed)
+            packed_share = sum(value is not text for value, text in zip(packed, texts)) / len(texts)
+        self.stdout.write(
+            f"{field_name:<28} {name:<12} {plain / 1024:>9.1f} {stored / 1024:>9.1f} "
+            f"{stored / plain if plain else 1.0:>6.2f} {packed_share:>7.0%} {encode_us:>8.1f} {decode_us:>8.1f}"
+        )
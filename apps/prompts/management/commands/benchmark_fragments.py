@@ -0,0 +1,65 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from apps.prompts.models import PromptExecution, PromptSchema
+from apps.prompts.services import schema_service
+
+BENCHMARK_USERNAME = 'fragment-benchmark'
+EXECUTIONS = 20
+
+
+class Command(BaseCommand):
+    help = 'Compare render time and response size of the full playground page with each fragment endpoint.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('--requests must be positive.')
+        User = get_user_model()
+        User.objects.filter(username=BENCHMARK_USERNAME).delete()
+        user = User.objects.create_user(username=BENCHMARK_USERNAME)
+        try:
+            schema = PromptSchema.objects.create(user=user, name='Inventor')
+            schema_service.upsert_fields(schema, [{'name': 'fullName'}, {'name': 'birthYear', 'field_type': 'number'}])
+            for index in range(EXECUTIONS):
+                PromptExecution.objects.create(
+                    user=user,
+                    prompt_text=f"Who invented device number {index}?",
+                    result_data={'fullName': 'Alexander Graham Bell', 'birthYear': 1847},
+                    model_name='gpt-4o-mini',
+                    status=PromptExecution.Status.COMPLETED,
+                )
+            client = Client()
+            client.force_login(user)
+            targets = {
+                'full page': reverse('prompts:playground'),
+                'history': reverse('prompts:fragment_history'),
+                'fields': f"{reverse('prompts:fragment_fields')}?schema_id={schema.id}",
+                'result': reverse('prompts:fragment_result'),
+            }
+            self.stdout.write(f"{'target':<10} {'p50 ms':>8} {'p95 ms':>8} {'bytes':>8}")
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                for name, url in targets.items():
+                    self._measure(client, name, url, options['requests'])
+        finally:
+            user.delete()
+
+    def _measure(self, client, name, url, total):
+        latencies = []
+        size = 0
+        for _ in range(total):
+            started = time.perf_counter()
+            response = client.get(url)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f"{name} returned {response.status_code}")
+            size = len(response.content)
+        cuts = statistics.quantiles(latencies, n=100, method='inclusive') if total > 1 else latencies * 99
+        self.stdout.write(f"{name:<10} {cuts[49]:>8.2f} {cuts[94]:>8.2f} {size:>8}")
@@ -0,0 +1,92 @@
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+_IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$')
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+for name in {modules!r}:
+    __import__(name)
+print(json.dumps({{
+    'setup_ms': (time.perf_counter() - started) * 1000,
+    'loaded': [name for name in {forbid!r} if name in sys.modules],
+}}))
+"""
+
+
+def _package_totals(stderr: str):
+    totals = defaultdict(int)
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if match:
+            self_us, _, _, name = match.groups()
+            totals[name.split('.')[0]] += int(self_us)
+    return totals
+
+
+class Command(BaseCommand):
+    help = (
+        'Boot django in a fresh interpreter under -X importtime, report where import time goes '
+        'and fail when it is over budget or pulls in SDKs that should load lazily.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--module',
+            action='append',
+            default=[],
+            help='Extra module to import after django.setup(), e.g. config.urls (repeatable).',
+        )
+        parser.add_argument('--runs', type=int, default=3, help='Best of this many runs is reported.')
+        parser.add_argument('--top', type=int, default=15)
+        parser.add_argument('--budget-ms', type=float, default=None, help='Fail when setup takes longer.')
+        parser.add_argument(
+            '--forbid',
+            default='openai,boto3',
+            help='Comma separated modules that must not be imported at startup.',
+        )
+
+    def _probe(self, modules, forbid):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE}
+        script = _PROBE.format(modules=modules, forbid=forbid)
+        completed = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', script],
+            capture_output=True,
+            text=True,
+            env=env,
+            cwd=settings.BASE_DIR,
+        )
+        if completed.returncode != 0:
+            raise CommandError(f"Probe process failed:\n{completed.stderr[-2000:]}")
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        result['packages'] = _package_totals(completed.stderr)
+        return result
+
+    def handle(self, *args, **options):
+        forbid = [name.strip() for name in options['forbid'].split(',') if name.strip()]
+        runs = [self._probe(options['module'], forbid) for _ in range(max(options['runs'], 1))]
+        best = min(runs, key=lambda run: run['setup_ms'])
+
+        self.stdout.write(f"django.setup() + imports: {best['setup_ms']:.1f} ms (best of {len(runs)})")
+        self.stdout.write(f"{'package':<32} {'self ms':>10}")
+        ranked = sorted(best['packages'].items(), key=lambda item: item[1], reverse=True)
+        for package, self_us in ranked[:options['top']]:
+            self.stdout.write(f"{package:<32} {self_us / 1000:>10.1f}")
+
+        if best['loaded']:
+            raise CommandError(f"Imported at startup but should load lazily: {', '.join(best['loaded'])}")
+        budget = options['budget_ms']
+        if budget is not None and best['setup_ms'] > budget:
+            raise CommandError(f"Startup took {best['setup_ms']:.1f} ms, budget is {budget:.1f} ms.")
+        if budget is not None:
+            self.stdout.write(self.style.SUCCESS(f"Within the {budget:.1f} ms budget."))
@@ -0,0 +1,183 @@
+import json
+import random
+import statistics
+import time
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+
+from apps.core.profiling import QueryRecorder
+from apps.prompts.models import PromptExecution, PromptSchema, UploadedImage
+from apps.prompts.services import history_cache, image_handler
+from apps.users.models import CanonicalUsername
+
+from .generate_synthetic_data import DEFAULT_PREFIX
+
+CHANGELISTS = {
+    'admin:executions': (PromptExecution, {}),
+    'admin:executions?q': (PromptExecution, {'q': f"{DEFAULT_PREFIX}00000000"}),
+    'admin:executions?st': (PromptExecution, {'status__exact': 'failed'}),
+    'admin:images': (UploadedImage, {}),
+    'admin:images?q': (UploadedImage, {'q': f"{DEFAULT_PREFIX}00000000"}),
+    'admin:schemas': (PromptSchema, {}),
+}
+
+
+def _parse_sizes(value):
+    try:
+        sizes = sorted({int(size) for size in value.split(',') if size.strip()})
+    except ValueError as exc:
+        raise CommandError(f"--sizes must be comma separated integers: {value}") from exc
+    if not sizes or sizes[0] < 0:
+        raise CommandError('--sizes must list at least one non-negative execution count.')
+    return sizes
+
+
+class Command(BaseCommand):
+    help = (
+        'Grow the synthetic data set step by step (see generate_synthetic_data) and time history, '
+        'image dedup, admin changelists and the signup uniqueness check at each size.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='',
+            help=(
+                'Comma separated PromptExecution totals, e.g. 100000,1000000,10000000. Before each '
+                'step the synthetic set grows to that size, with one image per ten executions. '
+                'Without it only the data already in the database is measured.'
+            ),
+        )
+        parser.add_argument('--users-per-size', type=int, default=1000, help='One synthetic user per this many executions.')
+        parser.add_argument('--samples', type=int, default=50, help='Calls per operation.')
+        parser.add_argument('--admin-samples', type=int, default=5)
+        parser.add_argument('--prefix', default=DEFAULT_PREFIX)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', action='store_true', help='Print one JSON object per size instead of tables.')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.random = random.Random(options['seed'])
+        self.users = get_user_model().objects.filter(username__startswith=options['prefix'])
+        sizes = _parse_sizes(options['sizes']) if options['sizes'] else [None]
+
+        for size in sizes:
+            if size is not None:
+                self._grow_to(size)
+            rows = self._measure()
+            if options['json']:
+                self.stdout.write(json.dumps({'size': self._size(), 'results': rows}))
+            else:
+                self._report(rows)
+
+    def _size(self):
+        return {
+            'executions': PromptExecution.objects.filter(user__in=self.users).count(),
+            'images': UploadedImage.objects.filter(user__in=self.users).count(),
+            'users': self.users.count(),
+        }
+
+    def _grow_to(self, executions):
+        current = self._size()
+        missing = executions - current['executions']
+        if missing <= 0:
+            return
+        call_command(
+            'generate_synthetic_data',
+            users=max(executions // self.options['users_per_size'], 10),
+            images=max(executions // 10 - current['images'], 0),
+            executions=missing,
+            prefix=self.options['prefix'],
+            seed=self.options['seed'] + executions,
+            stdout=self.stderr,
+        )
+
+    def _sample_users(self):
+        # the heaviest users plus a random spread, so both history shapes show up
+        heavy = list(self.users.order_by('id')[:5])
+        count = self.users.count()
+        spread = [self.users.order_by('id')[self.random.randrange(count)] for _ in range(min(count, 20))] if count else []
+        sample = heavy + spread
+        if not sample:
+            raise CommandError(f"No users named {self.options['prefix']}*; run generate_synthetic_data or pass --sizes.")
+        return sample
+
+    def _time(self, name, calls, repeat):
+        latencies = []
+        recorder = QueryRecorder()
+        with recorder.installed():
+            for index in range(repeat):
+                started = time.perf_counter()
+                calls[index % len(calls)]()
+                latencies.append((time.perf_counter() - started) * 1000)
+        cuts = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+        return {
+            'operation': name,
+            'p50_ms': round(cuts[49], 3),
+            'p95_ms': round(cuts[94], 3),
+            'max_ms': round(max(latencies), 3),
+            'queries_per_call': round(recorder.count / repeat, 2),
+        }
+
+    def _measure(self):
+        samples = self.options['samples']
+        users = self._sample_users()
+        checksums = list(UploadedImage.objects.filter(user__in=users).values_list('user_id', 'checksum')[:samples])
+        by_id = {user.id: user for user in users}
+        User = get_user_model()
+
+        rows = [
+            # what _fetch_history pays on a cache miss, then on a hit
+            self._time('history:rebuild', [lambda user=user: history_cache.rebuild(user.id) for user in users], samples),
+            self._time('history:cached', [lambda user=user: history_cache.get(user) for user in users], samples),
+            self._time(
+                'dedup:miss',
+                [lambda user=user: image_handler._find_duplicate(user, f"{user.id:064x}") for user in users],
+                samples,
+            ),
+        ]
+        if checksums:
+            rows.append(self._time(
+                'dedup:hit',
+                [lambda pair=pair: image_handler._find_duplicate(by_id[pair[0]], pair[1]) for pair in checksums],
+                samples,
+            ))
+        names = [user.username.upper() for user in users]
+        rows.append(self._time('signup:canonical', [lambda name=name: CanonicalUsername.is_taken(name) for name in names], samples))
+        rows.append(self._time(
+            'signup:iexact',
+            [lambda name=name: User.objects.filter(username__iexact=name).exists() for name in names],
+            samples,
+        ))
+
+        superuser = User(username='scale-benchmark', is_active=True, is_staff=True, is_superuser=True)
+        factory = RequestFactory()
+        for name, (model, params) in CHANGELISTS.items():
+            model_admin = admin.site._registry[model]
+
+            def changelist(name=name, model_admin=model_admin, params=params):
+                request = factory.get('/admin/', params)
+                request.user = superuser
+                response = model_admin.changelist_view(request)
+                response.render()
+                if response.status_code != 200:
+                    raise CommandError(f"{name} returned {response.status_code}")
+
+            rows.append(self._time(name, [changelist], self.options['admin_samples']))
+        return rows
+
+    def _report(self, rows):
+        size = self._size()
+        self.stdout.write(
+            f"\n{size['executions']} executions, {size['images']} images, {size['users']} users"
+        )
+        self.stdout.write(f"{'operation':<20} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'queries':>8}")
+        for row in rows:
+            self.stdout.write(
+                f"{row['operation']:<20} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} "
+                f"{row['max_ms']:>9.2f} {row['queries_per_call']:>8.2f}"
+            )
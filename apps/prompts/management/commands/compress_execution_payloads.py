@@ -0,0 +1,97 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from apps.prompts.fields import CompressedJSONField, compressed_models
+from apps.prompts.services.compression import is_packed
+
+
+class Command(BaseCommand):
+    help = (
+        'Rewrite stored prompt, field set and result payloads with the current compression settings, in primary key '
+        'batches. Rows are updated in place with raw SQL, so updated_at and signals are left alone.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--start-after', type=int, default=0, help='Resume each table after this primary key.')
+        parser.add_argument('--sleep', type=float, default=0.0, help='Seconds to pause between batches.')
+        parser.add_argument('--decompress', action='store_true', help='Store every payload plain again.')
+        parser.add_argument(
+            '--repack',
+            action='store_true',
+            help='Also rewrite rows that are already compressed (new codec, level or dictionary).',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Report the size change without writing.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        for model, fields in compressed_models():
+            self._rewrite_model(model, fields, options)
+
+    def _rewrite_model(self, model, fields, options):
+        table = connection.ops.quote_name(model._meta.db_table)
+        pk = connection.ops.quote_name(model._meta.pk.column)
+        columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+        lock = ' FOR UPDATE' if connection.features.has_select_for_update and not options['dry_run'] else ''
+        select = f"SELECT {pk}, {columns} FROM {table} WHERE {pk} > %s ORDER BY {pk} LIMIT %s{lock}"
+
+        last_id = options['start_after']
+        scanned = rewritten = before = after = 0
+        while True:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute(select, [last_id, options['batch_size']])
+                    rows = cursor.fetchall()
+                if not rows:
+                    break
+                updates = {field: [] for field in fields}
+                for row in rows:
+                    for field, raw in zip(fields, row[1:]):
+                        change = self._rewrite(field, raw, options)
+                        if change is None:
+                            continue
+                        param, size = change
+                        before += len(raw.encode('utf-8'))
+                        after += size
+                        updates[field].append((param, row[0]))
+                if not options['dry_run']:
+                    with connection.cursor() as cursor:
+                        for field, params in updates.items():
+                            if params:
+                                cursor.executemany(
+                                    f"UPDATE {table} SET {connection.ops.quote_name(field.column)} = %s WHERE {pk} = %s",
+                                    params,
+                                )
+            scanned += len(rows)
+            rewritten += sum(len(params) for params in updates.values())
+            last_id = rows[-1][0]
+            self.stdout.write(f"{model.__name__} up to id {last_id}: {scanned} rows scanned, {rewritten} values rewritten")
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        verb = 'would rewrite' if options['dry_run'] else 'rewrote'
+        self.stdout.write(self.style.SUCCESS(
+            f"{model.__name__}: {verb} {rewritten} values in {scanned} rows: {before} -> {after} bytes."
+        ))
+
+    #(db parameter, stored size) when the value should change, else None
+    def _rewrite(self, field, raw, options):
+        if raw is None:
+            return None
+        is_json = isinstance(field, CompressedJSONField)
+        stored_form = json.loads(raw) if is_json else raw
+        if is_packed(stored_form) and not (options['decompress'] or options['repack']):
+            return None
+        if not is_packed(stored_form) and options['decompress']:
+            return None
+        value = field.from_db_value(raw, None, connection)
+        stored = field.encode(value, compress=not options['decompress'])
+        if stored == stored_form:
+            return None
+        if is_json:
+            return connection.ops.adapt_json_value(stored, field.encoder), len(json.dumps(stored, cls=field.encoder).encode('utf-8'))
+        return stored, len(stored.encode('utf-8'))
@@ -0,0 +1,326 @@
+import hashlib
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from apps.prompts.models import PromptExecution, PromptSchema, SchemaField, UploadedImage
+from apps.users.models import CanonicalUsername, normalize_username
+
+DEFAULT_PREFIX = 'synthetic-'
+MODELS = (('gpt-4o-mini', 0.7), ('gpt-4o', 0.25), ('gpt-4.1', 0.05))
+STATUSES = (
+    (PromptExecution.Status.COMPLETED, 0.93),
+    (PromptExecution.Status.FAILED, 0.05),
+    (PromptExecution.Status.RUNNING, 0.02),
+)
+SUBJECTS = (
+    'the inventor of the telephone', 'a famous football player', 'the first person on the moon',
+    'the author of this novel', 'the painter of this portrait', 'the architect of this building',
+    'the founder of this company', 'the composer of this symphony', 'the captain of this team',
+    'the director of this film', 'the scientist behind this discovery', 'the owner of this house',
+)
+FIRST_NAMES = (
+    'Ada', 'Alan', 'Amara', 'Bruno', 'Chen', 'Dara', 'Elif', 'Farah', 'Grace', 'Hiro', 'Ines', 'Jonas',
+    'Kofi', 'Lena', 'Marta', 'Nikolai', 'Olga', 'Priya', 'Rafael', 'Sven', 'Tariq', 'Uma', 'Yusuf', 'Zoe',
+)
+LAST_NAMES = (
+    'Almeida', 'Bauer', 'Castillo', 'Dubois', 'Eriksen', 'Fischer', 'Gupta', 'Haddad', 'Ito', 'Jansen',
+    'Kowalski', 'Lindqvist', 'Moreau', 'Nakamura', 'Okafor', 'Petrov', 'Rossi', 'Schmidt', 'Tanaka', 'Weber',
+)
+PLACES = (
+    'Lisbon', 'Nairobi', 'Osaka', 'Montreal', 'Krakow', 'Lima', 'Hanoi', 'Bergen', 'Adelaide', 'Tunis',
+    'Porto', 'Seville', 'Leeds', 'Cebu', 'Graz', 'Recife', 'Tampere', 'Izmir', 'Austin', 'Dakar',
+)
+# {subject} {name} {place} {year} {number} are filled per execution, so bodies rarely repeat
+PROMPT_TEMPLATES = (
+    'Tell me about {subject}.',
+    'Who is {name}? I think they were born in {place} around {year}.',
+    'Extract the details of {subject} from this description: {name}, {place}, {year}.',
+    'Summarise what is known about {name} and their work in {place}.',
+    'What can you find about {subject}? Start with anything from {year}.',
+    'Look up {name} (member #{number}) and list their key facts.',
+    'This photo was taken in {place} in {year}. Identify {subject}.',
+    'Fill in the form for {name}, who moved to {place} in {year}, reference {number}.',
+    'Give me structured facts about {subject}, ideally sourced from {place} records.',
+    'Invoice {number} from {place}: who signed it and when? The contact is {name}.',
+)
+# extra sentences real prompts tend to carry; zero to two are appended
+PROMPT_DETAILS = (
+    'Answer briefly.', 'Use metric units.', 'If unsure, leave the field empty.',
+    'The spelling of the name may be off.', 'Ignore anything after {year}.',
+    'This is for a school project about {place}.', 'Double-check the numbers.',
+    'My colleague {name} thinks otherwise.',
+)
+FIELD_NAMES = (
+    ('fullName', SchemaField.FieldType.STRING), ('birthYear', SchemaField.FieldType.NUMBER),
+    ('country', SchemaField.FieldType.STRING), ('shirtNumber', SchemaField.FieldType.NUMBER),
+    ('occupation', SchemaField.FieldType.STRING), ('heightCm', SchemaField.FieldType.NUMBER),
+    ('birthPlace', SchemaField.FieldType.STRING), ('deathYear', SchemaField.FieldType.NUMBER),
+    ('nationality', SchemaField.FieldType.STRING), ('employer', SchemaField.FieldType.STRING),
+    ('yearsActive', SchemaField.FieldType.NUMBER), ('spouseName', SchemaField.FieldType.STRING),
+    ('knownFor', SchemaField.FieldType.STRING), ('awardsCount', SchemaField.FieldType.NUMBER),
+    ('city', SchemaField.FieldType.STRING), ('invoiceNumber', SchemaField.FieldType.STRING),
+    ('totalAmount', SchemaField.FieldType.NUMBER), ('issueYear', SchemaField.FieldType.NUMBER),
+    ('signatory', SchemaField.FieldType.STRING), ('team', SchemaField.FieldType.STRING),
+    ('goals', SchemaField.FieldType.NUMBER), ('weightKg', SchemaField.FieldType.NUMBER),
+    ('education', SchemaField.FieldType.STRING), ('email', SchemaField.FieldType.STRING),
+)
+# the playground form's default fields, which many ad-hoc executions keep
+DEFAULT_FIELDS = (
+    ('inventorFullName', SchemaField.FieldType.STRING),
+    ('inventorBirthYear', SchemaField.FieldType.NUMBER),
+    ('numberOnTheShirt', SchemaField.FieldType.NUMBER),
+)
+# share of executions that re-run one of the user's earlier prompts verbatim
+REPEAT_RATE = 0.15
+DEFAULT_FIELDS_RATE = 0.3
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+#bulk_create runs pre_save, which would stamp every row with "now"; generated rows
+#carry their own spread-out timestamps instead
+@contextmanager
+def _explicit_timestamps(*models):
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk-generate synthetic users, schemas, fields, images and executions for scale testing. '
+        'Runs are additive, so repeated runs grow the data set; --purge removes it again.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100, help='Ensure at least this many synthetic users.')
+        parser.add_argument('--schemas-per-user', type=int, default=3)
+        parser.add_argument('--fields-per-schema', type=int, default=4)
+        parser.add_argument('--images', type=int, default=1000, help='Images to add.')
+        parser.add_argument('--executions', type=int, default=10000, help='Executions to add.')
+        parser.add_argument('--days', type=int, default=180, help='Spread timestamps over this many days.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--prefix', default=DEFAULT_PREFIX, help='Username prefix marking synthetic users.')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--purge', action='store_true', help='Delete all synthetic data and exit.')
+
+    def handle(self, *args, **options):
+        if not options['prefix']:
+            raise CommandError('--prefix must not be empty.')
+        self.options = options
+        self.random = random.Random(options['seed'])
+        self.now = timezone.now()
+        User = get_user_model()
+        self.users = User.objects.filter(username__startswith=options['prefix'])
+
+        if options['purge']:
+            self._purge()
+            return
+
+        started = time.perf_counter()
+        with _explicit_timestamps(User, PromptSchema, SchemaField, UploadedImage, PromptExecution):
+            user_ids = self._ensure_users(options['users'])
+            if not user_ids:
+                raise CommandError('No synthetic users; pass --users.')
+            # a few heavy users and a long tail, like real traffic
+            self.weights = [1 / (rank + 1) for rank in range(len(user_ids))]
+            self.user_ids = user_ids
+            self._add_images(options['images'])
+            self._add_executions(options['executions'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Synthetic data: {len(user_ids)} users, "
+            f"{UploadedImage.objects.filter(user__in=self.users).count()} images, "
+            f"{PromptExecution.objects.filter(user__in=self.users).count()} executions "
+            f"({time.perf_counter() - started:.1f} s)."
+        ))
+        self.stdout.write('Run backfill_usage_rollups to include the new executions in analytics.')
+
+    def _timestamp(self):
+        return self.now - timedelta(seconds=self.random.random() * self.options['days'] * 86400)
+
+    def _pick_user(self):
+        return self.random.choices(self.user_ids, weights=self.weights)[0]
+
+    def _prompt_text(self):
+        values = {
+            'subject': self.random.choice(SUBJECTS),
+            'name': f"{self.random.choice(FIRST_NAMES)} {self.random.choice(LAST_NAMES)}",
+            'place': self.random.choice(PLACES),
+            'year': self.random.randint(1820, 2024),
+            'number': self.random.randint(100, 99999),
+        }
+        sentences = [self.random.choice(PROMPT_TEMPLATES)]
+        sentences += self.random.sample(PROMPT_DETAILS, self.random.choice((0, 0, 1, 2)))
+        return ' '.join(sentences).format(**values)
+
+    def _ad_hoc_fields(self):
+        if self.random.random() < DEFAULT_FIELDS_RATE:
+            return list(DEFAULT_FIELDS)
+        return self.random.sample(FIELD_NAMES, self.random.randint(1, 7))
+
+    def _ensure_users(self, target):
+        User = get_user_model()
+        prefix, batch_size = self.options['prefix'], self.options['batch_size']
+        existing = self.users.count()
+        # one unusable hash shared by every synthetic user; nobody logs in as them
+        password = make_password(None)
+        for batch in _batched(range(existing, max(target, existing)), batch_size):
+            with transaction.atomic():
+                joined = [self._timestamp() for _ in batch]
+                users = User.objects.bulk_create(
+                    [
+                        User(username=f"{prefix}{index:08d}", password=password, date_joined=moment)
+                        for index, moment in zip(batch, joined)
+                    ]
+                )
+                # bulk_create skips signals, so the canonical rows are written here
+                created = list(self.users.filter(username__in=[user.username for user in users]).values_list('id', 'username', 'date_joined'))
+                CanonicalUsername.objects.bulk_create(
+                    [CanonicalUsername(user_id=user_id, username=normalize_username(name)) for user_id, name, _ in created]
+                )
+                self._add_schemas(created)
+            self.stdout.write(f"  users: {batch[-1] + 1}/{target}")
+        return list(self.users.order_by('id').values_list('id', flat=True))
+
+    def _add_schemas(self, users):
+        per_user, per_schema = self.options['schemas_per_user'], self.options['fields_per_schema']
+        PromptSchema.objects.bulk_create(
+            [
+                PromptSchema(
+                    user_id=user_id,
+                    name=f"Schema {number + 1}",
+                    description=f"Facts about {self.random.choice(SUBJECTS)}",
+                    created_at=joined,
+                    updated_at=joined,
+                )
+                for user_id, _, joined in users
+                for number in range(per_user)
+            ],
+            batch_size=self.options['batch_size'],
+        )
+        schemas = PromptSchema.objects.filter(user_id__in=[user_id for user_id, _, _ in users]).values_list('id', 'created_at')
+        SchemaField.objects.bulk_create(
+            [
+                SchemaField(schema_id=schema_id, name=name, field_type=field_type, sort_order=order, created_at=created_at)
+                for schema_id, created_at in schemas
+                for order, (name, field_type) in enumerate(self.random.sample(FIELD_NAMES, min(per_schema, len(FIELD_NAMES))))
+            ],
+            batch_size=self.options['batch_size'],
+        )
+
+    def _add_images(self, total):
+        if total <= 0:
+            return
+        offset = UploadedImage.objects.filter(user__in=self.users).count()
+        for batch in _batched(range(offset, offset + total), self.options['batch_size']):
+            images = []
+            for index in batch:
+                user_id = self._pick_user()
+                checksum = hashlib.sha256(f"{self.options['prefix']}{index}".encode()).hexdigest()
+                images.append(UploadedImage(
+                    user_id=user_id,
+                    image_url=f"https://synthetic.invalid/users/{user_id}/uploads/{checksum[:16]}.jpg",
+                    checksum=checksum,
+                    original_filename=f"IMG_{index:07d}.jpg",
+                    created_at=self._timestamp(),
+                ))
+            with transaction.atomic():
+                UploadedImage.objects.bulk_create(images)
+            self.stdout.write(f"  images: {batch[-1] + 1 - offset}/{total}")
+
+    def _add_executions(self, total):
+        if total <= 0:
+            return
+        schemas, schema_fields, images, recent_prompts = {}, {}, {}, {}
+        for schema_id, user_id in PromptSchema.objects.filter(user__in=self.users).values_list('id', 'user_id').iterator():
+            schemas.setdefault(user_id, []).append(schema_id)
+        fields_of_schemas = SchemaField.objects.filter(schema__user__in=self.users).order_by('schema_id', 'sort_order')
+        for schema_id, name, field_type in fields_of_schemas.values_list('schema_id', 'name', 'field_type').iterator():
+            schema_fields.setdefault(schema_id, []).append((name, field_type))
+        for image_id, user_id in UploadedImage.objects.filter(user__in=self.users).values_list('id', 'user_id').iterator():
+            images.setdefault(user_id, []).append(image_id)
+
+        models, model_weights = zip(*MODELS)
+        statuses, status_weights = zip(*STATUSES)
+        for done, batch in enumerate(_batched(range(total), self.options['batch_size']), start=1):
+            executions = []
+            for _ in batch:
+                user_id = self._pick_user()
+                status = self.random.choices(statuses, weights=status_weights)[0]
+                schema_id = self.random.choice(schemas[user_id]) if user_id in schemas and self.random.random() < 0.6 else None
+                # schema runs send the schema's fields; ad-hoc runs vary them
+                fields = schema_fields.get(schema_id) or self._ad_hoc_fields()
+                recent = recent_prompts.setdefault(user_id, [])
+                if recent and self.random.random() < REPEAT_RATE:
+                    prompt_text = self.random.choice(recent)
+                else:
+                    prompt_text = self._prompt_text()
+                    recent[:] = [*recent[-4:], prompt_text]
+                prompt_tokens = self.random.randint(40, 900)
+                completion_tokens = self.random.randint(10, 300) if status == PromptExecution.Status.COMPLETED else 0
+                created_at = self._timestamp()
+                user_images = images.get(user_id)
+                executions.append(PromptExecution(
+                    user_id=user_id,
+                    schema_id=schema_id,
+                    image_id=self.random.choice(user_images) if user_images and self.random.random() < 0.3 else None,
+                    prompt_text=prompt_text,
+                    structured_fields=[{'name': name, 'field_type': field_type} for name, field_type in fields],
+                    result_data={
+                        name: (self.random.randint(1, 2000) if field_type == SchemaField.FieldType.NUMBER else f"value {self.random.randint(1, 10 ** 6)}")
+                        for name, field_type in fields
+                    } if status == PromptExecution.Status.COMPLETED else {},
+                    usage={
+                        'prompt_tokens': prompt_tokens,
+                        'completion_tokens': completion_tokens,
+                        'total_tokens': prompt_tokens + completion_tokens,
+                    },
+                    provider='openai',
+                    model_name=self.random.choices(models, weights=model_weights)[0],
+                    status=status,
+                    error_message='Upstream timeout' if status == PromptExecution.Status.FAILED else '',
+                    latency_ms=int(self.random.lognormvariate(7, 0.5)) if status != PromptExecution.Status.RUNNING else None,
+                    created_at=created_at,
+                    updated_at=created_at,
+                ))
+            with transaction.atomic():
+                PromptExecution.objects.bulk_create(executions)
+            if done % 20 == 0 or batch[-1] + 1 == total:
+                self.stdout.write(f"  executions: {batch[-1] + 1}/{total}")
+
+    def _purge(self):
+        user_ids = list(self.users.values_list('id', flat=True))
+        batch_size = self.options['batch_size']
+        # children first in id batches, so no single delete has to collect millions of rows
+        for model in (PromptExecution, UploadedImage):
+            while True:
+                ids = list(model.objects.filter(user__in=self.users).values_list('id', flat=True)[:batch_size])
+                if not ids:
+                    break
+                model.objects.filter(id__in=ids).delete()
+        for batch in _batched(user_ids, 500):
+            get_user_model().objects.filter(id__in=batch).delete()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {len(user_ids)} synthetic users and their data."))
+        self.stdout.write('Run purge_idempotency_keys to delete the prompt bodies and field sets they leave unused.')
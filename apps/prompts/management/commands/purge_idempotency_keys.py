@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.prompts.services.content_store import field_sets, prompt_bodies
+from apps.prompts.services.idempotency import idempotency_service
+
+
+class Command(BaseCommand):
+    help = 'Delete expired idempotency keys, and prompt bodies and field sets no execution uses any more.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--content-grace-hours',
+            type=float,
+            default=24,
+            help='Keep unused prompt bodies and field sets younger than this.',
+        )
+        parser.add_argument('--skip-content', action='store_true', help='Only delete idempotency keys.')
+
+    def handle(self, *args, **options):
+        if options['content_grace_hours'] < 0:
+            raise CommandError('--content-grace-hours must not be negative.')
+        deleted = idempotency_service.purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired idempotency keys."))
+        if options['skip_content']:
+            return
+        grace = timedelta(hours=options['content_grace_hours'])
+        bodies = prompt_bodies.purge_orphans(grace=grace)
+        fields = field_sets.purge_orphans(grace=grace)
+        self.stdout.write(self.style.SUCCESS(f"Deleted {bodies} unused prompt bodies and {fields} unused field sets."))
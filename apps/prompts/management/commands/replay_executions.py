@@ -0,0 +1,125 @@
+import json
+import re
+from datetime import datetime, time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.prompts.models import PromptExecution
+from apps.prompts.services.replay import ReplayCheckpoint, ReplayEngine, build_report
+
+
+class Command(BaseCommand):
+    help = (
+        'Re-run past executions against a model and compare per-field agreement, latency, tokens and cost. '
+        'Finished rows are checkpointed, so running the same --run again resumes where it stopped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', help='Model to replay against; defaults to OPENAI_MODEL.')
+        parser.add_argument('--run', help='Run name for the checkpoint and report files; defaults to the model.')
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--temperature', type=float, default=0.0)
+        parser.add_argument('--limit', type=int, help='Replay at most this many executions (oldest first).')
+        parser.add_argument('--user', help='Only executions of this username.')
+        parser.add_argument('--schema', type=int, help='Only executions of this schema id.')
+        parser.add_argument('--source-model', help='Only executions originally answered by this model.')
+        parser.add_argument('--since', help='YYYY-MM-DD, inclusive.')
+        parser.add_argument('--until', help='YYYY-MM-DD, exclusive.')
+        parser.add_argument('--fresh', action='store_true', help='Discard the checkpoint of this run first.')
+        parser.add_argument('--report-only', action='store_true', help='Rebuild the report from the checkpoint.')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency must be positive.')
+        if options['limit'] is not None and options['limit'] < 1:
+            raise CommandError('--limit must be positive.')
+        model = options['model'] or getattr(settings, 'OPENAI_MODEL', 'gpt-4o-mini')
+        run = options['run'] or re.sub(r'[^\w.-]+', '-', model)
+        directory = Path(getattr(settings, 'REPLAY_DIR', Path(settings.BASE_DIR) / '.cache' / 'replay'))
+        checkpoint = ReplayCheckpoint(directory / f"{run}.jsonl")
+        if options['fresh']:
+            checkpoint.reset()
+
+        if not options['report_only']:
+            queryset = self._selection(options)
+            engine = ReplayEngine(
+                checkpoint,
+                model=model,
+                concurrency=options['concurrency'],
+                temperature=options['temperature'],
+            )
+            self.stdout.write(f"Replaying against {model}; checkpoint {checkpoint.path}")
+            progress = {'done': 0}
+
+            def on_record(record):
+                progress['done'] += 1
+                if progress['done'] % 50 == 0:
+                    self.stdout.write(f"  {progress['done']} replayed")
+
+            try:
+                written = engine.run(queryset, on_record=on_record)
+            except KeyboardInterrupt:
+                self.stdout.write(self.style.WARNING('Interrupted; run the same command again to resume.'))
+                return
+            self.stdout.write(f"Replayed {written} executions.")
+
+        report = build_report(checkpoint.records())
+        report_path = directory / f"{run}.report.json"
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+        report_path.write_text(json.dumps({'run': run, 'model': model, **report}, indent=2))
+        self._print(report)
+        self.stdout.write(self.style.SUCCESS(f"Report written to {report_path}"))
+
+    def _selection(self, options):
+        queryset = PromptExecution.objects.filter(status=PromptExecution.Status.COMPLETED)
+        if options['user']:
+            queryset = queryset.filter(user__username=options['user'])
+        if options['schema']:
+            queryset = queryset.filter(schema_id=options['schema'])
+        if options['source_model']:
+            queryset = queryset.filter(model_name=options['source_model'])
+        if options['since']:
+            queryset = queryset.filter(created_at__gte=self._day(options['since']))
+        if options['until']:
+            queryset = queryset.filter(created_at__lt=self._day(options['until']))
+        if options['limit']:
+            # the same oldest N rows on every resume
+            cutoff = list(queryset.order_by('pk').values_list('pk', flat=True)[options['limit'] - 1:options['limit']])
+            if cutoff:
+                queryset = queryset.filter(pk__lte=cutoff[0])
+        return queryset
+
+    def _day(self, value):
+        try:
+            day = datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError as exc:
+            raise CommandError(f"Dates are YYYY-MM-DD, not {value!r}.") from exc
+        return timezone.make_aware(datetime.combine(day, time.min))
+
+    def _print(self, report):
+        summary = f"\n{report['replayed']}/{report['executions']} replayed, {report['errors']} errors"
+        if report['agreement'] is not None:
+            summary += f"; all fields agree on {report['agreement']:.1%}"
+        self.stdout.write(summary)
+        for message, count in report['top_errors']:
+            self.stdout.write(f"  {count} x {message}")
+
+        self.stdout.write(f"\n{'field':<24} {'compared':>9} {'match':>7}")
+        for name, stats in report['fields'].items():
+            self.stdout.write(f"{name:<24} {stats['compared']:>9} {stats['match_rate']:>7.1%}")
+
+        self.stdout.write(
+            f"\n{'role':<9} {'model':<20} {'runs':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+            f"{'in tok':>9} {'out tok':>9} {'cost $':>9} {'$/1k runs':>10}"
+        )
+        for row in report['models']:
+            latency = row['latency_ms']
+            self.stdout.write(
+                f"{row['role']:<9} {row['model']:<20} {row['runs']:>6} "
+                + ' '.join(f"{latency[key]:>8.0f}" if latency[key] is not None else f"{'-':>8}" for key in ('p50', 'p95', 'p99'))
+                + f" {row['prompt_tokens']:>9} {row['completion_tokens']:>9} "
+                + (f"{row['cost_usd']:>9.4f} {row['cost_per_1k_runs_usd']:>10.4f}" if row['cost_usd'] is not None else f"{'-':>9} {'-':>10}")
+            )
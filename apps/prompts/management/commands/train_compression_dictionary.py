@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.prompts.fields import compressed_models, compressible_text
+from apps.prompts.models import CompressionDictionary
+from apps.prompts.services.compression import PayloadCompressor, compression_dictionaries, get_codec
+
+
+class Command(BaseCommand):
+    help = (
+        'Train a shared compression dictionary per compressed field (prompt bodies, field sets, results) from recent rows '
+        'and make it the active one. Takes effect with COMPRESSION_DICTIONARIES=True.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--algorithm', help='zlib or zstd; defaults to COMPRESSION_ALGORITHM.')
+        parser.add_argument('--samples', type=int, default=5000, help='Most recent rows to train on.')
+        parser.add_argument('--size', type=int, default=16 * 1024, help='Dictionary size in bytes (zlib caps at 32 KB).')
+        parser.add_argument('--fields', nargs='*', help='Model.field or field names; defaults to every compressed field.')
+
+    def handle(self, *args, **options):
+        try:
+            codec = get_codec(options['algorithm'])
+        except (RuntimeError, ValueError) as exc:
+            raise CommandError(str(exc)) from exc
+        fields = [field for _, model_fields in compressed_models() for field in model_fields]
+        if options['fields']:
+            wanted = set(options['fields'])
+            fields = [field for field in fields if {field.name, f"{field.model.__name__}.{field.name}"} & wanted]
+            if not fields:
+                raise CommandError(f"Not compressed fields: {', '.join(sorted(wanted))}")
+
+        for field in fields:
+            label = f"{field.model._meta.label}.{field.name}"
+            samples = [
+                compressible_text(field, value).encode('utf-8')
+                for value in field.model.objects.order_by('-pk').values_list(field.name, flat=True)[:options['samples']]
+            ]
+            if len(samples) < 10:
+                self.stdout.write(f"{label}: only {len(samples)} rows, skipped")
+                continue
+            try:
+                data = codec.train(samples, options['size'])
+            except Exception as exc:  # noqa: BLE001 - zstd refuses sample sets it can't learn from
+                self.stdout.write(self.style.WARNING(f"{label}: training failed ({exc})"))
+                continue
+            with transaction.atomic():
+                CompressionDictionary.objects.filter(field=label, algorithm=codec.name, is_active=True).update(is_active=False)
+                dictionary = CompressionDictionary.objects.create(
+                    field=label,
+                    algorithm=codec.name,
+                    data=data,
+                    sample_count=len(samples),
+                )
+            self.stdout.write(
+                f"{label}: #{dictionary.id} {len(data)} bytes from {len(samples)} rows, "
+                f"stored size {self._ratio(codec, samples, None):.1%} without, "
+                f"{self._ratio(codec, samples, (dictionary.id, data)):.1%} with it"
+            )
+        compression_dictionaries.clear()
+
+    #packed size over plain size for every sample, threshold ignored
+    def _ratio(self, codec, samples, dictionary):
+        compressor = PayloadCompressor(codec=codec, threshold=0, dictionary=dictionary)
+        plain = sum(len(sample) for sample in samples)
+        packed = sum(len(compressor.pack(sample.decode('utf-8')).encode('utf-8')) for sample in samples)
+        return packed / plain if plain else 1.0
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prompts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='promptexecution',
+            name='usage',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='promptschema',
+            name='max_prompt_tokens',
+            field=models.PositiveIntegerField(blank=True, help_text='Prompt token budget for this schema; empty uses the global limit.', null=True),
+        ),
+    ]
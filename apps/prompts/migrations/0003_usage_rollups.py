@@ -0,0 +1,52 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:42
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('prompts', '0002_token_budgets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='promptexecution',
+            name='latency_ms',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='promptexecution',
+            name='rolled_up_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='UsageRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_name', models.CharField(blank=True, max_length=150)),
+                ('provider', models.CharField(blank=True, max_length=100)),
+                ('granularity', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=8)),
+                ('bucket_start', models.DateTimeField()),
+                ('request_count', models.PositiveIntegerField(default=0)),
+                ('error_count', models.PositiveIntegerField(default=0)),
+                ('prompt_tokens', models.PositiveBigIntegerField(default=0)),
+                ('completion_tokens', models.PositiveBigIntegerField(default=0)),
+                ('total_tokens', models.PositiveBigIntegerField(default=0)),
+                ('latency_ms_sum', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-bucket_start'],
+                'indexes': [models.Index(fields=['granularity', 'bucket_start'], name='usage_rollup_bucket_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='usagerollup',
+            constraint=models.UniqueConstraint(fields=('user', 'model_name', 'provider', 'granularity', 'bucket_start'), name='unique_usage_rollup_bucket'),
+        ),
+    ]
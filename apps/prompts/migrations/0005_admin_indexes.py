@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prompts', '0004_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='promptexecution',
+            index=models.Index(fields=['user', '-created_at'], name='prompt_exec_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='promptexecution',
+            index=models.Index(fields=['status', '-id'], name='prompt_exec_status_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='promptschema',
+            index=models.Index(fields=['name'], name='prompt_schema_name_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='uploadedimage',
+            index=models.Index(fields=['checksum'], name='uploaded_image_checksum_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
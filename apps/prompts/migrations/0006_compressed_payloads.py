@@ -0,0 +1,50 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:10
+
+import apps.prompts.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prompts', '0005_admin_indexes'),
+    ]
+
+    operations = [
+        # same column types; only the python side changes, so no table rebuild
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='promptexecution',
+                    name='prompt_text',
+                    field=apps.prompts.fields.CompressedTextField(),
+                ),
+                migrations.AlterField(
+                    model_name='promptexecution',
+                    name='result_data',
+                    field=apps.prompts.fields.CompressedJSONField(blank=True, default=dict),
+                ),
+                migrations.AlterField(
+                    model_name='promptexecution',
+                    name='structured_fields',
+                    field=apps.prompts.fields.CompressedJSONField(blank=True, default=list),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CompressionDictionary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(help_text='app_label.Model.field the dictionary was trained on.', max_length=150)),
+                ('algorithm', models.CharField(choices=[('zlib', 'zlib'), ('zstd', 'zstd')], max_length=8)),
+                ('data', models.BinaryField()),
+                ('sample_count', models.PositiveIntegerField(default=0)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['field', 'algorithm', '-id'], name='compression_dict_active_idx')],
+            },
+        ),
+    ]
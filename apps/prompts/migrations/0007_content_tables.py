@@ -0,0 +1,43 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:14
+
+import apps.prompts.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prompts', '0006_compressed_payloads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FieldSet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('fields', apps.prompts.fields.CompressedJSONField(default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PromptBody',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('text', apps.prompts.fields.CompressedTextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='promptexecution',
+            name='field_set',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='executions', to='prompts.fieldset'),
+        ),
+        migrations.AddField(
+            model_name='promptexecution',
+            name='prompt_body',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='executions', to='prompts.promptbody'),
+        ),
+    ]
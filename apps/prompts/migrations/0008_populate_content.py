@@ -0,0 +1,98 @@
+import hashlib
+import json
+
+from django.db import migrations, transaction
+
+BATCH_SIZE = 2000
+
+
+# frozen copies of the digests in apps.prompts.services.content_store
+def text_digest(value):
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+
+def fields_digest(value):
+    canonical = json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def intern(model, value_field, values, alias):
+    ids = dict(model.objects.using(alias).filter(digest__in=list(values)).values_list('digest', 'id'))
+    new = [digest for digest in values if digest not in ids]
+    if new:
+        model.objects.using(alias).bulk_create(
+            [model(digest=digest, **{value_field: values[digest]}) for digest in new],
+            ignore_conflicts=True,
+        )
+        ids.update(model.objects.using(alias).filter(digest__in=new).values_list('digest', 'id'))
+    return ids
+
+
+#keyset batches, each in its own transaction; rows that already point at their
+#content are skipped, so an interrupted run just continues
+def populate(apps, schema_editor):
+    PromptExecution = apps.get_model('prompts', 'PromptExecution')
+    PromptBody = apps.get_model('prompts', 'PromptBody')
+    FieldSet = apps.get_model('prompts', 'FieldSet')
+    alias = schema_editor.connection.alias
+    last_id = 0
+    while True:
+        rows = list(
+            PromptExecution.objects.using(alias)
+            .filter(pk__gt=last_id, prompt_body__isnull=True)
+            .order_by('pk')
+            .values_list('pk', 'prompt_text', 'structured_fields')[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        with transaction.atomic(using=alias):
+            bodies = {text_digest(text): text for _, text, _ in rows}
+            field_sets = {fields_digest(fields): fields for _, _, fields in rows}
+            body_ids = intern(PromptBody, 'text', bodies, alias)
+            field_set_ids = intern(FieldSet, 'fields', field_sets, alias)
+            PromptExecution.objects.using(alias).bulk_update(
+                [
+                    PromptExecution(
+                        pk=pk,
+                        prompt_body_id=body_ids[text_digest(text)],
+                        field_set_id=field_set_ids[fields_digest(fields)],
+                    )
+                    for pk, text, fields in rows
+                ],
+                ['prompt_body', 'field_set'],
+            )
+
+
+def unpopulate(apps, schema_editor):
+    PromptExecution = apps.get_model('prompts', 'PromptExecution')
+    alias = schema_editor.connection.alias
+    last_id = 0
+    while True:
+        executions = list(
+            PromptExecution.objects.using(alias)
+            .select_related('prompt_body', 'field_set')
+            .filter(pk__gt=last_id)
+            .order_by('pk')
+            .only('pk', 'prompt_body__text', 'field_set__fields')[:BATCH_SIZE]
+        )
+        if not executions:
+            break
+        last_id = executions[-1].pk
+        for execution in executions:
+            execution.prompt_text = execution.prompt_body.text if execution.prompt_body_id else ''
+            execution.structured_fields = execution.field_set.fields if execution.field_set_id else []
+        with transaction.atomic(using=alias):
+            PromptExecution.objects.using(alias).bulk_update(executions, ['prompt_text', 'structured_fields'])
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('prompts', '0007_content_tables'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate, unpopulate),
+    ]
@@ -0,0 +1,30 @@
+import apps.prompts.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prompts', '0008_populate_content'),
+    ]
+
+    operations = [
+        # gives the column a default to come back with when this migration is reversed
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='promptexecution',
+                    name='prompt_text',
+                    field=apps.prompts.fields.CompressedTextField(default=''),
+                ),
+            ],
+        ),
+        migrations.RemoveField(
+            model_name='promptexecution',
+            name='prompt_text',
+        ),
+        migrations.RemoveField(
+            model_name='promptexecution',
+            name='structured_fields',
+        ),
+    ]
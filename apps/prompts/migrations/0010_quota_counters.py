@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:30
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('prompts', '0009_remove_inline_payloads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuotaCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.PositiveBigIntegerField(help_text='Unix time divided by the window length.')),
+                ('requests', models.PositiveIntegerField(default=0)),
+                ('tokens', models.BigIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quota_counters', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='quotacounter',
+            constraint=models.UniqueConstraint(fields=('user', 'window'), name='unique_user_quota_window'),
+        ),
+    ]
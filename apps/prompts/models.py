@@ -1,6 +1,8 @@
 from django.conf import settings
 from django.db import models
 
+from apps.prompts.fields import CompressedJSONField, CompressedTextField
+
 
 #promt schema model for history
 class PromptSchema(models.Model):
@@ -12,12 +14,21 @@ class PromptSchema(models.Model):
     name = models.CharField(max_length=120)
     description = models.TextField(blank=True)
     is_active = models.BooleanField(default=True)
+    max_prompt_tokens = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text='Prompt token budget for this schema; empty uses the global limit.'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ('user', 'name')
         ordering = ['name']
+        indexes = [
+            # pattern ops so admin and autocomplete prefix searches can use it on postgres
+            models.Index(fields=['name'], name='prompt_schema_name_idx', opclasses=['varchar_pattern_ops']),
+        ]
 
     def __str__(self) -> str:  # pragma: no cover - readability only
         return f"{self.name} ({self.user.username})"
@@ -80,11 +91,42 @@ class UploadedImage(models.Model):
                 name='unique_user_image_checksum'
             )
         ]
+        indexes = [
+            models.Index(fields=['checksum'], name='uploaded_image_checksum_idx', opclasses=['varchar_pattern_ops']),
+        ]
         ordering = ['-created_at']
 
     def __str__(self) -> str:  # pragma: no cover - readability only
         return f"Image {self.id} for {self.user.username}"
 
+#prompt text shared by every execution that sent it, keyed by sha256 (see content_store)
+class PromptBody(models.Model):
+    digest = models.CharField(max_length=64, unique=True)
+    text = CompressedTextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:  # pragma: no cover - readability only
+        return f"Prompt {self.digest[:12]}"
+
+#structured field definitions shared by every execution that used them
+class FieldSet(models.Model):
+    digest = models.CharField(max_length=64, unique=True)
+    fields = CompressedJSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:  # pragma: no cover - readability only
+        return f"Fields {self.digest[:12]}"
+
+#bodies and field sets of the whole batch are interned together before the insert
+class PromptExecutionQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        from apps.prompts.services.content_store import intern_content
+
+        objs = list(objs)
+        intern_content(objs)
+        return super().bulk_create(objs, *args, **kwargs)
+
+
 #prompt execution history
 class PromptExecution(models.Model):
     class Status(models.TextChoices):
@@ -112,9 +154,23 @@ class PromptExecution(models.Model):
         null=True,
         blank=True
     )
-    prompt_text = models.TextField()
-    structured_fields = models.JSONField(default=list, blank=True)
-    result_data = models.JSONField(default=dict, blank=True)
+    # read and written through prompt_text / structured_fields
+    prompt_body = models.ForeignKey(
+        PromptBody,
+        on_delete=models.PROTECT,
+        related_name='executions',
+        null=True,
+        blank=True
+    )
+    field_set = models.ForeignKey(
+        FieldSet,
+        on_delete=models.PROTECT,
+        related_name='executions',
+        null=True,
+        blank=True
+    )
+    result_data = CompressedJSONField(default=dict, blank=True)
+    usage = models.JSONField(default=dict, blank=True)
     provider = models.CharField(max_length=100, blank=True)
     model_name = models.CharField(max_length=150, blank=True)
     status = models.CharField(
@@ -123,11 +179,175 @@ class PromptExecution(models.Model):
         default=Status.PENDING
     )
     error_message = models.TextField(blank=True)
+    latency_ms = models.PositiveIntegerField(null=True, blank=True)
+    rolled_up_at = models.DateTimeField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = PromptExecutionQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='prompt_exec_user_created_idx'),
+            # admin status filter walking keyset pages newest first
+            models.Index(fields=['status', '-id'], name='prompt_exec_status_id_idx'),
+        ]
 
     def __str__(self) -> str:  # pragma: no cover - readability only
         return f"Execution {self.id} ({self.status})"
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (self.Status.COMPLETED, self.Status.FAILED)
+
+    #assigned values are kept on the instance and interned by save() or bulk_create(), so
+    #building an execution touches no database; select_related('prompt_body') when reading many
+    @property
+    def prompt_text(self) -> str:
+        if '_pending_prompt_text' in self.__dict__:
+            return self._pending_prompt_text
+        return self.prompt_body.text if self.prompt_body_id else ''
+
+    @prompt_text.setter
+    def prompt_text(self, value: str) -> None:
+        self._pending_prompt_text = value
+
+    @property
+    def structured_fields(self) -> list:
+        if '_pending_structured_fields' in self.__dict__:
+            return self._pending_structured_fields
+        return self.field_set.fields if self.field_set_id else []
+
+    @structured_fields.setter
+    def structured_fields(self, value: list) -> None:
+        self._pending_structured_fields = value
+
+    def save(self, *args, **kwargs):
+        from apps.prompts.services.content_store import intern_content
+
+        intern_content([self])
+        super().save(*args, **kwargs)
+
+#pre-aggregated usage per user/model/provider and hour or day bucket
+class UsageRollup(models.Model):
+    class Granularity(models.TextChoices):
+        HOUR = 'hour', 'Hour'
+        DAY = 'day', 'Day'
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='usage_rollups'
+    )
+    model_name = models.CharField(max_length=150, blank=True)
+    provider = models.CharField(max_length=100, blank=True)
+    granularity = models.CharField(max_length=8, choices=Granularity.choices)
+    bucket_start = models.DateTimeField()
+    request_count = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    prompt_tokens = models.PositiveBigIntegerField(default=0)
+    completion_tokens = models.PositiveBigIntegerField(default=0)
+    total_tokens = models.PositiveBigIntegerField(default=0)
+    latency_ms_sum = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'model_name', 'provider', 'granularity', 'bucket_start'],
+                name='unique_usage_rollup_bucket'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['granularity', 'bucket_start'], name='usage_rollup_bucket_idx'),
+        ]
+        ordering = ['-bucket_start']
+
+    def __str__(self) -> str:  # pragma: no cover - readability only
+        return f"{self.granularity} {self.bucket_start:%Y-%m-%d %H:%M} {self.model_name} ({self.user_id})"
+
+#per-user request/token counters for one fixed quota window; rows are only ever changed
+#with conditional F() updates, so every worker sees and enforces the same totals
+class QuotaCounter(models.Model):
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='quota_counters'
+    )
+    window = models.PositiveBigIntegerField(help_text='Unix time divided by the window length.')
+    requests = models.PositiveIntegerField(default=0)
+    tokens = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'window'],
+                name='unique_user_quota_window'
+            )
+        ]
+
+    def __str__(self) -> str:  # pragma: no cover - readability only
+        return f"Quota window {self.window} ({self.user_id})"
+
+#dedup record for repeated submissions of the same form or Idempotency-Key
+class IdempotencyKey(models.Model):
+    class Status(models.TextChoices):
+        IN_PROGRESS = 'in_progress', 'In progress'
+        COMPLETED = 'completed', 'Completed'
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='idempotency_keys'
+    )
+    key = models.CharField(max_length=128)
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.IN_PROGRESS
+    )
+    execution = models.ForeignKey(
+        PromptExecution,
+        on_delete=models.SET_NULL,
+        related_name='idempotency_keys',
+        null=True,
+        blank=True
+    )
+    response_data = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'key'],
+                name='unique_user_idempotency_key'
+            )
+        ]
+
+    def __str__(self) -> str:  # pragma: no cover - readability only
+        return f"{self.key[:12]} ({self.status})"
+
+#shared compression dictionary trained on existing rows of one field; rows keep the id
+#of the dictionary they were packed with, so a dictionary is never deleted, only retired
+class CompressionDictionary(models.Model):
+    class Algorithm(models.TextChoices):
+        ZLIB = 'zlib', 'zlib'
+        ZSTD = 'zstd', 'zstd'
+
+    field = models.CharField(max_length=150, help_text='app_label.Model.field the dictionary was trained on.')
+    algorithm = models.CharField(max_length=8, choices=Algorithm.choices)
+    data = models.BinaryField()
+    sample_count = models.PositiveIntegerField(default=0)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['field', 'algorithm', '-id'], name='compression_dict_active_idx'),
+        ]
+        ordering = ['-id']
+
+    def __str__(self) -> str:  # pragma: no cover - readability only
+        return f"{self.field} {self.algorithm} #{self.id}"
@@ -0,0 +1,74 @@
+from django.db import transaction
+from rest_framework import serializers
+
+from apps.prompts.models import PromptSchema, SchemaField
+from apps.prompts.services.schema_service import schema_service
+
+
+class SchemaFieldSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SchemaField
+        fields = ('id', 'name', 'field_type', 'sort_order')
+        read_only_fields = ('id',)
+        extra_kwargs = {'sort_order': {'required': False}}
+
+
+class PromptSchemaSerializer(serializers.ModelSerializer):
+    fields = SchemaFieldSerializer(many=True, required=False)
+
+    class Meta:
+        model = PromptSchema
+        fields = ('id', 'name', 'description', 'is_active', 'max_prompt_tokens', 'fields', 'created_at', 'updated_at')
+        read_only_fields = ('id', 'created_at', 'updated_at')
+
+    def validate_name(self, name):
+        user = self.context['request'].user
+        qs = PromptSchema.objects.filter(user=user, name=name)
+        if self.instance is not None:
+            qs = qs.exclude(pk=self.instance.pk)
+        if qs.exists():
+            raise serializers.ValidationError('SCHEMA WITH THIS NAME ALREADY EXISTS!')
+        return name
+
+    def validate_fields(self, fields):
+        # PATCH makes nested fields partial too, but every row still needs its name
+        if any('name' not in field for field in fields):
+            raise serializers.ValidationError('EVERY FIELD NEEDS A NAME!')
+        names = [field['name'] for field in fields]
+        if len(names) != len(set(names)):
+            raise serializers.ValidationError('FIELD NAMES MUST BE UNIQUE!')
+        return fields
+
+    @transaction.atomic
+    def create(self, validated_data):
+        fields = validated_data.pop('fields', [])
+        schema = PromptSchema.objects.create(user=self.context['request'].user, **validated_data)
+        SchemaField.objects.bulk_create(
+            [
+                SchemaField(schema=schema, sort_order=field.pop('sort_order', index), **field)
+                for index, field in enumerate(fields)
+            ]
+        )
+        return schema
+
+    #fields sent with PUT/PATCH replace the schema's field set, the same way the bulk
+    #upsert endpoint does with replace=true
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        fields = validated_data.pop('fields', None)
+        instance = super().update(instance, validated_data)
+        if fields is not None:
+            schema_service.upsert_fields(instance, fields, replace=True)
+            instance.refresh_from_db(fields=['updated_at'])
+        return instance
+
+
+class FieldUpsertSerializer(serializers.Serializer):
+    fields = SchemaFieldSerializer(many=True)
+    replace = serializers.BooleanField(default=False)
+
+    def validate_fields(self, fields):
+        names = [field['name'] for field in fields]
+        if len(names) != len(set(names)):
+            raise serializers.ValidationError('FIELD NAMES MUST BE UNIQUE!')
+        return fields
@@ -1,22 +1,83 @@
-from .storage_service import storage_service, StorageService
-from .image_upload_handler import image_handler, ImageHandler, ImageUploadResult
-from .llm_service import (
-    llm_service,
-    LLMService,
-    LLMResponse,
-    LLMServiceError,
-    get_llm_service,
-)
-
-__all__ = [
-    'storage_service',
-    'StorageService',
-    'image_handler',
-    'ImageHandler',
-    'ImageUploadResult',
-    'llm_service',
-    'LLMService',
-    'LLMResponse',
-    'LLMServiceError',
-    'get_llm_service',
-]
\ No newline at end of file
+import importlib
+import sys
+from types import ModuleType
+
+# public name -> submodule that defines it; nothing is imported until first use,
+# so booting django (signals, management commands) never pays for openai or numpy
+_EXPORTS = {
+    'storage_service': 'storage_service',
+    'StorageService': 'storage_service',
+    'image_handler': 'image_upload_handler',
+    'ImageHandler': 'image_upload_handler',
+    'ImageUploadResult': 'image_upload_handler',
+    'llm_service': 'llm_service',
+    'LLMService': 'llm_service',
+    'LLMResponse': 'llm_service',
+    'LLMServiceError': 'llm_service',
+    'get_llm_service': 'llm_service',
+    'analytics_service': 'analytics_service',
+    'AnalyticsService': 'analytics_service',
+    'history_cache': 'history_cache',
+    'HistoryCache': 'history_cache',
+    'fragment_cache': 'fragment_cache',
+    'FragmentCache': 'fragment_cache',
+    'schema_service': 'schema_service',
+    'SchemaService': 'schema_service',
+    'prompt_templates': 'prompt_templates',
+    'PromptTemplateCache': 'prompt_templates',
+    'CompiledPromptTemplate': 'prompt_templates',
+    'PromptTooLargeError': 'token_budget',
+    'budget_for': 'token_budget',
+    'estimate_messages': 'token_budget',
+    'get_tokenizer': 'token_budget',
+    'semantic_cache': 'semantic_cache',
+    'SemanticCache': 'semantic_cache',
+    'quota_service': 'quota_service',
+    'QuotaService': 'quota_service',
+    'QuotaExceededError': 'quota_service',
+    'usage_rollups': 'usage_rollups',
+    'UsageRollupService': 'usage_rollups',
+    'execution_events': 'execution_events',
+    'ExecutionEventBroker': 'execution_events',
+    'serialize_event': 'execution_events',
+    'prompt_bodies': 'content_store',
+    'field_sets': 'content_store',
+    'ContentStore': 'content_store',
+    'ReplayEngine': 'replay',
+    'ReplayCheckpoint': 'replay',
+    'build_report': 'replay',
+    'FairShareScheduler': 'replay',
+    'payload_compressor': 'compression',
+    'PayloadCompressor': 'compression',
+    'compression_dictionaries': 'compression',
+    'get_codec': 'compression',
+    'idempotency_service': 'idempotency',
+    'IdempotencyService': 'idempotency',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f"{__name__}.{module_name}"), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
+
+#importing a submodule binds it on this package; several submodules share their
+#singleton's name, so that binding must not hide the exported instance
+class _ServicesModule(ModuleType):
+    def __setattr__(self, name, value):
+        if name in _EXPORTS and isinstance(value, ModuleType):
+            return
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _ServicesModule
@@ -0,0 +1,238 @@
+import logging
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+import numpy as np
+from django.conf import settings
+
+from apps.prompts.models import PromptExecution, PromptSchema, SchemaField
+from .output_validation import key_candidates
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PERCENTILES = (50, 90, 95, 99)
+UNFINISHED_STATUSES = (PromptExecution.Status.PENDING, PromptExecution.Status.RUNNING)
+
+
+def _to_number(value: Any) -> float:
+    if isinstance(value, bool) or value is None:
+        return np.nan
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.strip().replace(',', ''))
+        except ValueError:
+            return np.nan
+    return np.nan
+
+
+#column store for one schema, grows chunk by chunk
+@dataclass
+class SchemaColumns:
+    schema_id: int
+    version: Any
+    number_fields: Dict[str, Sequence[str]]
+    string_fields: Dict[str, Sequence[str]]
+    max_distinct: int = 1000
+    last_execution_id: int = 0
+    row_count: int = 0
+    #ids at or below the watermark that were still pending/running when scanned
+    unfinished_ids: Set[int] = field(default_factory=set)
+    _number_chunks: Dict[str, List[np.ndarray]] = field(default_factory=dict)
+    string_counts: Dict[str, Counter] = field(default_factory=dict)
+    string_totals: Dict[str, int] = field(default_factory=dict)
+    truncated: Set[str] = field(default_factory=set)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def append_rows(self, rows: List[Any]) -> None:
+        size = len(rows)
+        for name, keys in self.number_fields.items():
+            column = np.full(size, np.nan, dtype=np.float64)
+            for index, data in enumerate(rows):
+                if not isinstance(data, dict):
+                    continue
+                for key in keys:
+                    if key in data:
+                        column[index] = _to_number(data[key])
+                        break
+            self._number_chunks.setdefault(name, []).append(column)
+
+        for name, keys in self.string_fields.items():
+            counts = self.string_counts.setdefault(name, Counter())
+            total = 0
+            for data in rows:
+                if not isinstance(data, dict):
+                    continue
+                for key in keys:
+                    value = data.get(key)
+                    if value not in (None, ''):
+                        counts[str(value)] += 1
+                        total += 1
+                        break
+            self.string_totals[name] = self.string_totals.get(name, 0) + total
+            # free-text fields would otherwise keep every value ever seen; once past twice
+            # the cap only the most common values are kept, so rare counts become approximate
+            if len(counts) > self.max_distinct * 2:
+                kept = counts.most_common(self.max_distinct)
+                counts.clear()
+                counts.update(dict(kept))
+                self.truncated.add(name)
+        self.row_count += size
+
+    #merge chunks so reads work on one contiguous array
+    def number_column(self, name: str) -> np.ndarray:
+        chunks = self._number_chunks.get(name) or []
+        if not chunks:
+            return np.empty(0, dtype=np.float64)
+        if len(chunks) > 1:
+            chunks[:] = [np.concatenate(chunks)]
+        return chunks[0]
+
+
+class AnalyticsService:
+    def __init__(self, *, batch_size=None, max_distinct=None) -> None:
+        self.batch_size = batch_size or getattr(settings, 'ANALYTICS_BATCH_SIZE', 5000)
+        self.max_distinct = max_distinct or getattr(settings, 'ANALYTICS_MAX_DISTINCT_VALUES', 1000)
+        self._columns: Dict[int, SchemaColumns] = {}
+        self._lock = threading.Lock()
+
+    def _build_columns(self, schema: PromptSchema) -> SchemaColumns:
+        number_fields: Dict[str, Sequence[str]] = {}
+        string_fields: Dict[str, Sequence[str]] = {}
+        for name, field_type in schema.fields.values_list('name', 'field_type'):
+            target = number_fields if field_type == SchemaField.FieldType.NUMBER else string_fields
+            target[name] = key_candidates(name)
+        return SchemaColumns(
+            schema_id=schema.id,
+            version=schema.updated_at,
+            number_fields=number_fields,
+            string_fields=string_fields,
+            max_distinct=self.max_distinct,
+        )
+
+    #cached columns are dropped when the schema (and so its fields) changes
+    def get_columns(self, schema: PromptSchema) -> SchemaColumns:
+        with self._lock:
+            columns = self._columns.get(schema.id)
+            if columns is None or columns.version != schema.updated_at:
+                columns = self._build_columns(schema)
+                self._columns[schema.id] = columns
+        with columns.lock:
+            self._load_new_rows(columns)
+        return columns
+
+    #rows newer than the last seen id are fetched without model instances; rows that were
+    #still pending or running then are rechecked until they finish, so a late completion
+    #is counted once
+    def _load_new_rows(self, columns: SchemaColumns) -> None:
+        self._load_finished_rows(columns)
+        queryset = (
+            PromptExecution.objects
+            .filter(
+                schema_id=columns.schema_id,
+                status__in=(PromptExecution.Status.COMPLETED, *UNFINISHED_STATUSES),
+                id__gt=columns.last_execution_id,
+            )
+            .order_by('id')
+            .values_list('id', 'status', 'result_data')
+        )
+        batch: List[Any] = []
+        last_id = columns.last_execution_id
+        for execution_id, status, result_data in queryset.iterator(chunk_size=self.batch_size):
+            last_id = execution_id
+            if status != PromptExecution.Status.COMPLETED:
+                columns.unfinished_ids.add(execution_id)
+                continue
+            batch.append(result_data)
+            if len(batch) >= self.batch_size:
+                columns.append_rows(batch)
+                batch = []
+        if batch:
+            columns.append_rows(batch)
+        if last_id != columns.last_execution_id:
+            logger.debug(
+                'Analytics columns for schema %s advanced to execution %s (%s rows)',
+                columns.schema_id, last_id, columns.row_count,
+            )
+        columns.last_execution_id = last_id
+
+    def _load_finished_rows(self, columns: SchemaColumns) -> None:
+        unfinished = sorted(columns.unfinished_ids)
+        for start in range(0, len(unfinished), self.batch_size):
+            rows = (
+                PromptExecution.objects
+                .filter(id__in=unfinished[start:start + self.batch_size])
+                .exclude(status__in=UNFINISHED_STATUSES)
+                .values_list('id', 'status', 'result_data')
+            )
+            batch = []
+            for execution_id, status, result_data in rows:
+                # failed or deleted rows are dropped without being counted
+                columns.unfinished_ids.discard(execution_id)
+                if status == PromptExecution.Status.COMPLETED:
+                    batch.append(result_data)
+            if batch:
+                columns.append_rows(batch)
+
+    def _number_stats(self, values: np.ndarray, percentiles: Sequence[float], bins: int) -> Dict[str, Any]:
+        finite = values[np.isfinite(values)]
+        stats: Dict[str, Any] = {
+            'type': SchemaField.FieldType.NUMBER.value,
+            'count': int(finite.size),
+            'missing': int(values.size - finite.size),
+        }
+        if not finite.size:
+            stats.update({'mean': None, 'min': None, 'max': None, 'percentiles': {}, 'histogram': None})
+            return stats
+        points = np.percentile(finite, percentiles)
+        counts, edges = np.histogram(finite, bins=bins)
+        stats.update(
+            {
+                'mean': float(finite.mean()),
+                'min': float(finite.min()),
+                'max': float(finite.max()),
+                'percentiles': {f"p{p:g}": float(v) for p, v in zip(percentiles, points)},
+                'histogram': {'counts': counts.tolist(), 'edges': edges.tolist()},
+            }
+        )
+        return stats
+
+    def _string_stats(self, counts: Counter, total: int, row_count: int, top_k: int, truncated: bool) -> Dict[str, Any]:
+        return {
+            'type': SchemaField.FieldType.STRING.value,
+            'count': total,
+            'missing': row_count - total,
+            'distinct': len(counts),
+            # distinct only covers the values kept after pruning
+            'truncated': truncated,
+            'top_values': [{'value': value, 'count': count} for value, count in counts.most_common(top_k)],
+        }
+
+    def summarize(self, schema: PromptSchema, *, top_k=10, bins=10, percentiles: Optional[Sequence[float]] = None) -> Dict[str, Any]:
+        percentiles = tuple(percentiles or DEFAULT_PERCENTILES)
+        columns = self.get_columns(schema)
+        with columns.lock:
+            fields: Dict[str, Any] = {}
+            for name in columns.number_fields:
+                fields[name] = self._number_stats(columns.number_column(name), percentiles, bins)
+            for name in columns.string_fields:
+                counts = columns.string_counts.get(name, Counter())
+                fields[name] = self._string_stats(
+                    counts, columns.string_totals.get(name, 0), columns.row_count, top_k, name in columns.truncated,
+                )
+            return {
+                'schema_id': schema.id,
+                'execution_count': columns.row_count,
+                'last_execution_id': columns.last_execution_id,
+                'fields': fields,
+            }
+
+    def invalidate(self, schema_id: int) -> None:
+        with self._lock:
+            self._columns.pop(schema_id, None)
+
+
+analytics_service = AnalyticsService()
@@ -0,0 +1,215 @@
+import base64
+import logging
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.db import DatabaseError
+
+logger = logging.getLogger(__name__)
+
+# record separator; never typed by users, so plain values are recognised by its absence.
+# a plain value that does start with it is always packed, which keeps decoding unambiguous
+MARKER = '\x1e'
+ZLIB_MAX_DICTIONARY = 32 * 1024
+_TOKEN = re.compile(rb'\s*[^\s,:]+[,:]?')
+
+
+class ZlibCodec:
+    name = 'zlib'
+    tag = 'z'
+
+    def __init__(self, level: Optional[int] = None) -> None:
+        self.level = 6 if level is None else level
+
+    def compress(self, data: bytes, dictionary: Optional[bytes] = None) -> bytes:
+        compressor = zlib.compressobj(self.level, zdict=dictionary) if dictionary else zlib.compressobj(self.level)
+        return compressor.compress(data) + compressor.flush()
+
+    def decompress(self, data: bytes, dictionary: Optional[bytes] = None) -> bytes:
+        decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+        return decompressor.decompress(data) + decompressor.flush()
+
+    #zlib has no trainer; its preset dictionary is plain text expected to recur. tokens found in
+    #the most samples (weighted by length) are kept, the most valuable at the end where
+    #back-references are shortest
+    def train(self, samples: Iterable[bytes], size: int) -> bytes:
+        size = min(size, ZLIB_MAX_DICTIONARY)
+        counts: Counter = Counter()
+        for sample in samples:
+            counts.update(set(_TOKEN.findall(sample)))
+        ranked = sorted((token for token, count in counts.items() if count > 1), key=lambda token: counts[token] * len(token), reverse=True)
+        picked, total = [], 0
+        for token in ranked:
+            if total + len(token) > size:
+                continue
+            picked.append(token)
+            total += len(token)
+        return b''.join(reversed(picked))
+
+
+class ZstdCodec:
+    name = 'zstd'
+    tag = 's'
+
+    def __init__(self, level: Optional[int] = None) -> None:
+        try:
+            import zstandard
+        except ImportError as exc:  # pragma: no cover - dependency guard
+            raise RuntimeError('zstandard is required for COMPRESSION_ALGORITHM=zstd.') from exc
+        self.zstandard = zstandard
+        self.level = 3 if level is None else level
+        # compressor objects are not thread-safe and dictionaries are costly to prepare
+        self._local = threading.local()
+
+    def _pair(self, dictionary: Optional[bytes]):
+        cache = getattr(self._local, 'pairs', None)
+        if cache is None:
+            cache = self._local.pairs = {}
+        pair = cache.get(dictionary)
+        if pair is None:
+            zdict = self.zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+            pair = cache[dictionary] = (
+                self.zstandard.ZstdCompressor(level=self.level, dict_data=zdict),
+                self.zstandard.ZstdDecompressor(dict_data=zdict),
+            )
+        return pair
+
+    def compress(self, data: bytes, dictionary: Optional[bytes] = None) -> bytes:
+        return self._pair(dictionary)[0].compress(data)
+
+    def decompress(self, data: bytes, dictionary: Optional[bytes] = None) -> bytes:
+        return self._pair(dictionary)[1].decompress(data)
+
+    def train(self, samples: Iterable[bytes], size: int) -> bytes:
+        return self.zstandard.train_dictionary(size, list(samples)).as_bytes()
+
+
+CODECS = {codec.name: codec for codec in (ZlibCodec, ZstdCodec)}
+_CODECS_BY_TAG = {codec.tag: codec for codec in (ZlibCodec, ZstdCodec)}
+
+
+def get_codec(name: Optional[str] = None, level: Optional[int] = None):
+    name = name or getattr(settings, 'COMPRESSION_ALGORITHM', 'zlib')
+    if name not in CODECS:
+        raise ValueError(f"COMPRESSION_ALGORITHM must be one of {', '.join(CODECS)}, not {name!r}")
+    return CODECS[name](getattr(settings, 'COMPRESSION_LEVEL', None) if level is None else level)
+
+
+#trained dictionaries by id (immutable, kept for the process lifetime) and the active one
+#per field, re-read every few minutes so a newly trained dictionary gets picked up
+class DictionaryRegistry:
+    active_ttl = 300
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._by_id: Dict[int, bytes] = {}
+        self._active: Dict[Tuple[str, str], Tuple[float, Optional[Tuple[int, bytes]]]] = {}
+
+    def get(self, dictionary_id: int) -> bytes:
+        data = self._by_id.get(dictionary_id)
+        if data is None:
+            from apps.prompts.models import CompressionDictionary
+
+            data = bytes(CompressionDictionary.objects.values_list('data', flat=True).get(pk=dictionary_id))
+            with self._lock:
+                self._by_id[dictionary_id] = data
+        return data
+
+    def active(self, label: str, algorithm: str) -> Optional[Tuple[int, bytes]]:
+        if not getattr(settings, 'COMPRESSION_DICTIONARIES', False):
+            return None
+        key = (label, algorithm)
+        cached = self._active.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        from apps.prompts.models import CompressionDictionary
+
+        try:
+            row = (
+                CompressionDictionary.objects
+                .filter(field=label, algorithm=algorithm, is_active=True)
+                .order_by('-id')
+                .values_list('id', 'data')
+                .first()
+            )
+        except DatabaseError:
+            logger.warning('Compression dictionaries unavailable; compressing %s without one', label)
+            row = None
+        active = (row[0], bytes(row[1])) if row else None
+        with self._lock:
+            self._active[key] = (time.monotonic() + self.active_ttl, active)
+            if active:
+                self._by_id[active[0]] = active[1]
+        return active
+
+    def clear(self) -> None:
+        with self._lock:
+            self._by_id.clear()
+            self._active.clear()
+
+
+compression_dictionaries = DictionaryRegistry()
+
+
+def is_packed(value) -> bool:
+    return isinstance(value, str) and value.startswith(MARKER)
+
+
+#packed layout: MARKER, codec tag, optional dictionary id, ':', base64 of the compressed utf-8
+class PayloadCompressor:
+    def __init__(self, *, codec=None, threshold: Optional[int] = None, dictionary: Optional[Tuple[int, bytes]] = None) -> None:
+        self._codec = codec
+        self._threshold = threshold
+        # pins one dictionary (benchmarks); otherwise the registry's active one is used
+        self._dictionary = dictionary
+
+    @property
+    def codec(self):
+        if self._codec is None:
+            self._codec = get_codec()
+        return self._codec
+
+    @property
+    def threshold(self) -> int:
+        if self._threshold is not None:
+            return self._threshold
+        return getattr(settings, 'COMPRESSION_THRESHOLD_BYTES', 512)
+
+    def pack(self, text: str, label: str = '', *, force: bool = False) -> str:
+        data = text.encode('utf-8')
+        forced = force or text.startswith(MARKER)
+        if len(data) < self.threshold and not forced:
+            return text
+        dictionary = self._dictionary or compression_dictionaries.active(label, self.codec.name)
+        dictionary_id, dictionary_data = dictionary if dictionary else ('', None)
+        packed = (
+            f"{MARKER}{self.codec.tag}{dictionary_id}:"
+            + base64.b64encode(self.codec.compress(data, dictionary_data)).decode('ascii')
+        )
+        # short or already dense payloads can grow; those stay plain
+        if len(packed) >= len(data) and not forced:
+            return text
+        return packed
+
+    def unpack(self, value: str) -> str:
+        if not is_packed(value):
+            return value
+        header, _, body = value.partition(':')
+        codec_class = _CODECS_BY_TAG[header[1]]
+        codec = self.codec if isinstance(self.codec, codec_class) else codec_class()
+        dictionary = None
+        if len(header) > 2:
+            dictionary_id = int(header[2:])
+            if self._dictionary and self._dictionary[0] == dictionary_id:
+                dictionary = self._dictionary[1]
+            else:
+                dictionary = compression_dictionaries.get(dictionary_id)
+        return codec.decompress(base64.b64decode(body), dictionary).decode('utf-8')
+
+
+payload_compressor = PayloadCompressor()
@@ -0,0 +1,162 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from apps.core.cache import CacheNamespace
+from apps.prompts.models import FieldSet, PromptBody
+
+
+def canonical_text(value: str) -> str:
+    return value
+
+
+#key order and whitespace don't change a field set's digest
+def canonical_json(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+
+#interned, immutable rows keyed by the sha256 of their content. digest -> id is looked up in
+#a per-process LRU, then the shared cache, then the table. a hot value costs no query; a
+#cached one a cache read; a stored one a select; a new one a select, an insert and a select
+#for its id. all of it is batched per call, so bulk_create pays it once per batch
+class ContentStore:
+    def __init__(self, model, value_field: str, canonical: Callable[[Any], str], *, hot_size=None, timeout=None,
+                 hot_ttl=None) -> None:
+        self.model = model
+        self.value_field = value_field
+        self.canonical = canonical
+        self.hot_size = hot_size or getattr(settings, 'PROMPT_CONTENT_HOT_SIZE', 4096)
+        # local entries expire, so ids of purged rows can't linger in long-lived workers
+        self.hot_ttl = hot_ttl or getattr(settings, 'PROMPT_CONTENT_HOT_TTL', 300)
+        timeout = timeout if timeout is not None else getattr(settings, 'PROMPT_CONTENT_CACHE_TIMEOUT', 60 * 60 * 24)
+        # rows are never rewritten, so the version only moves with the digest scheme
+        self.cache = CacheNamespace(f"prompts.content.{model._meta.model_name}", version=1, timeout=timeout)
+        self._lock = threading.Lock()
+        self._hot: 'OrderedDict[str, Tuple[int, float]]' = OrderedDict()
+
+    def digest(self, value: Any) -> str:
+        return hashlib.sha256(self.canonical(value).encode('utf-8')).hexdigest()
+
+    def intern(self, value: Any) -> int:
+        return self.intern_many([value])[0]
+
+    def intern_many(self, values: Sequence[Any]) -> List[int]:
+        return self._ids([self.digest(value) for value in values], values)
+
+    #instances that stand in for the stored rows, so reading them back needs no query
+    def references(self, values: Sequence[Any]) -> list:
+        digests = [self.digest(value) for value in values]
+        instances = []
+        for pk, digest, value in zip(self._ids(digests, values), digests, values):
+            instance = self.model(pk=pk, digest=digest, **{self.value_field: value})
+            instance._state.adding = False
+            instances.append(instance)
+        return instances
+
+    def _ids(self, digests: List[str], values: Sequence[Any]) -> List[int]:
+        ids: Dict[str, int] = {}
+        now = time.monotonic()
+        with self._lock:
+            for digest in digests:
+                entry = self._hot.get(digest)
+                if entry is not None and entry[1] > now:
+                    self._hot.move_to_end(digest)
+                    ids[digest] = entry[0]
+        missing = {digest: value for digest, value in zip(digests, values) if digest not in ids}
+        if missing:
+            ids.update(self._resolve(missing))
+        return [ids[digest] for digest in digests]
+
+    def _resolve(self, missing: Dict[str, Any]) -> Dict[str, int]:
+        found = self.cache.get_many(missing)
+        self._remember_local(found)
+        unknown = [digest for digest in missing if digest not in found]
+        if unknown:
+            stored = dict(self.model.objects.filter(digest__in=unknown).values_list('digest', 'id'))
+            new = [digest for digest in unknown if digest not in stored]
+            if new:
+                # a concurrent writer may insert the same digest first; its row is as good as ours
+                self.model.objects.bulk_create(
+                    [self.model(digest=digest, **{self.value_field: missing[digest]}) for digest in new],
+                    ignore_conflicts=True,
+                )
+                stored.update(self.model.objects.filter(digest__in=new).values_list('digest', 'id'))
+            found.update(stored)
+            # ids from a transaction that rolls back must never reach the caches
+            transaction.on_commit(lambda: self._remember(stored))
+        return found
+
+    def _remember(self, ids: Dict[str, int]) -> None:
+        self.cache.set_many(ids)
+        self._remember_local(ids)
+
+    def _remember_local(self, ids: Dict[str, int]) -> None:
+        expires = time.monotonic() + self.hot_ttl
+        with self._lock:
+            for digest, pk in ids.items():
+                self._hot[digest] = (pk, expires)
+                self._hot.move_to_end(digest)
+            while len(self._hot) > self.hot_size:
+                self._hot.popitem(last=False)
+
+    def _forget(self, digests: Iterable[str]) -> None:
+        digests = list(digests)
+        self.cache.delete_many(digests)
+        with self._lock:
+            for digest in digests:
+                self._hot.pop(digest, None)
+
+    #deletes rows no execution points at any more, e.g. after their users were deleted.
+    #rows younger than `grace` are kept: they may have been interned for an execution that
+    #is not inserted yet. a worker still holding a purged id in its local cache drops it
+    #within hot_ttl; reusing it before then fails that insert on the foreign key
+    def purge_orphans(self, *, grace: timedelta = timedelta(days=1), batch_size: int = 1000) -> int:
+        relation = self.model._meta.get_field('executions').field
+        orphans = self.model.objects.filter(
+            ~Exists(relation.model.objects.filter(**{relation.name: OuterRef('pk')})),
+            created_at__lt=timezone.now() - grace,
+        )
+        deleted = last_id = 0
+        while True:
+            rows = list(orphans.filter(pk__gt=last_id).order_by('pk').values_list('pk', 'digest')[:batch_size])
+            if not rows:
+                return deleted
+            last_id = rows[-1][0]
+            # the condition is checked again, so a row picked up in the meantime stays
+            count, _ = orphans.filter(pk__in=[pk for pk, _ in rows]).delete()
+            deleted += count
+            self._forget(digest for _, digest in rows)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._hot.clear()
+
+
+#prompt bodies and field sets assigned to executions are interned here, in one batch per
+#store, right before the executions are inserted
+def intern_content(executions: Iterable[Any]) -> None:
+    executions = list(executions)
+    for pending, relation, store in (
+        ('_pending_prompt_text', 'prompt_body', prompt_bodies),
+        ('_pending_structured_fields', 'field_set', field_sets),
+    ):
+        assigned = [execution for execution in executions if pending in execution.__dict__]
+        if not assigned:
+            continue
+        instances = store.references([execution.__dict__[pending] for execution in assigned])
+        for execution, instance in zip(assigned, instances):
+            setattr(execution, relation, instance)
+            del execution.__dict__[pending]
+
+
+prompt_bodies = ContentStore(PromptBody, 'text', canonical_text)
+field_sets = ContentStore(FieldSet, 'fields', canonical_json)
@@ -0,0 +1,215 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Set
+
+from django.conf import settings
+from django.db import close_old_connections, connection, connections
+from django.utils import timezone
+
+from apps.prompts.models import PromptExecution
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('local', 'poll', 'postgres')
+NOTIFY_CHANNEL = 'prompt_execution_events'
+
+
+def serialize_event(execution: PromptExecution) -> Dict[str, Any]:
+    event = {
+        'id': execution.id,
+        'user_id': execution.user_id,
+        'status': execution.status,
+        'finished': execution.is_finished,
+        'updated_at': execution.updated_at.isoformat() if execution.updated_at else None,
+    }
+    if execution.is_finished:
+        event.update({
+            'result_data': execution.result_data,
+            'error_message': execution.error_message,
+            'model_name': execution.model_name,
+            'latency_ms': execution.latency_ms,
+        })
+    return event
+
+
+#one open stream; lives on the event loop that serves it, and every push is handed
+#over with call_soon_threadsafe so publishers never touch the queue directly
+class Subscription:
+    def __init__(self, user_id: int, loop: asyncio.AbstractEventLoop, maxsize: int) -> None:
+        self.user_id = user_id
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+
+    def push(self, event: Dict[str, Any]) -> None:
+        # a stalled client loses its oldest events, never the latest state
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: float) -> Optional[Dict[str, Any]]:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+#in-process pub/sub for execution status changes; with EXECUTION_EVENTS_BACKEND set to
+#poll or postgres one watcher thread per process relays changes made by other processes
+class ExecutionEventBroker:
+    def __init__(self, *, recent_size: int = 2048) -> None:
+        self._lock = threading.Lock()
+        self._subscriptions: Dict[int, Set[Subscription]] = defaultdict(set)
+        # (id, status, updated_at) already delivered, so a watcher re-reading a row is harmless
+        self._recent: 'OrderedDict[tuple, None]' = OrderedDict()
+        self._recent_size = recent_size
+        self._watcher: Optional[threading.Thread] = None
+
+    @property
+    def backend(self) -> str:
+        backend = getattr(settings, 'EXECUTION_EVENTS_BACKEND', 'local')
+        if backend not in BACKENDS:
+            raise ValueError(f"EXECUTION_EVENTS_BACKEND must be one of {', '.join(BACKENDS)}, not {backend!r}")
+        return backend
+
+    def subscribe(self, user_id: int) -> Subscription:
+        subscription = Subscription(
+            user_id,
+            asyncio.get_running_loop(),
+            getattr(settings, 'EXECUTION_EVENTS_QUEUE_SIZE', 100),
+        )
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        self._ensure_watcher()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def subscribed_user_ids(self) -> List[int]:
+        with self._lock:
+            return list(self._subscriptions)
+
+    def publish(self, event: Dict[str, Any]) -> int:
+        marker = (event['id'], event['status'], event['updated_at'])
+        with self._lock:
+            if marker in self._recent:
+                return 0
+            self._recent[marker] = None
+            if len(self._recent) > self._recent_size:
+                self._recent.popitem(last=False)
+            subscriptions = list(self._subscriptions.get(event['user_id'], ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.push, event)
+            except RuntimeError:
+                # the loop closed under a stream that never got to unsubscribe
+                self.unsubscribe(subscription)
+        return len(subscriptions)
+
+    #called from post_save once the transaction commits
+    def notify(self, execution: PromptExecution) -> None:
+        if self.backend == 'postgres':
+            # every process, this one included, hears it through its LISTEN watcher
+            payload = json.dumps({'id': execution.id, 'user_id': execution.user_id})
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_notify(%s, %s)', [NOTIFY_CHANNEL, payload])
+            return
+        self.publish(serialize_event(execution))
+
+    def publish_rows(self, execution_ids) -> None:
+        for execution in PromptExecution.objects.filter(id__in=execution_ids).order_by('updated_at'):
+            self.publish(serialize_event(execution))
+
+    def _ensure_watcher(self) -> None:
+        backend = self.backend
+        if backend == 'local':
+            return
+        with self._lock:
+            if self._watcher is not None and self._watcher.is_alive():
+                return
+            target = self._poll if backend == 'poll' else self._listen
+            self._watcher = threading.Thread(target=target, name=f"execution-events-{backend}", daemon=True)
+            self._watcher.start()
+
+    #one query per interval for the whole process, however many streams are open;
+    #the cursor overlaps by one interval and the recent set drops the repeats
+    def _poll(self) -> None:
+        interval = getattr(settings, 'EXECUTION_EVENTS_POLL_INTERVAL', 2.0)
+        cursor = timezone.now()
+        while True:
+            time.sleep(interval)
+            user_ids = self.subscribed_user_ids()
+            if not user_ids:
+                cursor = timezone.now()
+                continue
+            try:
+                close_old_connections()
+                rows = list(
+                    PromptExecution.objects
+                    .filter(user_id__in=user_ids, updated_at__gt=cursor - timedelta(seconds=interval))
+                    .order_by('updated_at')[:500]
+                )
+            except Exception:  # noqa: BLE001
+                logger.exception('Execution event poll failed')
+                continue
+            for execution in rows:
+                self.publish(serialize_event(execution))
+            if rows:
+                cursor = max(cursor, rows[-1].updated_at)
+
+    def _listen(self) -> None:
+        backoff = 1.0
+        while True:
+            try:
+                self._listen_once()
+                backoff = 1.0
+            except Exception:  # noqa: BLE001
+                logger.exception('Execution event listener lost its connection; retrying in %.0fs', backoff)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+    #a dedicated autocommit connection; notifications only carry ids, and the rows
+    #for subscribed users are loaded in one query per burst
+    def _listen_once(self) -> None:
+        wrapper = connections['default']
+        raw = wrapper.get_new_connection(wrapper.get_connection_params())
+        pending: List[Dict[str, Any]] = []
+        try:
+            raw.autocommit = True
+            psycopg3 = hasattr(raw, 'add_notify_handler')
+            if psycopg3:
+                raw.add_notify_handler(lambda notify: pending.append(json.loads(notify.payload)))
+            raw.cursor().execute(f'LISTEN {NOTIFY_CHANNEL}')
+            while True:
+                readable, _, _ = select.select([raw], [], [], 5.0)
+                if not readable:
+                    continue
+                if psycopg3:
+                    # running any statement makes psycopg dispatch queued notifications
+                    raw.execute('SELECT 1')
+                else:
+                    raw.poll()
+                    while raw.notifies:
+                        pending.append(json.loads(raw.notifies.pop(0).payload))
+                subscribed = set(self.subscribed_user_ids())
+                ids = {item['id'] for item in pending if item.get('user_id') in subscribed}
+                pending.clear()
+                if ids:
+                    close_old_connections()
+                    self.publish_rows(ids)
+        finally:
+            raw.close()
+
+
+execution_events = ExecutionEventBroker()
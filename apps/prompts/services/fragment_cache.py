@@ -0,0 +1,34 @@
+import logging
+from typing import Any, Callable, Dict, List
+
+from django.conf import settings
+from django.template.loader import render_to_string
+
+from apps.core.cache import CacheNamespace
+from apps.prompts.services.history_cache import history_cache
+
+logger = logging.getLogger(__name__)
+
+
+#rendered playground partials per user; the key carries the history cache generation,
+#so any committed save or delete moves every fragment to a fresh key without deletes
+class FragmentCache:
+    def __init__(self, *, timeout=None) -> None:
+        timeout = timeout if timeout is not None else getattr(settings, 'PROMPT_FRAGMENT_CACHE_TIMEOUT', 60 * 10)
+        # bump version whenever a partial's markup changes
+        self.cache = CacheNamespace('prompts.fragments', version=2, timeout=timeout)
+
+    def latest_execution_id(self, history: List[Dict[str, Any]]) -> int:
+        return history[0]['id'] if history else 0
+
+    #context_factory gets the cached history and is only called on a miss;
+    #partials are rendered without a request, so they must not use csrf or context processors
+    def render(self, name: str, user, template_name: str, context_factory: Callable[[List[Dict[str, Any]]], Dict[str, Any]], *, key=()) -> str:
+        generation, history = history_cache.snapshot(user)
+        return self.cache.get_or_set(
+            (name, user.id, generation, *key),
+            lambda: render_to_string(template_name, context_factory(history)),
+        )
+
+
+fragment_cache = FragmentCache()
@@ -0,0 +1,83 @@
+import logging
+import uuid
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+
+from apps.core.cache import CacheNamespace
+from apps.prompts.models import PromptExecution, UploadedImage
+
+logger = logging.getLogger(__name__)
+
+
+def _image_url(image: Optional[UploadedImage]) -> Optional[str]:
+    if not image:
+        return None
+    return image.image_url or (image.file.url if image.file else None)
+
+
+#recent history per user. entries are stored under a per-user generation token that every
+#committed write replaces, so concurrent writers never patch the same list and a rebuild
+#that raced a write lands on a generation nobody reads any more
+class HistoryCache:
+    def __init__(self, *, limit=None, timeout=None) -> None:
+        self.limit = limit or getattr(settings, 'PROMPT_HISTORY_LIMIT', 5)
+        timeout = timeout if timeout is not None else getattr(settings, 'PROMPT_HISTORY_CACHE_TIMEOUT', 60 * 60 * 24)
+        # bump version whenever the serialized entry layout changes
+        self.cache = CacheNamespace('prompts.history', version=2, timeout=timeout)
+
+    def serialize(self, execution: PromptExecution) -> Dict[str, Any]:
+        return {
+            'id': execution.id,
+            'prompt_text': execution.prompt_text,
+            'result_data': execution.result_data,
+            'created_at': execution.created_at,
+            'model_name': execution.model_name,
+            'image_url': _image_url(execution.image),
+        }
+
+    def generation(self, user_id: int) -> str:
+        key = ('generation', user_id)
+        generation = self.cache.get(key)
+        if generation is None:
+            # evicted or never written; a fresh token can't collide with an old entry
+            self.cache.add(key, uuid.uuid4().hex)
+            generation = self.cache.get(key)
+        return generation
+
+    def get(self, user) -> List[Dict[str, Any]]:
+        return self.snapshot(user)[1]
+
+    #(generation, history); keys derived from the generation move on with every write
+    def snapshot(self, user) -> Tuple[str, List[Dict[str, Any]]]:
+        if not user.is_authenticated:
+            return '', []
+        generation = self.generation(user.id)
+        history = self.cache.get((user.id, generation))
+        if history is None:
+            history = self.rebuild(user.id, generation)
+        return generation, history
+
+    def rebuild(self, user_id: int, generation: Optional[str] = None) -> List[Dict[str, Any]]:
+        generation = generation or self.generation(user_id)
+        qs = (
+            PromptExecution.objects.select_related('image', 'prompt_body')
+            .filter(user_id=user_id)
+            .order_by('-created_at')[:self.limit]
+        )
+        history = [self.serialize(execution) for execution in qs]
+        self.cache.set((user_id, generation), history)
+        return history
+
+    #saves and deletes only move the generation once they commit; a rolled back write
+    #leaves the cached history alone and the next read rebuilds after a committed one
+    def record(self, execution: PromptExecution) -> None:
+        transaction.on_commit(partial(self.invalidate, execution.user_id))
+
+    def invalidate(self, user_id: int) -> None:
+        self.cache.set(('generation', user_id), uuid.uuid4().hex)
+
+
+history_cache = HistoryCache()
@@ -0,0 +1,67 @@
+import hashlib
+import logging
+from datetime import timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from apps.prompts.models import IdempotencyKey, PromptExecution
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyService:
+    def __init__(self, *, ttl_seconds=None) -> None:
+        self.ttl_seconds = ttl_seconds or getattr(settings, 'IDEMPOTENCY_KEY_TTL_SECONDS', 600)
+
+    #form submissions without a client key are keyed on session + the nonce rendered into the form
+    def derive_key(self, session_key: str, nonce: str) -> str:
+        return hashlib.sha256(f"{session_key}:{nonce}".encode('utf-8')).hexdigest()
+
+    def key_for_request(self, request) -> Optional[str]:
+        client_key = (request.headers.get('Idempotency-Key') or '').strip()
+        if client_key:
+            return client_key[:128]
+        nonce = (request.POST.get('idempotency_nonce') or '').strip()
+        if not nonce:
+            return None
+        if not request.session.session_key:
+            request.session.save()
+        return self.derive_key(request.session.session_key, nonce)
+
+    #returns (record, created); the unique constraint decides which request runs
+    def claim(self, user, key: str) -> Tuple[IdempotencyKey, bool]:
+        now = timezone.now()
+        IdempotencyKey.objects.filter(user=user, key=key, expires_at__lte=now).delete()
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    user=user,
+                    key=key,
+                    expires_at=now + timedelta(seconds=self.ttl_seconds),
+                )
+            return record, True
+        except IntegrityError:
+            record = IdempotencyKey.objects.select_related('execution').get(user=user, key=key)
+            logger.info('Duplicate submission for user %s (key %s..., %s)', user.pk, key[:12], record.status)
+            return record, False
+
+    def complete(self, record: IdempotencyKey, execution: Optional[PromptExecution], response_data: Dict[str, Any]) -> None:
+        record.status = IdempotencyKey.Status.COMPLETED
+        record.execution = execution
+        record.response_data = response_data
+        record.save(update_fields=['status', 'execution', 'response_data'])
+
+    #failed attempts free the key so the user can simply retry
+    def release(self, record: Optional[IdempotencyKey]) -> None:
+        if record is not None and record.pk:
+            record.delete()
+
+    def purge_expired(self) -> int:
+        deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+        return deleted
+
+
+idempotency_service = IdempotencyService()
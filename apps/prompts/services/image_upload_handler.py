@@ -23,23 +23,21 @@ class ImageHandler:
     def handle_upload(self, user, file: UploadedFile) -> ImageUploadResult:
 
         # IMAGE VALIDATTION
-        logger.debug(f"Validating image: {file.name}")
+        logger.debug('Validating image: %s', file.name)
         validate_image(file)
         
         # hash calculations        
         file_content = file.read()
-        logger.debug(f"Read {len(file_content)} bytes from uploaded file")
+        logger.debug('Read %s bytes from uploaded file', len(file_content))
         file_hash = UploadedImage.calculate_hash(file_content=file_content)
         
-        logger.debug(f"Image hash: {file_hash[:16]}...")
+        logger.debug('Image hash: %.16s...', file_hash)
         
         # DUP CHECK
         existing_image = self._find_duplicate(user, file_hash)
         
         if existing_image:
-            logger.info(
-                f"DUPLICATE IMAGE FOUND FOR: {user.id}: {existing_image.id}"
-            )
+            logger.info('DUPLICATE IMAGE FOUND FOR: %s: %s', user.id, existing_image.id)
             return ImageUploadResult(
                 image=existing_image,
                 is_duplicate=True,
@@ -47,7 +45,7 @@ class ImageHandler:
             )
         
         # STORE IN STORAGE + DB (for history and stuff)
-        logger.debug(f"Uploading image for user {user.id} to configured storage")
+        logger.debug('Uploading image for user %s to configured storage', user.id)
         storage_result = storage_service.upload_image(
             file_content=file_content,
             original_filename=file.name,
@@ -69,9 +67,7 @@ class ImageHandler:
 
         uploaded_image = UploadedImage.objects.create(**image_kwargs)
         
-        logger.info(
-            f"New image uploaded: {uploaded_image.id} for user {user.id}"
-        )
+        logger.info('New image uploaded: %s for user %s', uploaded_image.id, user.id)
         
         #RESULT
         return ImageUploadResult(
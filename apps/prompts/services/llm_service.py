@@ -1,18 +1,51 @@
+import importlib.util
 import json
 import logging
-from dataclasses import dataclass
-from typing import Any, Dict, Iterable, List, Mapping
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Dict
 
 from django.conf import settings
-from openai import OpenAI
-from openai import APIConnectionError, APIError, BadRequestError, RateLimitError
+
+from apps.core.log import REQUEST_ID_HEADER, get_correlation_id
+from .prompt_templates import prompt_templates
+from .quota_service import quota_service
+from .semantic_cache import semantic_cache
+from .token_budget import budget_for, completion_budget
+
+if TYPE_CHECKING:  # pragma: no cover - the SDK is imported on first use
+    from openai import OpenAI
 
 logger = logging.getLogger(__name__)
 
 
+#one pooled transport shared by every request thread; limits and http/2 come from settings
+def _build_http_client():
+    import httpx
+    from openai import DefaultHttpxClient
+
+    http2 = getattr(settings, 'OPENAI_HTTP2', False)
+    if http2 and importlib.util.find_spec('h2') is None:
+        logger.info('h2 is not installed; OpenAI transport falls back to HTTP/1.1')
+        http2 = False
+    return DefaultHttpxClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=getattr(settings, 'OPENAI_MAX_CONNECTIONS', 50),
+            max_keepalive_connections=getattr(settings, 'OPENAI_MAX_KEEPALIVE_CONNECTIONS', 20),
+            keepalive_expiry=getattr(settings, 'OPENAI_KEEPALIVE_EXPIRY', 60.0),
+        ),
+    )
+
+
 class LLMServiceError(RuntimeError):
     """Raised when the LLM service cannot fulfill a request."""
 
+    def __init__(self, message='', *, model=''):
+        super().__init__(message)
+        self.model = model
+
 
 @dataclass
 class LLMResponse:
@@ -20,6 +53,26 @@ class LLMResponse:
     raw_text: str
     model: str
     usage: Dict[str, int]
+    validation_errors: Dict[str, str] = field(default_factory=dict)
+    latency_ms: int = 0
+
+
+def _usage_dict(usage) -> Dict[str, int]:
+    prompt_details = getattr(usage, 'prompt_tokens_details', None)
+    return {
+        'prompt_tokens': getattr(usage, 'prompt_tokens', 0) or 0,
+        'completion_tokens': getattr(usage, 'completion_tokens', 0) or 0,
+        'total_tokens': getattr(usage, 'total_tokens', 0) or 0,
+        'cached_tokens': getattr(prompt_details, 'cached_tokens', 0) or 0,
+    }
+
+
+def _parse_json(raw_content: str) -> Any:
+    try:
+        return json.loads(raw_content)
+    except json.JSONDecodeError:
+        logger.warning('RETURNED INVALID JSON')
+        return None
 
 
 class LLMService:
@@ -28,96 +81,184 @@ class LLMService:
         self._api_key = api_key or getattr(settings, 'OPENAI_API_KEY', '')
         self._base_url = base_url or getattr(settings, 'OPENAI_API_BASE', 'https://api.openai.com/v1')
         self.default_model = default_model or getattr(settings, 'OPENAI_MODEL', 'gpt-4o-mini')
+        self.send_prompt_cache_key = getattr(settings, 'OPENAI_PROMPT_CACHE_KEY', True)
+        self.strict_json_schema = getattr(settings, 'OPENAI_STRICT_JSON_SCHEMA', True)
+        self.repair_attempts = getattr(settings, 'LLM_REPAIR_ATTEMPTS', 1)
         self._client = None
+        self._http_client = None
+        self._client_lock = threading.Lock()
 
-    #client init
-    def _get_client(self) -> OpenAI:
-        if not self._client:
-            api_key = self._api_key or settings.OPENAI_API_KEY
-            if not api_key:
-                raise LLMServiceError('OPENAI_API_KEY is not configured')
-            self._client = OpenAI(api_key=api_key, base_url=self._base_url)
-        return self._client
+    #client init, once per process even when several request threads race for it
+    def _get_client(self) -> 'OpenAI':
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    api_key = self._api_key or settings.OPENAI_API_KEY
+                    if not api_key:
+                        raise LLMServiceError('OPENAI_API_KEY is not configured')
+                    from openai import OpenAI
 
-    #returns structured field instructions
-    def _build_field_instructions(self, fields: Iterable[Mapping[str, Any]]) -> str:
-        lines: List[str] = []
-        for field in fields or []:
-            name = field.get('name') if isinstance(field, Mapping) else str(field)
-            field_type = field.get('field_type', 'string') if isinstance(field, Mapping) else 'string'
-            lines.append(f"- {name}: {field_type}")
-        if not lines:
-            lines.append('- response_text: string')
-        return '\n'.join(lines)
-
-    #build message using fields and image and text to then send to openai
-    def _build_messages(self, prompt_text, field_instructions, image_url,) -> List[Dict[str, str]]:
-        image_hint = f"An image has been uploaded. URL: {image_url}\n" if image_url else ''
-        user_message = (
-            f"{image_hint}Respond to the following prompt.\n"
-            f"Prompt:\n{prompt_text.strip()}\n\n"
-            "Return a JSON object that strictly follows these fields:\n"
-            f"{field_instructions}.\nUse lower_snake_case keys and numbers for numeric fields."
-        )
-        return [
-            {
-                'role': 'system',
-                'content': 'You are a structured data generator. Always respond with valid JSON.',
-            },
-            {
-                'role': 'user',
-                'content': user_message,
-            },
-        ]
+                    self._http_client = _build_http_client()
+                    self._client = OpenAI(api_key=api_key, base_url=self._base_url, http_client=self._http_client)
+        return self._client
 
-    #build message and then send to openai
-    def generate_structured_response(self, *, prompt_text, fields, image_url, model="gpt-5.1", temperature=0.7, max_tokens="5000",) -> LLMResponse:
-        if not prompt_text or not prompt_text.strip():
-            raise ValueError('PROMPT TEXT REQUIRED')
+    #builds the client and opens a pooled connection so the first user skips the handshakes
+    def warm_up(self) -> bool:
+        try:
+            self._get_client()
+        except LLMServiceError:
+            logger.debug('Skipping OpenAI warm-up: no API key configured')
+            return False
+        try:
+            self._http_client.head(self._base_url, timeout=5.0)
+        except Exception as exc:  # noqa: BLE001
+            logger.warning('OpenAI warm-up request failed: %s', exc)
+            return False
+        return True
 
-        normalized_fields = list(fields or [])
-        field_instructions = self._build_field_instructions(normalized_fields)
-        messages = self._build_messages(prompt_text, field_instructions, image_url)
-        model_name = model or self.default_model
+    def _create_completion(self, *, model_name, messages, template, response_format, **options):
+        #routes requests sharing a template to the same provider-side prefix cache
+        extra_body = {'prompt_cache_key': template.fingerprint} if self.send_prompt_cache_key else None
+        from openai import APIConnectionError, APIError, BadRequestError, RateLimitError
 
         try:
-            logger.debug('SENDING TO MODEL %s', model_name)
-            response = self._get_client().chat.completions.create(
+            logger.debug('SENDING TO MODEL %s (template %s)', model_name, template.fingerprint)
+            return self._get_client().chat.completions.create(
                 model=model_name,
                 messages=messages,
-                temperature=temperature,
-                # max_tokens=max_tokens,
-                response_format={"type": "json_object"},
+                response_format=response_format,
+                extra_body=extra_body,
+                extra_headers={REQUEST_ID_HEADER: get_correlation_id()},
+                **options,
             )
         except (APIConnectionError, RateLimitError) as exc:
             logger.warning('CONNECTION OPENAI ERROR: %s', exc)
-            raise LLMServiceError('CONNECTION OPENAI ERROR') from exc
+            raise LLMServiceError('CONNECTION OPENAI ERROR', model=model_name) from exc
         except (BadRequestError, APIError) as exc:
             logger.error('OPENAI REJECT: %s', exc)
-            raise LLMServiceError('OPENAI REJECT CHECK FIELDS') from exc
+            raise LLMServiceError('OPENAI REJECT CHECK FIELDS', model=model_name) from exc
 
-        choice = response.choices[0]
-        
-        #gets raw cibteb and triees loading to json
-        raw_content = choice.message.content or ''
+    def _response_format(self, template, field_names=None) -> Dict[str, Any]:
+        if not self.strict_json_schema:
+            return {"type": "json_object"}
+        if field_names is None:
+            return template.response_format
+        return template.repair_response_format(field_names)
+
+    #build message and then send to openai
+    def generate_structured_response(self, *, prompt_text, fields, image_url, schema=None, user=None, model="gpt-5.1", temperature=0.7, max_tokens=None, use_semantic_cache=True,) -> LLMResponse:
+        if not prompt_text or not prompt_text.strip():
+            raise ValueError('PROMPT TEXT REQUIRED')
+
+        #static system/instruction prefix first, then the per-request prompt
+        if schema is not None:
+            template = prompt_templates.for_schema(schema)
+        else:
+            template = prompt_templates.for_fields(fields)
+        messages = template.build_messages(prompt_text, image_url)
+        model_name = model or self.default_model
+
+        #local estimate; rejects or truncates before any network I/O
+        estimated_tokens = budget_for(user, schema).enforce(messages, model_name)
+
+        #paraphrases of earlier prompts for the same fields are answered locally
+        cache_key = None
+        if use_semantic_cache and semantic_cache.enabled and not image_url:
+            cache_key = semantic_cache.index_key(template_fingerprint=template.fingerprint, model=model_name, user=user)
+            match = semantic_cache.lookup(cache_key, prompt_text)
+            if match:
+                return LLMResponse(
+                    structured_data=dict(match.payload['structured_data']),
+                    raw_text=match.payload['raw_text'],
+                    model=match.payload['model'],
+                    usage={
+                        'prompt_tokens': 0,
+                        'completion_tokens': 0,
+                        'total_tokens': 0,
+                        'cached_tokens': 0,
+                        'estimated_prompt_tokens': estimated_tokens,
+                        'semantic_cache_hit': 1,
+                        'semantic_similarity': round(match.similarity, 4),
+                    },
+                )
+
+        #over-quota users are stopped here, before any network I/O
+        reservation = quota_service.reserve(user, estimated_tokens)
+        started = time.perf_counter()
+        #whatever happens below, the reservation ends up holding the tokens actually used
+        usage: Dict[str, int] = {}
         try:
-            structured = json.loads(raw_content)
-        except json.JSONDecodeError:
-            logger.warning('RETURNED INVALID JSON')
-            structured = {'raw_response': raw_content}
-
-        usage = {
-            'prompt_tokens': getattr(response.usage, 'prompt_tokens', 0),
-            'completion_tokens': getattr(response.usage, 'completion_tokens', 0),
-            'total_tokens': getattr(response.usage, 'total_tokens', 0),
-        }
-        #give out response
-        return LLMResponse(
-            structured_data=structured,
+            response = self._create_completion(
+                model_name=model_name,
+                messages=messages,
+                template=template,
+                response_format=self._response_format(template),
+                temperature=temperature,
+                max_completion_tokens=max_tokens or completion_budget(len(template.fields)),
+            )
+
+            #gets raw content and validates it against the compiled field checks
+            raw_content = response.choices[0].message.content or ''
+            result = template.validator.validate(_parse_json(raw_content))
+            usage = _usage_dict(response.usage)
+            usage['estimated_prompt_tokens'] = estimated_tokens
+            logger.debug(
+                'PROMPT TOKENS estimated=%s actual=%s',
+                estimated_tokens, usage['prompt_tokens'],
+            )
+
+            #only the failing fields are asked for again, reusing the cached prefix
+            attempts = 0
+            while result.errors and attempts < self.repair_attempts:
+                attempts += 1
+                logger.info('REPAIRING %s INVALID FIELDS (attempt %s)', len(result.errors), attempts)
+                try:
+                    repair = self._create_completion(
+                        model_name=model_name,
+                        messages=template.build_repair_messages(messages, raw_content, result.errors),
+                        template=template,
+                        response_format=self._response_format(template, result.errors),
+                        temperature=0,
+                        max_completion_tokens=completion_budget(len(result.errors)),
+                    )
+                except LLMServiceError as exc:
+                    # the first answer is still usable; its failing fields are reported as invalid
+                    logger.warning('REPAIR FAILED, KEEPING FIRST RESPONSE: %s', exc)
+                    break
+                for key, value in _usage_dict(repair.usage).items():
+                    usage[key] = usage.get(key, 0) + value
+                repaired = template.validator.validate(_parse_json(repair.choices[0].message.content or ''))
+                for name in list(result.errors):
+                    if name in repaired.data:
+                        result.data[name] = repaired.data[name]
+                        del result.errors[name]
+                    else:
+                        result.errors[name] = repaired.errors.get(name, result.errors[name])
+            usage['repair_attempts'] = attempts
+        finally:
+            quota_service.settle(reservation, usage)
+
+        if result.errors:
+            logger.warning('FIELDS STILL INVALID AFTER REPAIR: %s', ', '.join(result.errors))
+            for name in result.errors:
+                result.data.setdefault(name, None)
+
+        llm_response = LLMResponse(
+            structured_data=result.data,
             raw_text=raw_content,
             model=response.model or model_name,
             usage=usage,
+            validation_errors=result.errors,
+            latency_ms=int((time.perf_counter() - started) * 1000),
         )
+        if cache_key and not result.errors:
+            semantic_cache.store(
+                cache_key,
+                prompt_text,
+                {'structured_data': result.data, 'raw_text': raw_content, 'model': llm_response.model},
+            )
+        #give out response
+        return llm_response
 
 
 def get_llm_service() -> LLMService:
@@ -0,0 +1,118 @@
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Mapping, Tuple
+
+FieldSpec = Tuple[Tuple[str, str], ...]
+
+_INT_RE = re.compile(r'^[+-]?\d+$')
+_NUMBER_RE = re.compile(r'^[+-]?(\d+(\.\d*)?|\.\d+)([eE][+-]?\d+)?$')
+
+
+class FieldValueError(ValueError):
+    """Raised when a field value cannot be coerced to its declared type."""
+
+
+#results are stored under lower_snake_case keys, the spelling the prompt asks for
+def output_key(name: str) -> str:
+    return re.sub(r'(?<!^)(?=[A-Z])', '_', name).replace('-', '_').lower()
+
+
+#keys a stored result may use for a field: the name as written, then its output_key
+def key_candidates(name: str) -> Tuple[str, ...]:
+    key = output_key(name)
+    return (name,) if key == name else (name, key)
+
+
+def _coerce_number(value: Any):
+    if isinstance(value, bool):
+        raise FieldValueError('expected a number, got a boolean')
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        text = value.strip().replace(',', '')
+        if _INT_RE.match(text):
+            return int(text)
+        if _NUMBER_RE.match(text):
+            return float(text)
+    raise FieldValueError(f"expected a number, got {value!r}")
+
+
+def _coerce_string(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise FieldValueError(f"expected a string, got {type(value).__name__}")
+
+
+_COERCERS: Dict[str, Callable[[Any], Any]] = {
+    'number': _coerce_number,
+    'string': _coerce_string,
+}
+
+
+@dataclass
+class ValidationResult:
+    data: Dict[str, Any]
+    errors: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def is_valid(self) -> bool:
+        return not self.errors
+
+
+#per-field checks resolved once, then reused for every response of the same field set;
+#data and errors are keyed by output_key, and the field name as written is accepted too
+class CompiledValidator:
+    def __init__(self, fields: FieldSpec) -> None:
+        self.fields = fields
+        self._checks: List[Tuple[str, Tuple[str, ...], Callable[[Any], Any]]] = []
+        for name, field_type in fields:
+            key = output_key(name)
+            aliases = (name,) if name != key else ()
+            self._checks.append((key, aliases, _COERCERS.get(field_type, _coerce_string)))
+
+    def validate(self, payload: Any) -> ValidationResult:
+        if not isinstance(payload, Mapping):
+            return ValidationResult(
+                data={},
+                errors={name: 'response was not a JSON object' for name, _, _ in self._checks},
+            )
+        data: Dict[str, Any] = {}
+        errors: Dict[str, str] = {}
+        for name, aliases, coerce in self._checks:
+            key = name if name in payload else next((alias for alias in aliases if alias in payload), None)
+            if key is None:
+                errors[name] = 'missing'
+                continue
+            try:
+                data[name] = coerce(payload[key])
+            except FieldValueError as exc:
+                errors[name] = str(exc)
+        return ValidationResult(data=data, errors=errors)
+
+
+@lru_cache(maxsize=512)
+def compile_validator(fields: FieldSpec) -> CompiledValidator:
+    return CompiledValidator(fields)
+
+
+def build_json_schema(fields: FieldSpec, *, name: str) -> Dict[str, Any]:
+    properties = {
+        output_key(field_name): {'type': 'number' if field_type == 'number' else 'string'}
+        for field_name, field_type in fields
+    }
+    return {
+        'type': 'json_schema',
+        'json_schema': {
+            'name': name,
+            'strict': True,
+            'schema': {
+                'type': 'object',
+                'properties': properties,
+                'required': list(properties),
+                'additionalProperties': False,
+            },
+        },
+    }
@@ -0,0 +1,111 @@
+import hashlib
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from apps.prompts.models import PromptSchema
+from .output_validation import CompiledValidator, build_json_schema, compile_validator, output_key
+from .schema_service import schema_service
+
+SYSTEM_MESSAGE = 'You are a structured data generator. Always respond with valid JSON.'
+
+FieldSpec = Tuple[Tuple[str, str], ...]
+
+DEFAULT_FIELDS: FieldSpec = (('response_text', 'string'),)
+
+
+def _normalize_fields(fields: Iterable[Any]) -> FieldSpec:
+    spec = []
+    for field in fields or []:
+        if isinstance(field, Mapping):
+            spec.append((str(field.get('name')), str(field.get('field_type', 'string'))))
+        else:
+            spec.append((str(field), 'string'))
+    return tuple(spec)
+
+
+#static part of every request; byte-identical for the same fields so providers can reuse the prefix
+@dataclass(frozen=True)
+class CompiledPromptTemplate:
+    fields: FieldSpec
+    system_content: str
+    fingerprint: str
+    response_format: Dict[str, Any]
+    validator: CompiledValidator
+
+    def build_messages(self, prompt_text: str, image_url: Optional[str]) -> List[Dict[str, str]]:
+        image_hint = f"An image has been uploaded. URL: {image_url}\n" if image_url else ''
+        return [
+            {'role': 'system', 'content': self.system_content},
+            {
+                'role': 'user',
+                'content': f"{image_hint}Respond to the following prompt.\nPrompt:\n{prompt_text.strip()}",
+            },
+        ]
+
+    #follow-up turn asking only for the fields that failed validation
+    def build_repair_messages(self, messages: List[Dict[str, str]], raw_text: str, errors: Mapping[str, str]) -> List[Dict[str, str]]:
+        problems = '\n'.join(f"- {name}: {reason}" for name, reason in errors.items())
+        return messages + [
+            {'role': 'assistant', 'content': raw_text},
+            {
+                'role': 'user',
+                'content': (
+                    "These fields were missing or had the wrong type:\n"
+                    f"{problems}\nReturn a JSON object with only these fields, corrected."
+                ),
+            },
+        ]
+
+    #field_names are output keys, as reported in ValidationResult.errors
+    def repair_response_format(self, field_names: Iterable[str]) -> Dict[str, Any]:
+        wanted = set(field_names)
+        subset = tuple(spec for spec in self.fields if output_key(spec[0]) in wanted)
+        return build_json_schema(subset, name=f"repair_{self.fingerprint}")
+
+
+@lru_cache(maxsize=512)
+def compile_fields(fields: FieldSpec) -> CompiledPromptTemplate:
+    fields = fields or DEFAULT_FIELDS
+    field_instructions = '\n'.join(f"- {name}: {field_type}" for name, field_type in fields)
+    system_content = (
+        f"{SYSTEM_MESSAGE}\n\n"
+        "Return a JSON object that strictly follows these fields:\n"
+        f"{field_instructions}.\nUse lower_snake_case keys and numbers for numeric fields."
+    )
+    fingerprint = hashlib.sha256(system_content.encode('utf-8')).hexdigest()[:16]
+    return CompiledPromptTemplate(
+        fields=fields,
+        system_content=system_content,
+        fingerprint=fingerprint,
+        response_format=build_json_schema(fields, name=f"structured_{fingerprint}"),
+        validator=compile_validator(fields),
+    )
+
+
+class PromptTemplateCache:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._by_schema: Dict[int, Tuple[Any, CompiledPromptTemplate]] = {}
+
+    def for_fields(self, fields: Iterable[Any]) -> CompiledPromptTemplate:
+        return compile_fields(_normalize_fields(fields))
+
+    #recompiled only when the schema's updated_at moves
+    def for_schema(self, schema: PromptSchema) -> CompiledPromptTemplate:
+        with self._lock:
+            cached = self._by_schema.get(schema.id)
+        if cached and cached[0] == schema.updated_at:
+            return cached[1]
+        template = self.for_fields(schema_service.field_rows(schema))
+        with self._lock:
+            self._by_schema[schema.id] = (schema.updated_at, template)
+        return template
+
+    def invalidate(self, schema_id: int) -> None:
+        with self._lock:
+            self._by_schema.pop(schema_id, None)
+
+
+prompt_templates = PromptTemplateCache()
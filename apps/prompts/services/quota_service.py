@@ -0,0 +1,129 @@
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, Mapping, Optional
+
+from django.conf import settings
+from django.db.models import F
+
+from apps.prompts.models import QuotaCounter
+
+logger = logging.getLogger(__name__)
+
+
+class QuotaExceededError(RuntimeError):
+    """Raised before any provider call when a user is over their quota."""
+
+
+@dataclass(frozen=True)
+class QuotaLimits:
+    requests: int
+    tokens: int
+    window_seconds: int
+
+    @property
+    def unlimited(self) -> bool:
+        return not self.requests and not self.tokens
+
+
+@dataclass
+class QuotaReservation:
+    user_id: int
+    window: int
+    reserved_tokens: int
+
+
+def _parse_user_quotas(configured) -> Dict[str, Dict[str, int]]:
+    quotas = {}
+    for username, limits in (configured or {}).items():
+        if isinstance(limits, Mapping):
+            quotas[str(username)] = {key: int(value) for key, value in limits.items()}
+        else:
+            requests, _, tokens = str(limits).partition(':')
+            quotas[str(username)] = {'requests': int(requests or 0), 'tokens': int(tokens or 0)}
+    return quotas
+
+
+#fixed-window counters in QuotaCounter rows. the limit check and the increment are one
+#conditional UPDATE, so concurrent requests in any number of workers can't overshoot
+class QuotaService:
+    def limits_for(self, user) -> QuotaLimits:
+        window = getattr(settings, 'LLM_QUOTA_WINDOW_SECONDS', 3600)
+        limits = {
+            'requests': getattr(settings, 'LLM_QUOTA_REQUESTS', 0),
+            'tokens': getattr(settings, 'LLM_QUOTA_TOKENS', 0),
+        }
+        override = _parse_user_quotas(getattr(settings, 'LLM_USER_QUOTAS', {})).get(user.get_username())
+        if override:
+            limits.update(override)
+        return QuotaLimits(requests=limits['requests'], tokens=limits['tokens'], window_seconds=window)
+
+    def _window(self, limits: QuotaLimits) -> int:
+        return int(time.time()) // limits.window_seconds
+
+    def usage(self, user) -> Dict[str, int]:
+        limits = self.limits_for(user)
+        counts = (
+            QuotaCounter.objects
+            .filter(user_id=user.pk, window=self._window(limits))
+            .values('requests', 'tokens')
+            .first()
+        ) or {'requests': 0, 'tokens': 0}
+        return {
+            **counts,
+            'request_limit': limits.requests,
+            'token_limit': limits.tokens,
+            'window_seconds': limits.window_seconds,
+        }
+
+    #claims one request and the estimated prompt tokens up front, so concurrent calls cannot all slip through
+    def reserve(self, user, estimated_tokens: int = 0) -> Optional[QuotaReservation]:
+        if user is None or not getattr(user, 'is_authenticated', False):
+            return None
+        limits = self.limits_for(user)
+        if limits.unlimited:
+            return None
+        window = self._window(limits)
+
+        counters = QuotaCounter.objects.filter(user_id=user.pk, window=window)
+        allowed = counters
+        if limits.requests:
+            allowed = allowed.filter(requests__lt=limits.requests)
+        if limits.tokens:
+            allowed = allowed.filter(tokens__lte=limits.tokens - estimated_tokens)
+        claim = {'requests': F('requests') + 1, 'tokens': F('tokens') + estimated_tokens}
+        if not allowed.update(**claim):
+            # no row yet (first request of the window) or over the limit: make sure the row
+            # exists, a concurrent request may insert it first, drop this user's older
+            # windows and try the claim once more
+            QuotaCounter.objects.bulk_create([QuotaCounter(user_id=user.pk, window=window)], ignore_conflicts=True)
+            QuotaCounter.objects.filter(user_id=user.pk, window__lt=window).delete()
+            if not allowed.update(**claim):
+                self._reject(user, limits, counters.values('requests', 'tokens').first())
+
+        return QuotaReservation(user_id=user.pk, window=window, reserved_tokens=estimated_tokens)
+
+    def _reject(self, user, limits: QuotaLimits, counts: Optional[Dict[str, int]]) -> None:
+        counts = counts or {'requests': 0, 'tokens': 0}
+        if limits.requests and counts['requests'] >= limits.requests:
+            logger.info('User %s over request quota (%s/%s)', user.pk, counts['requests'], limits.requests)
+            raise QuotaExceededError('REQUEST QUOTA EXCEEDED, TRY AGAIN LATER.')
+        logger.info('User %s over token quota (%s/%s)', user.pk, counts['tokens'], limits.tokens)
+        raise QuotaExceededError('TOKEN QUOTA EXCEEDED, TRY AGAIN LATER.')
+
+    #replaces the reserved estimate with the provider-reported total
+    def settle(self, reservation: Optional[QuotaReservation], usage: Optional[Mapping[str, int]]) -> None:
+        if reservation is None:
+            return
+        actual = int((usage or {}).get('total_tokens', 0) or 0)
+        delta = actual - reservation.reserved_tokens
+        if delta:
+            QuotaCounter.objects.filter(user_id=reservation.user_id, window=reservation.window).update(
+                tokens=F('tokens') + delta,
+            )
+
+    def release(self, reservation: Optional[QuotaReservation]) -> None:
+        self.settle(reservation, {'total_tokens': 0})
+
+
+quota_service = QuotaService()
@@ -0,0 +1,350 @@
+import contextvars
+import json
+import logging
+import math
+import statistics
+import threading
+from collections import Counter, OrderedDict, defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Hashable, Iterable, Iterator, List, Optional, Set, Tuple
+
+from django.conf import settings
+
+from apps.prompts.models import PromptExecution
+from .output_validation import key_candidates
+
+logger = logging.getLogger(__name__)
+
+Task = Tuple[contextvars.Context, Callable[..., Any], tuple, dict, Future]
+
+
+#worker pool that serves per-user queues round-robin instead of one FIFO queue
+class FairShareScheduler:
+    def __init__(self, *, workers: int = 4, name: str = 'fair-share') -> None:
+        self._queues: 'OrderedDict[Hashable, Deque[Task]]' = OrderedDict()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._threads: List[threading.Thread] = []
+        for index in range(workers):
+            thread = threading.Thread(target=self._run, name=f"{name}-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, owner: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        future: Future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError('Scheduler is shut down.')
+            # the task runs in the submitter's context, so its correlation id follows it
+            self._queues.setdefault(owner, deque()).append((contextvars.copy_context(), fn, args, kwargs, future))
+            self._condition.notify()
+        return future
+
+    def pending(self) -> int:
+        with self._condition:
+            return sum(len(queue) for queue in self._queues.values())
+
+    #take one task from the owner at the head, then move that owner to the back
+    def _next_task(self):
+        with self._condition:
+            while not self._queues and not self._closed:
+                self._condition.wait()
+            if not self._queues:
+                return None
+            owner, queue = self._queues.popitem(last=False)
+            task = queue.popleft()
+            if queue:
+                self._queues[owner] = queue
+            return task
+
+    def _run(self) -> None:
+        while True:
+            task = self._next_task()
+            if task is None:
+                return
+            context, fn, args, kwargs, future = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(context.run(fn, *args, **kwargs))
+            except BaseException as exc:  # noqa: BLE001
+                future.set_exception(exc)
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+
+def _image_url(image) -> Optional[str]:
+    if not image:
+        return None
+    return image.image_url or (image.file.url if image.file else None)
+
+
+#values are compared the way a reader would: trimmed and case-insensitive text,
+#numbers by value whether the model answered 1847 or "1847"
+def normalize_value(value: Any) -> Any:
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        text = ' '.join(value.split()).lower()
+        try:
+            number = float(text)
+        except ValueError:
+            return text
+        return number if math.isfinite(number) else text
+    return json.dumps(value, sort_keys=True)
+
+
+def field_matches(expected: Any, actual: Any) -> bool:
+    return normalize_value(expected) == normalize_value(actual)
+
+
+#results stored before keys were normalised use the field name as written, newer ones its
+#output_key; either spelling counts as the field's value
+def field_value(result: Any, name: str) -> Any:
+    if not isinstance(result, dict):
+        return None
+    for key in key_candidates(name):
+        if key in result:
+            return result[key]
+    return None
+
+
+#USD per million tokens as {model: (input, output)} from LLM_MODEL_PRICES
+def model_prices() -> Dict[str, Tuple[float, float]]:
+    prices = {}
+    for model, rates in getattr(settings, 'LLM_MODEL_PRICES', {}).items():
+        prompt_rate, _, completion_rate = rates.partition(':')
+        prices[model] = (float(prompt_rate), float(completion_rate or prompt_rate))
+    return prices
+
+
+def _percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {'p50': None, 'p95': None, 'p99': None}
+    cuts = statistics.quantiles(values, n=100, method='inclusive') if len(values) > 1 else values * 99
+    return {'p50': cuts[49], 'p95': cuts[94], 'p99': cuts[98]}
+
+
+#one JSON line per finished attempt, flushed as it is written; a run that is interrupted
+#mid-line loses only that line. failed attempts are retried on resume and the latest
+#line per execution is the one that counts
+class ReplayCheckpoint:
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def records(self) -> List[Dict[str, Any]]:
+        latest: Dict[int, Dict[str, Any]] = {}
+        if not self.path.exists():
+            return []
+        with self.path.open(encoding='utf-8') as handle:
+            for line in handle:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning('Skipping truncated replay record in %s', self.path)
+                    continue
+                latest[record['id']] = record
+        return list(latest.values())
+
+    def done_ids(self) -> Set[int]:
+        return {record['id'] for record in self.records() if record.get('replay') is not None}
+
+    def append(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open('a', encoding='utf-8') as handle:
+                handle.write(json.dumps(record, default=str) + '\n')
+
+    def reset(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+#re-issues past executions against one model; rows are streamed in primary key order
+#and at most 2 x concurrency requests are queued or in flight at any time
+class ReplayEngine:
+    def __init__(self, checkpoint: ReplayCheckpoint, *, model: str, concurrency: int = 4, temperature: float = 0.0,
+                 batch_size: int = 500, service=None) -> None:
+        self.checkpoint = checkpoint
+        self.model = model
+        self.concurrency = concurrency
+        self.temperature = temperature
+        self.batch_size = batch_size
+        self._service = service
+
+    @property
+    def service(self):
+        if self._service is None:
+            from apps.prompts.services.llm_service import llm_service
+
+            self._service = llm_service
+        return self._service
+
+    def stream(self, queryset, skip: Set[int]) -> Iterator[PromptExecution]:
+        last_id = 0
+        queryset = queryset.select_related('prompt_body', 'field_set', 'image').order_by('pk')
+        while True:
+            batch = list(queryset.filter(pk__gt=last_id)[:self.batch_size])
+            if not batch:
+                return
+            last_id = batch[-1].pk
+            for execution in batch:
+                if execution.pk not in skip:
+                    yield execution
+
+    def run(self, queryset, *, on_record: Optional[Callable[[Dict[str, Any]], None]] = None) -> int:
+        skip = self.checkpoint.done_ids()
+        scheduler = FairShareScheduler(workers=self.concurrency, name='replay')
+        pending = set()
+        written = 0
+        try:
+            for execution in self.stream(queryset, skip):
+                # request inputs are read here, so workers never touch the database
+                request = {
+                    'prompt_text': execution.prompt_text,
+                    'fields': execution.structured_fields,
+                    'image_url': _image_url(execution.image),
+                }
+                pending.add(scheduler.submit(execution.user_id, self._replay, self._original(execution), request))
+                if len(pending) >= self.concurrency * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    written += self._write(done, on_record)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                written += self._write(done, on_record)
+        finally:
+            # on interrupt, queued requests are dropped and running ones still get recorded
+            for future in pending:
+                future.cancel()
+            scheduler.shutdown(wait=True)
+            written += self._write([future for future in pending if future.done() and not future.cancelled()], on_record)
+        return written
+
+    def _write(self, futures: Iterable, on_record) -> int:
+        count = 0
+        for future in futures:
+            record = future.result()
+            self.checkpoint.append(record)
+            count += 1
+            if on_record:
+                on_record(record)
+        return count
+
+    def _original(self, execution: PromptExecution) -> Dict[str, Any]:
+        usage = execution.usage or {}
+        return {
+            'id': execution.pk,
+            'user_id': execution.user_id,
+            'fields': [row.get('name') for row in execution.structured_fields],
+            'original': {
+                'model': execution.model_name,
+                'status': execution.status,
+                'latency_ms': execution.latency_ms,
+                'prompt_tokens': usage.get('prompt_tokens', 0),
+                'completion_tokens': usage.get('completion_tokens', 0),
+                'result': execution.result_data,
+            },
+        }
+
+    #runs on a scheduler worker; failures become part of the record instead of stopping the run
+    def _replay(self, record: Dict[str, Any], request: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            # no user: replays don't draw on anyone's quota, and the semantic cache is
+            # skipped so every row measures the model itself
+            response = self.service.generate_structured_response(
+                **request,
+                model=self.model,
+                temperature=self.temperature,
+                use_semantic_cache=False,
+            )
+        except Exception as exc:  # noqa: BLE001
+            return {**record, 'replay': None, 'error': f"{type(exc).__name__}: {exc}"}
+        return {
+            **record,
+            'replay': {
+                'model': response.model,
+                'latency_ms': response.latency_ms,
+                'prompt_tokens': response.usage.get('prompt_tokens', 0),
+                'completion_tokens': response.usage.get('completion_tokens', 0),
+                'result': response.structured_data,
+                'invalid': sorted(response.validation_errors),
+            },
+            'error': None,
+        }
+
+
+#aggregates checkpoint records: agreement per field, latency and tokens per model on
+#both sides, and cost from LLM_MODEL_PRICES (None for models without a price)
+def build_report(records: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    prices = model_prices()
+    fields: Dict[str, List[int]] = defaultdict(lambda: [0, 0])
+    models: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    errors: Counter = Counter()
+    total = replayed = agreed = 0
+
+    def account(role, side):
+        stats = models.setdefault((role, side['model'] or 'unknown'), {
+            'runs': 0, 'latencies': [], 'prompt_tokens': 0, 'completion_tokens': 0,
+        })
+        stats['runs'] += 1
+        if side.get('latency_ms') is not None:
+            stats['latencies'].append(side['latency_ms'])
+        stats['prompt_tokens'] += side.get('prompt_tokens') or 0
+        stats['completion_tokens'] += side.get('completion_tokens') or 0
+
+    for record in records:
+        total += 1
+        account('original', record['original'])
+        if record.get('replay') is None:
+            errors[record.get('error') or 'unknown'] += 1
+            continue
+        replayed += 1
+        account('replay', record['replay'])
+        expected = record['original']['result']
+        actual = record['replay']['result']
+        all_match = True
+        for name in record['fields']:
+            matched = field_matches(field_value(expected, name), field_value(actual, name))
+            fields[name][0] += 1
+            fields[name][1] += matched
+            all_match = all_match and matched
+        agreed += all_match
+
+    model_rows = []
+    for (role, model), stats in sorted(models.items()):
+        price = prices.get(model)
+        cost = (
+            (stats['prompt_tokens'] * price[0] + stats['completion_tokens'] * price[1]) / 1_000_000
+            if price else None
+        )
+        model_rows.append({
+            'role': role,
+            'model': model,
+            'runs': stats['runs'],
+            'latency_ms': _percentiles(stats['latencies']),
+            'prompt_tokens': stats['prompt_tokens'],
+            'completion_tokens': stats['completion_tokens'],
+            'cost_usd': cost,
+            'cost_per_1k_runs_usd': cost / stats['runs'] * 1000 if cost is not None and stats['runs'] else None,
+        })
+    return {
+        'executions': total,
+        'replayed': replayed,
+        'errors': total - replayed,
+        'top_errors': errors.most_common(5),
+        'agreement': agreed / replayed if replayed else None,
+        'fields': {
+            name: {'compared': compared, 'matched': matched, 'match_rate': matched / compared}
+            for name, (compared, matched) in sorted(fields.items())
+        },
+        'models': model_rows,
+    }
@@ -0,0 +1,79 @@
+import logging
+from typing import Any, Dict, Iterable, List, Mapping
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from apps.core.cache import CacheNamespace
+from apps.prompts.models import PromptSchema, SchemaField
+
+logger = logging.getLogger(__name__)
+
+
+class SchemaService:
+    def __init__(self) -> None:
+        # keyed on updated_at, so stale entries are simply never read again
+        self.cache = CacheNamespace('prompts.schema_fields', version=1, timeout=60 * 60)
+
+    def get_user_schema(self, user, schema_id) -> PromptSchema:
+        try:
+            return PromptSchema.objects.get(pk=int(schema_id), user=user, is_active=True)
+        except (TypeError, ValueError, PromptSchema.DoesNotExist) as exc:
+            raise ValidationError('Selected schema does not exist.') from exc
+
+    #field rows in the same shape the playground form produces
+    def field_rows(self, schema: PromptSchema) -> List[Dict[str, str]]:
+        return self.cache.get_or_set(
+            (schema.id, schema.updated_at.timestamp()),
+            lambda: [
+                {'name': name, 'field_type': field_type}
+                for name, field_type in schema.fields.values_list('name', 'field_type')
+            ],
+        )
+
+    #create/update fields by name in one transaction and bump the schema version; existing
+    #fields keep their place unless a sort_order is sent, new ones are appended after them
+    @transaction.atomic
+    def upsert_fields(self, schema: PromptSchema, rows: Iterable[Mapping[str, Any]], *, replace=False) -> List[SchemaField]:
+        schema = PromptSchema.objects.select_for_update().get(pk=schema.pk)
+        existing = {field.name: field for field in schema.fields.all()}
+        next_order = max((field.sort_order for field in existing.values()), default=-1) + 1
+        to_create: List[SchemaField] = []
+        to_update: List[SchemaField] = []
+        seen = set()
+
+        for row in rows:
+            name = row['name']
+            seen.add(name)
+            field_type = row.get('field_type', SchemaField.FieldType.STRING)
+            current = existing.get(name)
+            if current is None:
+                sort_order = row.get('sort_order', next_order + len(to_create))
+                to_create.append(
+                    SchemaField(schema=schema, name=name, field_type=field_type, sort_order=sort_order)
+                )
+                continue
+            sort_order = row.get('sort_order', current.sort_order)
+            if (current.field_type, current.sort_order) != (field_type, sort_order):
+                current.field_type = field_type
+                current.sort_order = sort_order
+                to_update.append(current)
+
+        if to_create:
+            SchemaField.objects.bulk_create(to_create)
+        if to_update:
+            SchemaField.objects.bulk_update(to_update, ['field_type', 'sort_order'])
+        removed = [field.id for name, field in existing.items() if name not in seen] if replace else []
+        if removed:
+            SchemaField.objects.filter(id__in=removed).delete()
+
+        if to_create or to_update or removed:
+            schema.save(update_fields=['updated_at'])
+            logger.info(
+                'Schema %s fields upserted: %s created, %s updated, %s removed',
+                schema.id, len(to_create), len(to_update), len(removed),
+            )
+        return list(schema.fields.all())
+
+
+schema_service = SchemaService()
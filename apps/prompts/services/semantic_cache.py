@@ -0,0 +1,279 @@
+import atexit
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+SHARED_OWNER = 'shared'
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+# numbers, quoted spans and capitalised words other than the prompt's first
+_LITERAL_RE = re.compile(
+    r'\d+(?:[.,:/-]\d+)*'
+    r'|"[^"]+"|“[^”]+”'
+    r'|(?<!^)\b[A-Z][\w-]*',
+    re.UNICODE,
+)
+
+
+#the values a prompt is about. two prompts can embed almost identically and still ask
+#about different invoices, dates or people, so a hit also needs these to be equal
+def prompt_literals(text: str) -> List[str]:
+    return [match.strip('"“”') for match in _LITERAL_RE.findall(text.strip())]
+
+
+#signed feature hashing of char trigrams and words into a fixed-size unit vector
+class HashedNgramEmbedder:
+    def __init__(self, *, dim: int = 1024, ngram: int = 3) -> None:
+        self.dim = dim
+        self.ngram = ngram
+
+    def _features(self, text: str) -> List[str]:
+        text = _WHITESPACE_RE.sub(' ', text.lower()).strip()
+        padded = f" {text} "
+        grams = [padded[i:i + self.ngram] for i in range(max(len(padded) - self.ngram + 1, 0))]
+        return grams + [f"w:{word}" for word in _WORD_RE.findall(text)]
+
+    def embed(self, text: str) -> np.ndarray:
+        features = self._features(text)
+        if not features:
+            return np.zeros(self.dim, dtype=np.float32)
+        # crc32 is stable across processes, unlike hash(), so persisted vectors stay valid
+        hashes = np.fromiter((zlib.crc32(feature.encode('utf-8')) for feature in features), dtype=np.uint32, count=len(features))
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0)
+        vector = np.bincount(hashes % self.dim, weights=signs, minlength=self.dim).astype(np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+@dataclass
+class SemanticMatch:
+    payload: Dict[str, Any]
+    similarity: float
+
+
+#ring buffer of unit vectors; cosine similarity is one matrix-vector product. rows are
+#allocated as entries arrive, so an index nobody writes to costs next to nothing
+class VectorIndex:
+    def __init__(self, dim: int, capacity: int) -> None:
+        self.dim = dim
+        self.capacity = capacity
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._payloads: List[Dict[str, Any]] = []
+        self._next = 0
+        self.dirty = 0
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._payloads)
+
+    #candidates at or above threshold, most similar first
+    def search(self, vector: np.ndarray, threshold: float, limit: int = 8) -> List[SemanticMatch]:
+        if not self._payloads:
+            return []
+        scores = self._vectors[:len(self._payloads)] @ vector
+        above = np.flatnonzero(scores >= threshold)
+        best = above[np.argsort(scores[above])[::-1][:limit]]
+        return [SemanticMatch(payload=self._payloads[slot], similarity=float(scores[slot])) for slot in best]
+
+    def add(self, vector: np.ndarray, payload: Dict[str, Any]) -> None:
+        size = len(self._payloads)
+        if size < self.capacity:
+            if size == len(self._vectors):
+                grown = np.zeros((min(self.capacity, max(8, size * 2)), self.dim), dtype=np.float32)
+                grown[:size] = self._vectors[:size]
+                self._vectors = grown
+            self._vectors[size] = vector
+            self._payloads.append(payload)
+        else:
+            # full: overwrite the oldest slot
+            self._vectors[self._next] = vector
+            self._payloads[self._next] = payload
+            self._next = (self._next + 1) % self.capacity
+        self.dirty += 1
+
+    #takes in entries another worker persisted that this one doesn't have (by prompt text),
+    #keeping the newest `capacity` of both
+    def merge(self, other: 'VectorIndex') -> None:
+        known = {payload.get('prompt_text') for payload in self._payloads}
+        rows = [(self._vectors[slot], payload) for slot, payload in enumerate(self._payloads)]
+        rows += [
+            (other._vectors[slot], payload) for slot, payload in enumerate(other._payloads)
+            if payload.get('prompt_text') not in known
+        ]
+        if len(rows) == len(self._payloads):
+            return
+        rows.sort(key=lambda row: row[1].get('stored_at', 0))
+        rows = rows[-self.capacity:]
+        self._vectors = np.array([vector for vector, _ in rows], dtype=np.float32).reshape(len(rows), self.dim)
+        self._payloads = [payload for _, payload in rows]
+        # oldest first, so a full index overwrites from slot 0 again
+        self._next = 0
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as handle:
+            np.savez(
+                handle,
+                vectors=self._vectors[:len(self._payloads)],
+                payloads=np.array(json.dumps(self._payloads)),
+                next=np.array(self._next),
+            )
+        os.replace(tmp_name, path)
+        self.dirty = 0
+
+    @classmethod
+    def load(cls, path: Path, dim: int, capacity: int) -> 'VectorIndex':
+        index = cls(dim, capacity)
+        if path.exists():
+            try:
+                with np.load(path) as data:
+                    vectors = data['vectors']
+                    payloads = json.loads(str(data['payloads']))
+                    next_slot = int(data['next'])
+                if vectors.shape[1:] == (dim,) and len(vectors) == len(payloads):
+                    # a smaller capacity than the file was written with keeps the newest rows
+                    order = sorted(range(len(payloads)), key=lambda slot: payloads[slot].get('stored_at', 0))[-capacity:]
+                    if len(order) < len(payloads):
+                        vectors, payloads, next_slot = vectors[order], [payloads[slot] for slot in order], 0
+                    index._vectors = np.array(vectors, dtype=np.float32)
+                    index._payloads = payloads
+                    index._next = next_slot % capacity
+                else:
+                    logger.warning('Ignoring semantic index %s built with another layout', path.name)
+            except (OSError, ValueError, KeyError) as exc:
+                logger.warning('Could not load semantic index %s: %s', path.name, exc)
+        return index
+
+
+#one index per (template, model, owner). at most max_indexes are held in memory, least
+#recently used first out; each is capped at capacity entries (shared) or user_capacity
+#(per user), and at most max_files index files are kept on disk, oldest first out.
+#workers sharing the directory merge the file into their own index before writing it, so
+#a flush keeps what the others persisted; two flushes racing can still drop the other's
+#newest entries until that worker flushes again
+class SemanticCache:
+    def __init__(self, *, directory=None, threshold=None, dim=None, capacity=None, flush_every=None,
+                 user_capacity=None, max_indexes=None, max_files=None) -> None:
+        self.directory = Path(directory or getattr(settings, 'LLM_SEMANTIC_CACHE_DIR', settings.BASE_DIR / '.cache' / 'semantic'))
+        self.threshold = threshold or getattr(settings, 'LLM_SEMANTIC_CACHE_THRESHOLD', 0.92)
+        self.capacity = capacity or getattr(settings, 'LLM_SEMANTIC_CACHE_MAX_ENTRIES', 5000)
+        self.user_capacity = user_capacity or getattr(settings, 'LLM_SEMANTIC_CACHE_MAX_USER_ENTRIES', 200)
+        self.max_indexes = max_indexes or getattr(settings, 'LLM_SEMANTIC_CACHE_MAX_INDEXES', 64)
+        self.max_files = max_files or getattr(settings, 'LLM_SEMANTIC_CACHE_MAX_FILES', 2000)
+        self.flush_every = flush_every or getattr(settings, 'LLM_SEMANTIC_CACHE_FLUSH_EVERY', 20)
+        self.embedder = HashedNgramEmbedder(dim=dim or getattr(settings, 'LLM_SEMANTIC_CACHE_DIM', 1024))
+        self._indexes: 'OrderedDict[str, VectorIndex]' = OrderedDict()
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    @property
+    def enabled(self) -> bool:
+        return getattr(settings, 'LLM_SEMANTIC_CACHE_ENABLED', False)
+
+    def index_key(self, *, template_fingerprint: str, model: str, user=None) -> str:
+        scope = getattr(settings, 'LLM_SEMANTIC_CACHE_SCOPE', 'user')
+        owner = f"u{user.pk}" if scope == 'user' and user is not None and user.pk else SHARED_OWNER
+        safe_model = re.sub(r'[^A-Za-z0-9_.-]', '_', model)
+        return f"{template_fingerprint}-{safe_model}-{owner}"
+
+    def _capacity(self, key: str) -> int:
+        return self.capacity if key.endswith(f"-{SHARED_OWNER}") else min(self.user_capacity, self.capacity)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.npz"
+
+    #indexes are read from disk the first time a key is used; the least recently used one
+    #is written out and dropped once more than max_indexes are loaded
+    def _index(self, key: str) -> VectorIndex:
+        evicted: List[Tuple[str, VectorIndex]] = []
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None:
+                self._indexes.move_to_end(key)
+                return index
+            index = VectorIndex.load(self._path(key), self.embedder.dim, self._capacity(key))
+            self._indexes[key] = index
+            while len(self._indexes) > self.max_indexes:
+                evicted.append(self._indexes.popitem(last=False))
+        for old_key, old in evicted:
+            with old.lock:
+                if old.dirty:
+                    self._save(old_key, old)
+        return index
+
+    #a similar prompt only counts when its numbers and names are the same as well
+    def lookup(self, key: str, prompt_text: str) -> Optional[SemanticMatch]:
+        index = self._index(key)
+        vector = self.embedder.embed(prompt_text)
+        with index.lock:
+            candidates = index.search(vector, self.threshold)
+        literals = prompt_literals(prompt_text)
+        for match in candidates:
+            stored = match.payload.get('literals')
+            if stored is None:
+                stored = prompt_literals(match.payload.get('prompt_text', ''))
+            if stored == literals:
+                logger.debug('Semantic cache hit in %s (similarity %.3f)', key, match.similarity)
+                return match
+        if candidates:
+            logger.debug('Semantic cache candidates in %s differ in numbers or names', key)
+        return None
+
+    def store(self, key: str, prompt_text: str, payload: Dict[str, Any]) -> None:
+        index = self._index(key)
+        vector = self.embedder.embed(prompt_text)
+        with index.lock:
+            index.add(vector, {
+                'prompt_text': prompt_text,
+                'literals': prompt_literals(prompt_text),
+                'stored_at': time.time(),
+                **payload,
+            })
+            if index.dirty >= self.flush_every:
+                self._save(key, index)
+
+    #called with index.lock held
+    def _save(self, key: str, index: VectorIndex) -> None:
+        path = self._path(key)
+        try:
+            if path.exists():
+                index.merge(VectorIndex.load(path, self.embedder.dim, index.capacity))
+            index.save(path)
+            self._prune_files()
+        except OSError as exc:
+            logger.warning('Could not persist semantic index %s: %s', key, exc)
+
+    def _prune_files(self) -> None:
+        files = list(self.directory.glob('*.npz'))
+        if len(files) <= self.max_files:
+            return
+        files.sort(key=lambda path: path.stat().st_mtime)
+        for path in files[:len(files) - self.max_files]:
+            path.unlink(missing_ok=True)
+
+    def flush(self) -> None:
+        with self._lock:
+            items: List[Tuple[str, VectorIndex]] = list(self._indexes.items())
+        for key, index in items:
+            with index.lock:
+                if index.dirty:
+                    self._save(key, index)
+
+
+semantic_cache = SemanticCache()
@@ -1,4 +1,5 @@
 import logging
+import threading
 import uuid
 from dataclasses import dataclass
 from pathlib import Path
@@ -7,6 +8,8 @@ from django.conf import settings
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
 
+from apps.core.log import get_correlation_id
+
 _logger = logging.getLogger(__name__)
 
 
@@ -21,14 +24,20 @@ class StorageService:
     def __init__(self):
         self.use_s3 = getattr(settings, 'USE_S3', True)
         self.bucket_name = getattr(settings, 'AWS_STORAGE_BUCKET_NAME', '').strip()
-        _logger.info(f"STORAGE SERVICE INIT USE_S3={self.use_s3} BUCKET={self.bucket_name}")
         self.region = getattr(settings, 'AWS_S3_REGION_NAME', 'us-east-1')
         self.s3_client = None
+        self._client_lock = threading.Lock()
 
+    #boto3 clients are thread-safe once built, but building one is not; do it once under a lock
     def _ensure_s3_client(self):
         if self.s3_client:
             return self.s3_client
+        with self._client_lock:
+            if self.s3_client:
+                return self.s3_client
+            return self._create_s3_client()
 
+    def _create_s3_client(self):
         if not self.use_s3:
             raise RuntimeError('S3 uploads are disabled. Set USE_S3=True to enable.')
 
@@ -44,15 +53,22 @@ class StorageService:
 
         try:
             import boto3
+            from botocore.config import Config
         except ImportError as exc:  # pragma: no cover - dependency guard
             raise RuntimeError('boto3 is required for S3 uploads.') from exc
 
         try:
-            self.s3_client = boto3.client(
+            # a private session: the default one is shared, and not safe to build clients from concurrently
+            self.s3_client = boto3.session.Session().client(
                 's3',
                 region_name=self.region or 'us-east-1',
                 aws_access_key_id=access_key,
                 aws_secret_access_key=secret_key,
+                config=Config(
+                    max_pool_connections=getattr(settings, 'AWS_S3_MAX_POOL_CONNECTIONS', 20),
+                    tcp_keepalive=getattr(settings, 'AWS_S3_TCP_KEEPALIVE', True),
+                    retries={'mode': 'standard'},
+                ),
             )
             _logger.info('S3 client initialised for bucket=%s', self.bucket_name)
         except Exception as exc:  # noqa: BLE001
@@ -60,6 +76,17 @@ class StorageService:
             raise RuntimeError('Failed to initialise S3 client') from exc
 
         return self.s3_client
+
+    #creates the client and opens a pooled connection to the bucket ahead of the first upload
+    def warm_up(self) -> bool:
+        if not self.use_s3:
+            return False
+        try:
+            self._ensure_s3_client().head_bucket(Bucket=self.bucket_name)
+        except Exception as exc:  # noqa: BLE001
+            _logger.warning('S3 warm-up failed: %s', exc)
+            return False
+        return True
         
     def _generate_unique_filename(self, filename: str) -> str:
         unique_id = uuid.uuid4().hex
@@ -74,7 +101,7 @@ class StorageService:
         
         url = f"{settings.MEDIA_URL}{saved_path}"
         
-        _logger.info(f"SAVED FILE HERER {url}")
+        _logger.info('SAVED FILE HERER %s', url)
         return StorageUploadResult(url=url, storage_path=saved_path, backend='local')
     
     def _upload_to_s3(self, file_content, filename, content_type) -> StorageUploadResult:
@@ -83,7 +110,7 @@ class StorageService:
         
         s3_key = f"images/{filename}"
         
-        _logger.info(f"UPLOADING FILE TO S3 AT KEY: {s3_key}")
+        _logger.info('UPLOADING FILE TO S3 AT KEY: %s', s3_key)
         try:
             client = self._ensure_s3_client()
             #s3 upload
@@ -93,16 +120,18 @@ class StorageService:
                 s3_key,
                 ExtraArgs={
                     'ContentType': content_type,
+                    # ties the object back to the request that stored it
+                    'Metadata': {'correlation-id': get_correlation_id()},
                 }
             )
             region = self.region or 'us-east-1'
             url = f"https://{self.bucket_name}.s3.{region}.amazonaws.com/{s3_key}"
             
-            _logger.info(f"FILE UPLOADED TO S3: {s3_key}")
+            _logger.info('FILE UPLOADED TO S3: %s', s3_key)
             return StorageUploadResult(url=url, storage_path=None, backend='s3')
             
         except Exception as e:
-            _logger.error(f"S3 UPLOAD FAILED: {e}")
+            _logger.error('S3 UPLOAD FAILED: %s', e)
             raise RuntimeError(f"FAILED TO UPLOAD FILE: {e}")
         
         
@@ -110,7 +139,7 @@ class StorageService:
         #get filename
         filename = self._generate_unique_filename(original_filename)
         
-        _logger.info(f"GOT FILE AND CHANGED NAME TO {filename}")
+        _logger.info('GOT FILE AND CHANGED NAME TO %s', filename)
         
         if self.use_s3:
             _logger.info("UPLOADING TO S3")
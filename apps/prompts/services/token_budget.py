@@ -0,0 +1,144 @@
+import logging
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, List, Mapping, Optional
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# chat format overhead per message and for the reply primer (OpenAI cookbook numbers)
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_OVERHEAD_TOKENS = 3
+
+_PIECE_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+class PromptTooLargeError(ValueError):
+    """Raised when a prompt is over its token budget and truncation is off."""
+
+
+def _piece_tokens(piece: str) -> int:
+    return max(1, round(len(piece) / 4))
+
+
+#~4 characters per token for words, one token per punctuation mark
+class HeuristicTokenizer:
+    name = 'heuristic'
+
+    def count(self, text: str) -> int:
+        return sum(_piece_tokens(piece) for piece in _PIECE_RE.findall(text))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        kept = 0
+        for match in _PIECE_RE.finditer(text):
+            kept += _piece_tokens(match.group())
+            if kept > max_tokens:
+                return text[:match.start()].rstrip()
+        return text
+
+
+class TiktokenTokenizer:
+    name = 'tiktoken'
+
+    def __init__(self, model: str) -> None:
+        try:
+            import tiktoken
+        except ImportError as exc:  # pragma: no cover - dependency guard
+            raise RuntimeError('tiktoken is required for LLM_TOKENIZER=tiktoken.') from exc
+        try:
+            self._encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            self._encoding = tiktoken.get_encoding('o200k_base')
+
+    def count(self, text: str) -> int:
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        tokens = self._encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else self._encoding.decode(tokens[:max_tokens])
+
+
+#one tokenizer (and encoding) per model for the life of the process
+@lru_cache(maxsize=16)
+def get_tokenizer(model: str):
+    choice = getattr(settings, 'LLM_TOKENIZER', 'auto')
+    if choice == 'heuristic':
+        return HeuristicTokenizer()
+    if choice == 'tiktoken':
+        return TiktokenTokenizer(model)
+    if choice == 'auto':
+        try:
+            return TiktokenTokenizer(model)
+        except RuntimeError:
+            return HeuristicTokenizer()
+    return import_string(choice)(model)
+
+
+@lru_cache(maxsize=1024)
+def _count_cached(tokenizer, text: str) -> int:
+    return tokenizer.count(text)
+
+
+def estimate_messages(messages: Iterable[Mapping[str, str]], model: str) -> int:
+    tokenizer = get_tokenizer(model)
+    total = REPLY_OVERHEAD_TOKENS
+    for message in messages:
+        content = message.get('content') or ''
+        # system prefixes repeat across calls, so their counts are memoised
+        count = _count_cached(tokenizer, content) if message.get('role') == 'system' else tokenizer.count(content)
+        total += count + MESSAGE_OVERHEAD_TOKENS
+    return total
+
+
+def completion_budget(field_count: int) -> int:
+    base = getattr(settings, 'LLM_COMPLETION_TOKENS_BASE', 256)
+    per_field = getattr(settings, 'LLM_COMPLETION_TOKENS_PER_FIELD', 64)
+    ceiling = getattr(settings, 'LLM_MAX_COMPLETION_TOKENS', 4096)
+    return min(base + per_field * max(field_count, 1), ceiling)
+
+
+@dataclass
+class PromptBudget:
+    max_prompt_tokens: int
+    overflow: str = 'reject'
+
+    def enforce(self, messages: List[Dict[str, str]], model: str) -> int:
+        estimate = estimate_messages(messages, model)
+        if estimate <= self.max_prompt_tokens:
+            return estimate
+        if self.overflow != 'truncate':
+            raise PromptTooLargeError(
+                f"PROMPT TOO LARGE: ~{estimate} tokens, limit is {self.max_prompt_tokens}."
+            )
+        # only the last (user) message is dynamic, so that is what gets cut
+        tokenizer = get_tokenizer(model)
+        user_message = messages[-1]
+        excess = estimate - self.max_prompt_tokens
+        keep = tokenizer.count(user_message['content']) - excess
+        if keep <= 0:
+            raise PromptTooLargeError('PROMPT TOO LARGE: field instructions alone exceed the limit.')
+        user_message['content'] = tokenizer.truncate(user_message['content'], keep)
+        logger.info('Prompt truncated from ~%s to %s tokens', estimate, self.max_prompt_tokens)
+        return estimate_messages(messages, model)
+
+
+def _user_budgets() -> Dict[str, int]:
+    configured = getattr(settings, 'LLM_USER_PROMPT_TOKEN_BUDGETS', {}) or {}
+    return {str(key): int(value) for key, value in configured.items()}
+
+
+#user override replaces the global limit, a schema limit can only tighten it
+def budget_for(user=None, schema=None) -> PromptBudget:
+    limit = getattr(settings, 'LLM_PROMPT_TOKEN_BUDGET', 8000)
+    if user is not None and getattr(user, 'is_authenticated', False):
+        limit = _user_budgets().get(user.get_username(), limit)
+    schema_limit: Optional[int] = getattr(schema, 'max_prompt_tokens', None)
+    if schema_limit:
+        limit = min(limit, schema_limit)
+    return PromptBudget(
+        max_prompt_tokens=limit,
+        overflow=getattr(settings, 'LLM_PROMPT_OVERFLOW', 'reject'),
+    )
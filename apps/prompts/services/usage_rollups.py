@@ -0,0 +1,216 @@
+import logging
+from datetime import datetime, timezone as dt_timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.db import transaction
+from django.db.models import BigIntegerField, Count, F, Q, Sum, Value
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Cast, Coalesce, TruncDay, TruncHour
+from django.utils import timezone
+
+from apps.prompts.models import PromptExecution, UsageRollup
+
+logger = logging.getLogger(__name__)
+
+GROUP_FIELDS = ('user', 'model_name', 'provider')
+TOKEN_KEYS = ('prompt_tokens', 'completion_tokens', 'total_tokens')
+_TRUNC = {
+    UsageRollup.Granularity.HOUR: TruncHour,
+    UsageRollup.Granularity.DAY: TruncDay,
+}
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    moment = moment.astimezone(dt_timezone.utc)
+    if granularity == UsageRollup.Granularity.DAY:
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _usage_tokens(usage: Any, key: str) -> int:
+    try:
+        return int((usage or {}).get(key) or 0)
+    except (TypeError, ValueError, AttributeError):
+        return 0
+
+
+def _usage_expression(key: str):
+    return Coalesce(Sum(Cast(KeyTextTransform(key, 'usage'), BigIntegerField())), Value(0))
+
+
+class UsageRollupService:
+    def _apply(self, *, user_id, model_name, provider, granularity, bucket, deltas: Dict[str, int]) -> None:
+        rollup, _ = UsageRollup.objects.get_or_create(
+            user_id=user_id,
+            model_name=model_name,
+            provider=provider,
+            granularity=granularity,
+            bucket_start=bucket,
+        )
+        # F() increments so concurrent writers never lose updates
+        UsageRollup.objects.filter(pk=rollup.pk).update(
+            updated_at=timezone.now(),
+            **{name: F(name) + value for name, value in deltas.items() if value},
+        )
+
+    #adds one finished execution; the rolled_up_at claim keeps it from being counted twice
+    @transaction.atomic
+    def record(self, execution: PromptExecution) -> bool:
+        if not execution.is_finished:
+            return False
+        claimed = (
+            PromptExecution.objects
+            .filter(pk=execution.pk, rolled_up_at__isnull=True)
+            .update(rolled_up_at=timezone.now())
+        )
+        if not claimed:
+            return False
+        deltas = {
+            'request_count': 1,
+            'error_count': int(execution.status == PromptExecution.Status.FAILED),
+            'latency_ms_sum': execution.latency_ms or 0,
+            **{key: _usage_tokens(execution.usage, key) for key in TOKEN_KEYS},
+        }
+        for granularity in UsageRollup.Granularity.values:
+            self._apply(
+                user_id=execution.user_id,
+                model_name=execution.model_name,
+                provider=execution.provider,
+                granularity=granularity,
+                bucket=bucket_start(execution.created_at, granularity),
+                deltas=deltas,
+            )
+        return True
+
+    #rolls up unclaimed executions id-range by id-range. each batch is claimed first, with
+    #the same conditional update record() uses, and only the rows this batch claimed are
+    #aggregated, so an execution recorded live in between is never counted twice
+    def backfill(self, *, batch_size: int = 10000, rebuild: bool = False) -> int:
+        if rebuild:
+            with transaction.atomic():
+                UsageRollup.objects.all().delete()
+                PromptExecution.objects.exclude(rolled_up_at=None).update(rolled_up_at=None)
+
+        finished = Q(status__in=[PromptExecution.Status.COMPLETED, PromptExecution.Status.FAILED])
+        pending = PromptExecution.objects.filter(finished, rolled_up_at__isnull=True)
+        total = 0
+        last_id = 0
+        while True:
+            ids = list(pending.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            last_id = ids[-1]
+            with transaction.atomic():
+                claimed_at = timezone.now()
+                claimed = pending.filter(id__gte=ids[0], id__lte=last_id).update(rolled_up_at=claimed_at)
+                batch = PromptExecution.objects.filter(id__gte=ids[0], id__lte=last_id, rolled_up_at=claimed_at)
+                for granularity, trunc in _TRUNC.items():
+                    rows = (
+                        batch
+                        .annotate(bucket=trunc('created_at', tzinfo=dt_timezone.utc))
+                        .values('user_id', 'model_name', 'provider', 'bucket')
+                        .annotate(
+                            request_count=Count('id'),
+                            error_count=Count('id', filter=Q(status=PromptExecution.Status.FAILED)),
+                            latency_ms_sum=Coalesce(Sum('latency_ms'), Value(0)),
+                            **{key: _usage_expression(key) for key in TOKEN_KEYS},
+                        )
+                        .order_by()
+                    )
+                    self._merge(granularity, list(rows), claimed_at)
+            total += claimed
+            logger.info('Rolled up %s executions (up to id %s)', claimed, last_id)
+        return total
+
+    #adds grouped deltas to their rollups in three statements: create the missing rows,
+    #lock every affected row so live F() increments wait, then upsert the summed totals
+    def _merge(self, granularity: str, rows: List[Dict[str, Any]], now: datetime) -> None:
+        if not rows:
+            return
+        deltas = {(row.pop('user_id'), row.pop('model_name'), row.pop('provider'), row.pop('bucket')): row for row in rows}
+        UsageRollup.objects.bulk_create(
+            [
+                UsageRollup(user_id=user_id, model_name=model_name, provider=provider, granularity=granularity, bucket_start=bucket)
+                for user_id, model_name, provider, bucket in deltas
+            ],
+            ignore_conflicts=True,
+        )
+        current = (
+            UsageRollup.objects
+            .select_for_update()
+            .filter(
+                granularity=granularity,
+                user_id__in={item[0] for item in deltas},
+                bucket_start__in={item[3] for item in deltas},
+            )
+        )
+        counters = ['request_count', 'error_count', 'latency_ms_sum', *TOKEN_KEYS]
+        merged = []
+        for rollup in current:
+            delta = deltas.get((rollup.user_id, rollup.model_name, rollup.provider, rollup.bucket_start))
+            if delta is None:
+                continue
+            merged.append(UsageRollup(
+                user_id=rollup.user_id,
+                model_name=rollup.model_name,
+                provider=rollup.provider,
+                granularity=granularity,
+                bucket_start=rollup.bucket_start,
+                updated_at=now,
+                **{name: getattr(rollup, name) + delta[name] for name in counters},
+            ))
+        UsageRollup.objects.bulk_create(
+            merged,
+            update_conflicts=True,
+            unique_fields=['user', 'model_name', 'provider', 'granularity', 'bucket_start'],
+            update_fields=[*counters, 'updated_at'],
+        )
+
+    def query(
+        self,
+        *,
+        user=None,
+        granularity: str = UsageRollup.Granularity.DAY,
+        group_by: Iterable[str] = ('model_name',),
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> List[Dict[str, Any]]:
+        group_fields = [field for field in group_by if field in GROUP_FIELDS]
+        qs = UsageRollup.objects.filter(granularity=granularity)
+        if user is not None:
+            qs = qs.filter(user=user)
+        if since:
+            qs = qs.filter(bucket_start__gte=since)
+        if until:
+            qs = qs.filter(bucket_start__lt=until)
+        rows = (
+            qs.values('bucket_start', *group_fields)
+            .annotate(
+                requests=Sum('request_count'),
+                errors=Sum('error_count'),
+                prompt_tokens_total=Sum('prompt_tokens'),
+                completion_tokens_total=Sum('completion_tokens'),
+                tokens=Sum('total_tokens'),
+                latency_ms_total=Sum('latency_ms_sum'),
+            )
+            .order_by('-bucket_start', *group_fields)
+        )
+        results = []
+        for row in rows:
+            requests = row['requests'] or 0
+            results.append(
+                {
+                    'bucket_start': row['bucket_start'],
+                    **{field: row[field] for field in group_fields},
+                    'requests': requests,
+                    'errors': row['errors'],
+                    'prompt_tokens': row['prompt_tokens_total'],
+                    'completion_tokens': row['completion_tokens_total'],
+                    'total_tokens': row['tokens'],
+                    'avg_latency_ms': round(row['latency_ms_total'] / requests, 1) if requests else None,
+                }
+            )
+        return results
+
+
+usage_rollups = UsageRollupService()
@@ -0,0 +1,46 @@
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import request_started
+
+logger = logging.getLogger(__name__)
+
+_warmed_pid = None
+_warmed_lock = threading.Lock()
+
+
+def warm_up_clients() -> dict:
+    from .llm_service import llm_service
+    from .storage_service import storage_service
+
+    results = {}
+    for name, service in (('openai', llm_service), ('s3', storage_service)):
+        started = time.perf_counter()
+        ok = service.warm_up()
+        results[name] = {'ok': ok, 'ms': round((time.perf_counter() - started) * 1000, 1)}
+    logger.info('Client warm-up finished: %s', results)
+    return results
+
+
+#once per process, keyed by pid, so a worker forked from a preloaded master warms its own
+#clients instead of inheriting the master's sockets; runs in the background so the request
+#that triggered it is not held up
+def _warm_up_process(**kwargs) -> None:
+    global _warmed_pid
+    with _warmed_lock:
+        if _warmed_pid == os.getpid():
+            return
+        _warmed_pid = os.getpid()
+    threading.Thread(target=warm_up_clients, name='client-warmup', daemon=True).start()
+
+
+#called from the wsgi/asgi entry points, so servers warm up but management commands stay lazy.
+#nothing connects at import time: with gunicorn --preload that happens in the master before
+#the fork, so the warm-up waits for each worker's first request
+def start_warmup() -> None:
+    if not getattr(settings, 'SERVICE_WARMUP', True):
+        return
+    request_started.connect(_warm_up_process, dispatch_uid='prompts.client-warmup')
@@ -0,0 +1,32 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.prompts.models import PromptExecution
+from apps.prompts.services.execution_events import execution_events
+from apps.prompts.services.history_cache import history_cache
+from apps.prompts.services.usage_rollups import usage_rollups
+
+
+@receiver(post_save, sender=PromptExecution)
+def update_history_on_save(sender, instance, **kwargs):
+    history_cache.record(instance)
+
+
+@receiver(post_save, sender=PromptExecution)
+def update_usage_rollups(sender, instance, **kwargs):
+    if instance.is_finished and instance.rolled_up_at is None:
+        usage_rollups.record(instance)
+
+
+@receiver(post_save, sender=PromptExecution)
+def publish_execution_event(sender, instance, **kwargs):
+    # streams must never see a status that gets rolled back
+    transaction.on_commit(partial(execution_events.notify, instance))
+
+
+@receiver(post_delete, sender=PromptExecution)
+def update_history_on_delete(sender, instance, **kwargs):
+    history_cache.record(instance)
@@ -0,0 +1,385 @@
+import importlib.util
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from apps.prompts.models import (
+    CompressionDictionary,
+    FieldSet,
+    IdempotencyKey,
+    PromptBody,
+    PromptExecution,
+    PromptSchema,
+    QuotaCounter,
+)
+from apps.prompts.services.compression import (
+    MARKER,
+    PayloadCompressor,
+    ZlibCodec,
+    ZstdCodec,
+    compression_dictionaries,
+    is_packed,
+)
+from apps.prompts.services.content_store import field_sets, prompt_bodies
+from apps.prompts.services.idempotency import idempotency_service
+from apps.prompts.services.quota_service import QuotaExceededError, quota_service
+from apps.prompts.services.replay import build_report
+from apps.prompts.services.schema_service import schema_service
+from apps.prompts.services.semantic_cache import SemanticCache
+
+HEAVY_MODULES = ('openai', 'numpy', 'boto3', 'tiktoken')
+
+# booting takes well under a second here; the budget only catches a heavy import slipping back in
+STARTUP_BUDGET_MS = 5000
+
+IMPORT_SCRIPT = f"""
+import json, sys
+import django
+django.setup()
+import apps.prompts.services
+print(json.dumps(sorted(name for name in {HEAVY_MODULES!r} if name in sys.modules)))
+"""
+
+
+#a fresh interpreter, since this test run may already have imported any of them
+class LazyServicesImportTests(SimpleTestCase):
+    def test_booting_and_importing_services_skips_heavy_sdks(self):
+        environ = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'config.settings')}
+        result = subprocess.run(
+            [sys.executable, '-c', IMPORT_SCRIPT],
+            cwd=settings.BASE_DIR,
+            env=environ,
+            capture_output=True,
+            text=True,
+            timeout=60,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(json.loads(result.stdout.strip().splitlines()[-1]), [])
+
+    def test_booting_and_loading_the_urlconf_stays_within_budget(self):
+        call_command(
+            'benchmark_import_time',
+            module=['config.urls'],
+            runs=2,
+            budget_ms=STARTUP_BUDGET_MS,
+            stdout=StringIO(),
+        )
+
+
+def _replay_record(original, replayed, fields=('inventorFullName', 'birthYear')):
+    return {
+        'id': 1,
+        'user_id': 1,
+        'fields': list(fields),
+        'original': {'model': 'source', 'result': original},
+        'replay': {'model': 'candidate', 'result': replayed},
+    }
+
+
+class ReplayReportTests(SimpleTestCase):
+    def test_fields_match_across_key_spellings(self):
+        report = build_report([
+            _replay_record({'inventorFullName': 'Bell', 'birthYear': 1847}, {'inventor_full_name': 'bell', 'birth_year': '1847'}),
+            _replay_record({'inventor_full_name': 'Bell', 'birth_year': 1847}, {'inventor_full_name': 'Bell', 'birth_year': 1847}),
+        ])
+        self.assertEqual(report['agreement'], 1.0)
+        self.assertEqual(report['fields']['inventorFullName'], {'compared': 2, 'matched': 2, 'match_rate': 1.0})
+
+    def test_different_values_do_not_match(self):
+        report = build_report([_replay_record({'inventor_full_name': 'Bell'}, {'inventor_full_name': 'Edison'}, fields=['inventorFullName'])])
+        self.assertEqual(report['agreement'], 0.0)
+
+
+class SemanticCacheBoundsTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def cache(self, **options):
+        options = {'capacity': 50, 'user_capacity': 3, 'max_indexes': 2, 'max_files': 10, 'flush_every': 1, **options}
+        return SemanticCache(directory=self.directory, dim=64, **options)
+
+    def test_loaded_indexes_are_bounded_and_evicted_ones_are_kept_on_disk(self):
+        cache = self.cache(flush_every=100)
+        for owner in range(4):
+            cache.store(f"t-m-u{owner}", f"Prompt number {owner}", {'structured_data': {'n': owner}})
+        self.assertEqual(list(cache._indexes), ['t-m-u2', 't-m-u3'])
+        self.assertTrue(os.path.exists(os.path.join(self.directory, 't-m-u0.npz')))
+        self.assertIsNotNone(cache.lookup('t-m-u0', 'Prompt number 0'))
+
+    def test_user_indexes_have_their_own_cap(self):
+        cache = self.cache()
+        for number in range(5):
+            cache.store('t-m-u1', f"Question {number}", {})
+            cache.store('t-m-shared', f"Question {number}", {})
+        self.assertEqual(len(cache._index('t-m-u1')), 3)
+        self.assertEqual(len(cache._index('t-m-shared')), 5)
+        self.assertIsNone(cache.lookup('t-m-u1', 'Question 0'))
+        self.assertIsNotNone(cache.lookup('t-m-u1', 'Question 4'))
+
+    def test_files_are_capped(self):
+        cache = self.cache(max_files=3, max_indexes=10)
+        for owner in range(6):
+            cache.store(f"t-m-u{owner}", 'Same prompt', {})
+        self.assertEqual(len([name for name in os.listdir(self.directory) if name.endswith('.npz')]), 3)
+
+    def test_workers_merge_the_shared_file_on_flush(self):
+        first, second = self.cache(), self.cache()
+        first.store('t-m-shared', 'Who wrote Hamlet?', {})
+        second.store('t-m-shared', 'Who painted Guernica?', {})
+        reader = self.cache()
+        self.assertIsNotNone(reader.lookup('t-m-shared', 'Who wrote Hamlet?'))
+        self.assertIsNotNone(reader.lookup('t-m-shared', 'Who painted Guernica?'))
+
+
+class SchemaFieldUpsertTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user('schemer', password='pw12345!')
+        self.schema = PromptSchema.objects.create(user=user, name='Inventors')
+        schema_service.upsert_fields(self.schema, [{'name': 'fullName'}, {'name': 'birthYear'}])
+
+    def orders(self):
+        return dict(self.schema.fields.values_list('name', 'sort_order'))
+
+    def test_new_fields_are_appended_after_existing_ones(self):
+        schema_service.upsert_fields(self.schema, [{'name': 'country'}, {'name': 'patents'}])
+        self.assertEqual(self.orders(), {'fullName': 0, 'birthYear': 1, 'country': 2, 'patents': 3})
+
+    def test_retyping_a_field_keeps_its_place(self):
+        schema_service.upsert_fields(self.schema, [{'name': 'birthYear', 'field_type': 'number'}])
+        self.assertEqual(self.orders(), {'fullName': 0, 'birthYear': 1})
+        self.assertEqual(self.schema.fields.get(name='birthYear').field_type, 'number')
+
+    def test_explicit_sort_order_wins(self):
+        schema_service.upsert_fields(self.schema, [{'name': 'fullName', 'sort_order': 5}, {'name': 'country', 'sort_order': 0}])
+        self.assertEqual(self.orders(), {'fullName': 5, 'birthYear': 1, 'country': 0})
+
+
+LONG_TEXT = 'Extract the inventor, the year and the patent number from the document. ' * 20
+DICTIONARY = b'Extract the inventor, the year and the patent number from the document. '
+
+
+class PayloadCompressorTests(SimpleTestCase):
+    def compressor(self, **options):
+        return PayloadCompressor(codec=ZlibCodec(), threshold=64, **options)
+
+    def test_short_values_stay_plain(self):
+        self.assertEqual(self.compressor().pack('short prompt'), 'short prompt')
+        self.assertEqual(self.compressor().unpack('short prompt'), 'short prompt')
+
+    def test_long_values_round_trip(self):
+        packed = self.compressor().pack(LONG_TEXT)
+        self.assertTrue(packed.startswith(f"{MARKER}z:"))
+        self.assertLess(len(packed), len(LONG_TEXT))
+        self.assertEqual(self.compressor().unpack(packed), LONG_TEXT)
+
+    def test_dictionary_values_round_trip(self):
+        compressor = self.compressor(dictionary=(7, DICTIONARY))
+        packed = compressor.pack(LONG_TEXT)
+        self.assertTrue(packed.startswith(f"{MARKER}z7:"))
+        self.assertLess(len(packed), len(self.compressor().pack(LONG_TEXT)))
+        self.assertEqual(compressor.unpack(packed), LONG_TEXT)
+
+    @unittest.skipUnless(importlib.util.find_spec('zstandard'), 'zstandard is not installed')
+    def test_zstd_round_trips_with_and_without_a_dictionary(self):
+        for dictionary in (None, (3, DICTIONARY)):
+            compressor = PayloadCompressor(codec=ZstdCodec(), threshold=64, dictionary=dictionary)
+            packed = compressor.pack(LONG_TEXT)
+            self.assertTrue(packed.startswith(f"{MARKER}s"))
+            self.assertEqual(compressor.unpack(packed), LONG_TEXT)
+
+    def test_plain_value_starting_with_the_marker_is_packed(self):
+        legacy = f"{MARKER}z:not actually compressed"
+        packed = self.compressor().pack(legacy)
+        self.assertNotEqual(packed, legacy)
+        self.assertEqual(self.compressor().unpack(packed), legacy)
+
+
+class CompressedFieldTests(TestCase):
+    def setUp(self):
+        compression_dictionaries.clear()
+        self.addCleanup(compression_dictionaries.clear)
+        self.user = get_user_model().objects.create_user('packer', password='pw12345!')
+
+    def stored(self, model, column, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT {column} FROM {model._meta.db_table} WHERE id = %s", [pk])
+            return cursor.fetchone()[0]
+
+    def body(self, text):
+        body = PromptBody.objects.create(digest=str(PromptBody.objects.count()), text=text)
+        return PromptBody.objects.get(pk=body.pk), self.stored(PromptBody, 'text', body.pk)
+
+    def execution(self, result_data):
+        execution = PromptExecution.objects.create(user=self.user, prompt_text='p', result_data=result_data)
+        stored = self.stored(PromptExecution, 'result_data', execution.pk)
+        return PromptExecution.objects.get(pk=execution.pk).result_data, json.loads(stored)
+
+    def test_text_field_round_trips_short_and_long_values(self):
+        body, stored = self.body('short prompt')
+        self.assertEqual((body.text, stored), ('short prompt', 'short prompt'))
+        body, stored = self.body(LONG_TEXT)
+        self.assertTrue(is_packed(stored))
+        self.assertEqual(body.text, LONG_TEXT)
+
+    def test_json_field_round_trips_short_and_long_values(self):
+        value, stored = self.execution({'inventor': 'Bell'})
+        self.assertEqual((value, stored), ({'inventor': 'Bell'}, {'inventor': 'Bell'}))
+        document = {'summary': LONG_TEXT, 'years': [1847, 1876]}
+        value, stored = self.execution(document)
+        self.assertTrue(is_packed(stored))
+        self.assertEqual(value, document)
+
+    def test_fields_round_trip_with_an_active_dictionary(self):
+        dictionary = CompressionDictionary.objects.create(field='prompts.PromptBody.text', algorithm='zlib', data=DICTIONARY)
+        with override_settings(COMPRESSION_DICTIONARIES=True):
+            body, stored = self.body(LONG_TEXT)
+            self.assertTrue(stored.startswith(f"{MARKER}z{dictionary.pk}:"))
+            compression_dictionaries.clear()
+            self.assertEqual(PromptBody.objects.get(pk=body.pk).text, LONG_TEXT)
+
+    def test_plain_values_starting_with_the_marker_round_trip(self):
+        legacy = f"{MARKER}z:typed by hand"
+        body, stored = self.body(legacy)
+        self.assertNotEqual(stored, legacy)
+        self.assertEqual(body.text, legacy)
+        value, stored = self.execution(legacy)
+        self.assertEqual(value, legacy)
+        value, stored = self.execution({'note': legacy})
+        self.assertEqual(value, {'note': legacy})
+
+
+FIELDS = [{'name': 'inventorFullName', 'type': 'string'}, {'name': 'birthYear', 'type': 'number'}]
+
+
+class ContentInterningTests(TestCase):
+    def setUp(self):
+        for store in (prompt_bodies, field_sets):
+            store.clear()
+            self.addCleanup(store.clear)
+        cache.clear()
+        self.user = get_user_model().objects.create_user('interner', password='pw12345!')
+
+    def execution(self, prompt_text='Who invented the telephone?', structured_fields=FIELDS):
+        return PromptExecution(user=self.user, prompt_text=prompt_text, structured_fields=structured_fields)
+
+    def test_save_dedupes_identical_bodies_and_field_sets(self):
+        first = self.execution()
+        first.save()
+        second = self.execution(structured_fields=[{'type': 'string', 'name': 'inventorFullName'}, FIELDS[1]])
+        second.save()
+        self.assertEqual((PromptBody.objects.count(), FieldSet.objects.count()), (1, 1))
+        self.assertEqual(second.prompt_body_id, first.prompt_body_id)
+        self.assertEqual(second.field_set_id, first.field_set_id)
+        reloaded = PromptExecution.objects.get(pk=second.pk)
+        self.assertEqual((reloaded.prompt_text, reloaded.structured_fields), ('Who invented the telephone?', FIELDS))
+
+    def test_bulk_create_dedupes_within_and_across_batches(self):
+        self.execution().save()
+        PromptExecution.objects.bulk_create([self.execution() for _ in range(3)] + [self.execution('Who painted Guernica?')])
+        self.assertEqual(PromptBody.objects.count(), 2)
+        self.assertEqual(FieldSet.objects.count(), 1)
+        self.assertEqual(PromptExecution.objects.filter(prompt_body__text='Who invented the telephone?').count(), 4)
+
+    def test_purge_keeps_referenced_rows(self):
+        self.execution().save()
+        orphan_body = prompt_bodies.intern('Nobody sent this')
+        orphan_fields = field_sets.intern([{'name': 'unused'}])
+        self.assertEqual(prompt_bodies.purge_orphans(), 0)
+        self.assertEqual(prompt_bodies.purge_orphans(grace=timedelta(0)), 1)
+        self.assertEqual(field_sets.purge_orphans(grace=timedelta(0)), 1)
+        self.assertFalse(PromptBody.objects.filter(pk=orphan_body).exists())
+        self.assertFalse(FieldSet.objects.filter(pk=orphan_fields).exists())
+        self.assertEqual(PromptExecution.objects.get().prompt_text, 'Who invented the telephone?')
+        self.assertEqual((PromptBody.objects.count(), FieldSet.objects.count()), (1, 1))
+
+
+#one fixed window, so a test never straddles a window boundary
+@override_settings(LLM_QUOTA_REQUESTS=3, LLM_QUOTA_TOKENS=1000, LLM_USER_QUOTAS={})
+class QuotaServiceTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('spender', password='pw12345!')
+        patcher = mock.patch.object(quota_service, '_window', return_value=42)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def counter(self):
+        return QuotaCounter.objects.values_list('requests', 'tokens').get(user=self.user, window=42)
+
+    def test_reserves_up_to_the_request_limit(self):
+        for _ in range(3):
+            quota_service.reserve(self.user, 10)
+        self.assertEqual(self.counter(), (3, 30))
+        with self.assertRaisesMessage(QuotaExceededError, 'REQUEST QUOTA EXCEEDED'):
+            quota_service.reserve(self.user, 10)
+        self.assertEqual(self.counter(), (3, 30))
+
+    def test_rejects_an_estimate_past_the_token_limit(self):
+        quota_service.reserve(self.user, 600)
+        with self.assertRaisesMessage(QuotaExceededError, 'TOKEN QUOTA EXCEEDED'):
+            quota_service.reserve(self.user, 500)
+        quota_service.reserve(self.user, 400)
+        self.assertEqual(self.counter(), (2, 1000))
+
+    def test_settle_refunds_the_unused_estimate(self):
+        reservation = quota_service.reserve(self.user, 900)
+        quota_service.settle(reservation, {'total_tokens': 250})
+        self.assertEqual(self.counter(), (1, 250))
+        quota_service.reserve(self.user, 700)
+        self.assertEqual(self.counter(), (2, 950))
+
+    def test_release_returns_the_whole_estimate(self):
+        quota_service.release(quota_service.reserve(self.user, 900))
+        self.assertEqual(self.counter(), (1, 0))
+
+
+class IdempotencyClaimTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('submitter', password='pw12345!')
+        self.key = idempotency_service.derive_key('session', 'nonce')
+
+    def test_first_claim_runs(self):
+        record, created = idempotency_service.claim(self.user, self.key)
+        self.assertTrue(created)
+        self.assertEqual(record.status, IdempotencyKey.Status.IN_PROGRESS)
+
+    def test_duplicate_while_in_flight_does_not_run(self):
+        first, _ = idempotency_service.claim(self.user, self.key)
+        record, created = idempotency_service.claim(self.user, self.key)
+        self.assertFalse(created)
+        self.assertEqual((record.pk, record.status), (first.pk, IdempotencyKey.Status.IN_PROGRESS))
+
+    def test_duplicate_after_completion_gets_the_stored_result(self):
+        execution = PromptExecution.objects.create(user=self.user, prompt_text='p', status=PromptExecution.Status.COMPLETED)
+        first, _ = idempotency_service.claim(self.user, self.key)
+        idempotency_service.complete(first, execution, {'inventor': 'Bell'})
+        record, created = idempotency_service.claim(self.user, self.key)
+        self.assertFalse(created)
+        self.assertEqual(record.status, IdempotencyKey.Status.COMPLETED)
+        self.assertEqual((record.execution, record.response_data), (execution, {'inventor': 'Bell'}))
+
+    def test_release_after_an_error_lets_the_retry_run(self):
+        first, _ = idempotency_service.claim(self.user, self.key)
+        idempotency_service.release(first)
+        record, created = idempotency_service.claim(self.user, self.key)
+        self.assertTrue(created)
+        self.assertNotEqual(record.pk, first.pk)
+
+    def test_expired_claims_are_replaced(self):
+        first, _ = idempotency_service.claim(self.user, self.key)
+        IdempotencyKey.objects.filter(pk=first.pk).update(expires_at=first.created_at)
+        self.assertTrue(idempotency_service.claim(self.user, self.key)[1])
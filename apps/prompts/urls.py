@@ -1,9 +1,19 @@
 from django.urls import path
 
-from apps.prompts.views import PromptPlaygroundView
+from apps.prompts.views import (
+    FieldEditorFragmentView,
+    HistoryFragmentView,
+    PromptPlaygroundView,
+    ResultFragmentView,
+    execution_event_stream,
+)
 
 app_name = 'prompts'
 
 urlpatterns = [
     path('', PromptPlaygroundView.as_view(), name='playground'),
+    path('fragments/history/', HistoryFragmentView.as_view(), name='fragment_history'),
+    path('fragments/fields/', FieldEditorFragmentView.as_view(), name='fragment_fields'),
+    path('fragments/result/', ResultFragmentView.as_view(), name='fragment_result'),
+    path('events/', execution_event_stream, name='execution_events'),
 ]
@@ -1,28 +1,58 @@
+import asyncio
+import json
+import uuid
 from itertools import zip_longest
-from typing import Dict, List
+from typing import Dict, List, Optional
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
 from django.urls import reverse_lazy
-from django.views.generic import TemplateView
+from django.views.generic import TemplateView, View
+from rest_framework.exceptions import AuthenticationFailed
 
-from apps.prompts.models import PromptExecution
+from apps.core.profiling import performance_budget
+from apps.prompts.models import IdempotencyKey, PromptExecution, PromptSchema
 from apps.prompts.services import (
     LLMServiceError,
+    QuotaExceededError,
+    execution_events,
+    fragment_cache,
+    history_cache,
+    idempotency_service,
     image_handler,
     llm_service,
+    schema_service,
+    serialize_event,
 )
+from apps.users.authentication import StatelessJWTAuthentication
 
 
+@performance_budget(queries=6, ms=300, method='GET')
+@performance_budget(queries=20, method='POST')
 class PromptPlaygroundView(LoginRequiredMixin, TemplateView):
     template_name = 'prompts/prompt_playground.html'
     login_url = reverse_lazy('users_web:login')
 
     def get_context_data(self, **kwargs):
+        context = self.get_submission_context(**kwargs)
+        context['history'] = self._fetch_history(self.request.user)
+        context['latest_execution_id'] = fragment_cache.latest_execution_id(context['history'])
+        context['schemas'] = list(
+            PromptSchema.objects.filter(user=self.request.user, is_active=True).values('id', 'name')
+        )
+        return context
+
+    #what a submission needs; the full page adds history and the schema picker on top
+    def get_submission_context(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context.setdefault('prompt_text', '')
         context.setdefault('field_rows', self._default_fields())
-        context['history'] = self._fetch_history(self.request.user)
+        # a fresh nonce per rendered form; re-posting the same form reuses it
+        context['idempotency_nonce'] = uuid.uuid4().hex
         return context
 
     def post(self, request, *args, **kwargs):
@@ -35,12 +65,70 @@ class PromptPlaygroundView(LoginRequiredMixin, TemplateView):
                 'field_rows': field_rows or self._default_fields(),
             }
         )
-        context['history'] = self._fetch_history(request.user)
 
         if not prompt_text:
             context['error_message'] = 'Prompt text is required.'
             return self.render_to_response(context)
 
+        #refreshes and double-clicks get the stored (or in-flight) result instead of a new run
+        claim = None
+        idempotency_key = idempotency_service.key_for_request(request)
+        if idempotency_key:
+            claim, created = idempotency_service.claim(request.user, idempotency_key)
+            if not created:
+                return self._render_duplicate(context, claim)
+
+        try:
+            execution = self._execute(request, context)
+        except Exception:
+            idempotency_service.release(claim)
+            raise
+        if execution is not None:
+            # the committed save moved the history generation, so this reads it back fresh
+            context['history'] = history_cache.get(request.user)
+        if claim is not None:
+            if execution is None or execution.status != PromptExecution.Status.COMPLETED:
+                idempotency_service.release(claim)
+            else:
+                idempotency_service.complete(
+                    claim,
+                    execution,
+                    {key: context.get(key) for key in self.replay_context_keys},
+                )
+        return self.render_to_response(context)
+
+    replay_context_keys = (
+        'structured_output',
+        'llm_usage',
+        'validation_errors',
+        'image_preview_url',
+        'image_notice',
+    )
+
+    def _render_duplicate(self, context, claim: IdempotencyKey):
+        if claim.status == IdempotencyKey.Status.COMPLETED:
+            context.update(claim.response_data)
+            context['duplicate_notice'] = 'This request was already submitted; showing the stored result.'
+        else:
+            context['duplicate_notice'] = 'This request is still being processed. Refresh in a moment to see the result.'
+        return self.render_to_response(context)
+
+    #runs one submission; fills context and returns the saved execution, if any
+    def _execute(self, request, context) -> Optional[PromptExecution]:
+        prompt_text = context['prompt_text']
+
+        #saved schema replaces the submitted field rows
+        schema = None
+        schema_id = request.POST.get('schema_id')
+        if schema_id:
+            try:
+                schema = schema_service.get_user_schema(request.user, schema_id)
+            except ValidationError as exc:
+                context['error_message'] = exc.messages[0]
+                return None
+            context['field_rows'] = schema_service.field_rows(schema)
+            context['selected_schema_id'] = schema.id
+
         image_result = None
         image_file = request.FILES.get('image')
         if image_file:
@@ -55,10 +143,10 @@ class PromptPlaygroundView(LoginRequiredMixin, TemplateView):
                     context['image_notice'] = 'Existing upload reused for this request.'
             except ValidationError as exc:
                 context['error_message'] = str(exc)
-                return self.render_to_response(context)
+                return None
             except Exception as exc:  # noqa: BLE001
                 context['error_message'] = f"Image upload failed: {exc}"
-                return self.render_to_response(context)
+                return None
         else:
             context['image_preview_url'] = None
 
@@ -67,25 +155,49 @@ class PromptPlaygroundView(LoginRequiredMixin, TemplateView):
                 prompt_text=prompt_text,
                 fields=context['field_rows'],
                 image_url=context.get('image_preview_url'),
+                schema=schema,
+                user=request.user,
             )
-        except (ValueError, LLMServiceError) as exc:
+        except (ValueError, QuotaExceededError) as exc:
             context['error_message'] = str(exc)
-            return self.render_to_response(context)
+            return None
+        except LLMServiceError as exc:
+            #provider failures are kept so error rates show up in usage rollups
+            execution = PromptExecution.objects.create(
+                user=request.user,
+                schema=schema,
+                prompt_text=prompt_text,
+                structured_fields=context['field_rows'],
+                provider='openai',
+                model_name=exc.model,
+                status=PromptExecution.Status.FAILED,
+                error_message=str(exc),
+                image=image_result.image if image_result else None,
+            )
+            context['error_message'] = str(exc)
+            return execution
 
-        PromptExecution.objects.create(
+        execution = PromptExecution.objects.create(
             user=request.user,
+            schema=schema,
             prompt_text=prompt_text,
             structured_fields=context['field_rows'],
             result_data=llm_response.structured_data,
+            usage=llm_response.usage,
             provider='openai',
             model_name=llm_response.model,
             status=PromptExecution.Status.COMPLETED,
+            latency_ms=llm_response.latency_ms,
+            error_message='; '.join(
+                f"{name}: {reason}" for name, reason in llm_response.validation_errors.items()
+            ),
             image=image_result.image if image_result else None,
         )
 
         context['structured_output'] = llm_response.structured_data
         context['llm_usage'] = llm_response.usage
-        return self.render_to_response(context)
+        context['validation_errors'] = llm_response.validation_errors
+        return execution
 
     def _parse_fields(self, request) -> List[Dict[str, str]]:
         names = request.POST.getlist('field_names[]')
@@ -101,36 +213,151 @@ class PromptPlaygroundView(LoginRequiredMixin, TemplateView):
             rows.append({'name': clean_name, 'field_type': clean_type})
         return rows
 
-    def _default_fields(self) -> List[Dict[str, str]]:
+    @staticmethod
+    def _default_fields() -> List[Dict[str, str]]:
         return [
             {'name': 'inventorFullName', 'field_type': 'string'},
             {'name': 'inventorBirthYear', 'field_type': 'number'},
             {'name': 'numberOnTheShirt', 'field_type': 'number'},
         ]
 
-    def _fetch_history(self, user, limit: int = 5):
-        if not user.is_authenticated:
-            return []
-        qs = (
-            PromptExecution.objects.select_related('image')
-            .filter(user=user)
-            .order_by('-created_at')[:limit]
+    def _fetch_history(self, user):
+        return history_cache.get(user)
+
+
+#partial endpoints the playground script swaps into the page instead of reloading it
+class FragmentView(LoginRequiredMixin, View):
+    login_url = reverse_lazy('users_web:login')
+
+    def fragment_response(self, html: str, **headers) -> HttpResponse:
+        response = HttpResponse(html)
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+
+@performance_budget(queries=3, ms=50, method='GET')
+class HistoryFragmentView(FragmentView):
+    def get(self, request, *args, **kwargs):
+        html = fragment_cache.render(
+            'history',
+            request.user,
+            'prompts/partials/history.html',
+            lambda history: {'history': history},
         )
-        history = []
-        for execution in qs:
-            image_url = None
-            if execution.image:
-                image_url = execution.image.image_url or (
-                    execution.image.file.url if execution.image.file else None
-                )
-            history.append(
-                {
-                    'id': execution.id,
-                    'prompt_text': execution.prompt_text,
-                    'result_data': execution.result_data,
-                    'created_at': execution.created_at,
-                    'model_name': execution.model_name,
-                    'image_url': image_url,
-                }
+        latest = fragment_cache.latest_execution_id(history_cache.get(request.user))
+        return self.fragment_response(html, **{'X-Latest-Execution': str(latest)})
+
+
+@performance_budget(queries=4, ms=50, method='GET')
+class FieldEditorFragmentView(FragmentView):
+    def get(self, request, *args, **kwargs):
+        schema_id = request.GET.get('schema_id')
+        if not schema_id:
+            html = fragment_cache.render(
+                'fields',
+                request.user,
+                'prompts/partials/field_editor.html',
+                lambda history: {'field_rows': PromptPlaygroundView._default_fields()},
             )
-        return history
+            return self.fragment_response(html)
+        try:
+            schema = schema_service.get_user_schema(request.user, schema_id)
+        except ValidationError as exc:
+            return HttpResponseBadRequest(exc.messages[0])
+        html = fragment_cache.render(
+            'fields',
+            request.user,
+            'prompts/partials/field_editor.html',
+            lambda history: {'field_rows': schema_service.field_rows(schema)},
+            key=(schema.id, schema.updated_at.timestamp()),
+        )
+        return self.fragment_response(html)
+
+
+#GET shows the newest stored result; POST runs a submission exactly like the full page
+#but renders only the result panel and hands the next nonce back in a header
+@performance_budget(queries=3, ms=50, method='GET')
+class ResultFragmentView(PromptPlaygroundView):
+    template_name = 'prompts/partials/result.html'
+
+    def get_context_data(self, **kwargs):
+        return self.get_submission_context(**kwargs)
+
+    def get(self, request, *args, **kwargs):
+        html = fragment_cache.render(
+            'result',
+            request.user,
+            self.template_name,
+            lambda history: {'structured_output': history[0]['result_data'] if history else None},
+        )
+        return HttpResponse(html)
+
+    def render_to_response(self, context, **response_kwargs):
+        response = super().render_to_response(context, **response_kwargs)
+        response['X-Idempotency-Nonce'] = uuid.uuid4().hex
+        if context.get('history') is not None:
+            response['X-Latest-Execution'] = str(fragment_cache.latest_execution_id(context['history']))
+        return response
+
+
+#session for the playground, bearer token for API clients; never touches the db for tokens
+def _stream_user(request):
+    if request.user.is_authenticated:
+        return request.user
+    result = StatelessJWTAuthentication().authenticate(request)
+    return result[0] if result else None
+
+
+def _sse(event) -> str:
+    return f"id: {event['id']}:{event['updated_at']}\nevent: execution\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+async def _execution_stream(subscription, snapshot):
+    heartbeat = getattr(settings, 'EXECUTION_EVENTS_HEARTBEAT_SECONDS', 15)
+    loop = asyncio.get_running_loop()
+    # streams end after a while so workers can recycle; EventSource reconnects on its own
+    deadline = loop.time() + getattr(settings, 'EXECUTION_EVENTS_MAX_STREAM_SECONDS', 300)
+    try:
+        yield f"retry: {getattr(settings, 'EXECUTION_EVENTS_RETRY_MS', 3000)}\n\n"
+        for event in snapshot:
+            yield _sse(event)
+        while (remaining := deadline - loop.time()) > 0:
+            event = await subscription.get(timeout=min(heartbeat, remaining))
+            yield _sse(event) if event is not None else ': keepalive\n\n'
+    finally:
+        execution_events.unsubscribe(subscription)
+
+
+#server-sent events with the caller's execution status changes, replacing status polling;
+#opens with the executions still in flight so a reconnect never misses a transition
+async def execution_event_stream(request):
+    if not isinstance(request, ASGIRequest):
+        # WSGI would buffer the whole stream; 204 tells EventSource to stop reconnecting
+        return HttpResponse(status=204)
+    try:
+        user = await sync_to_async(_stream_user)(request)
+    except AuthenticationFailed as exc:
+        return HttpResponse(str(exc.detail), status=401)
+    if user is None:
+        return HttpResponse('Authentication required.', status=401)
+    # token claims carry the id as a string; events are keyed on the column value
+    user_id = user._meta.pk.to_python(user.pk)
+
+    # subscribe before reading the snapshot, so nothing falls between the two
+    subscription = execution_events.subscribe(user_id)
+    try:
+        snapshot = await sync_to_async(lambda: [
+            serialize_event(execution)
+            for execution in PromptExecution.objects.filter(
+                user_id=user_id,
+                status__in=[PromptExecution.Status.PENDING, PromptExecution.Status.RUNNING],
+            ).order_by('created_at')[:50]
+        ])()
+    except BaseException:
+        execution_events.unsubscribe(subscription)
+        raise
+    response = StreamingHttpResponse(_execution_stream(subscription, snapshot), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
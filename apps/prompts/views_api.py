@@ -0,0 +1,143 @@
+from django.db.models import Count, Max
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.generics import ListCreateAPIView, RetrieveUpdateDestroyAPIView
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from apps.core.profiling import performance_budget
+from apps.prompts.models import PromptSchema, UsageRollup
+from apps.prompts.serializers import (
+    FieldUpsertSerializer,
+    PromptSchemaSerializer,
+    SchemaFieldSerializer,
+)
+from apps.prompts.services import analytics_service, schema_service, usage_rollups
+from apps.users.authentication import StatelessJWTAuthentication
+
+
+def _int_param(request, name, default, minimum=1, maximum=1000):
+    try:
+        value = int(request.query_params.get(name, default))
+    except (TypeError, ValueError):
+        return default
+    return max(minimum, min(value, maximum))
+
+
+#conditional GET support driven by PromptSchema.updated_at: one aggregate query over the
+#view's own queryset (narrowed to the looked-up row on detail views); the count covers
+#deletions that do not move max(updated_at)
+class SchemaConditionalMixin:
+    def _validators(self, request):
+        queryset = self.get_queryset().order_by()
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        if lookup_url_kwarg in self.kwargs:
+            queryset = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        stats = queryset.aggregate(last_modified=Max('updated_at'), total=Count('id'))
+        last_modified = stats['last_modified']
+        if last_modified is None:
+            return None, None
+        return quote_etag(f"{stats['total']}-{last_modified.timestamp()}"), last_modified
+
+    def _not_modified(self, request):
+        etag, last_modified = self._validators(request)
+        if last_modified is None:
+            return None, etag, last_modified
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=int(last_modified.timestamp()),
+        )
+        return response, etag, last_modified
+
+    def _with_validators(self, response, etag, last_modified):
+        if last_modified is not None and response.status_code == status.HTTP_200_OK:
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+            response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def get(self, request, *args, **kwargs):
+        not_modified, etag, last_modified = self._not_modified(request)
+        if not_modified is not None:
+            return not_modified
+        response = super().get(request, *args, **kwargs)
+        return self._with_validators(response, etag, last_modified)
+
+
+@performance_budget(queries=4, ms=200, method='GET')
+class PromptSchemaListView(SchemaConditionalMixin, ListCreateAPIView):
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    serializer_class = PromptSchemaSerializer
+
+    def get_queryset(self):
+        return PromptSchema.objects.filter(user=self.request.user).prefetch_related('fields')
+
+
+@performance_budget(queries=4, ms=200, method='GET')
+class PromptSchemaDetailView(SchemaConditionalMixin, RetrieveUpdateDestroyAPIView):
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    serializer_class = PromptSchemaSerializer
+    lookup_url_kwarg = 'schema_id'
+
+    def get_queryset(self):
+        return PromptSchema.objects.filter(user=self.request.user).prefetch_related('fields')
+
+
+class SchemaFieldBulkUpsertView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def put(self, request, schema_id):
+        schema = get_object_or_404(PromptSchema, pk=schema_id, user=request.user)
+        serializer = FieldUpsertSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        fields = schema_service.upsert_fields(
+            schema,
+            serializer.validated_data['fields'],
+            replace=serializer.validated_data['replace'],
+        )
+        return Response(SchemaFieldSerializer(fields, many=True).data, status=status.HTTP_200_OK)
+
+
+@performance_budget(queries=4, method='GET')
+class SchemaAnalyticsView(APIView):
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, schema_id):
+        schema = get_object_or_404(PromptSchema, pk=schema_id, user=request.user)
+        summary = analytics_service.summarize(
+            schema,
+            top_k=_int_param(request, 'top_k', 10, maximum=100),
+            bins=_int_param(request, 'bins', 10, maximum=200),
+        )
+        return Response(summary, status=status.HTTP_200_OK)
+
+
+#dashboards read pre-aggregated rollups, never PromptExecution
+@performance_budget(queries=2, ms=200, method='GET')
+class UsageRollupView(APIView):
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        granularity = request.query_params.get('granularity', UsageRollup.Granularity.DAY)
+        if granularity not in UsageRollup.Granularity.values:
+            return Response({'granularity': ['USE hour OR day.']}, status=status.HTTP_400_BAD_REQUEST)
+        group_by = [item for item in request.query_params.get('group_by', 'model_name').split(',') if item]
+        # staff can look across all users
+        all_users = request.user.is_staff and request.query_params.get('all_users') in ('1', 'true')
+        rows = usage_rollups.query(
+            user=None if all_users else request.user,
+            granularity=granularity,
+            group_by=group_by,
+            since=parse_datetime(request.query_params.get('since', '') or ''),
+            until=parse_datetime(request.query_params.get('until', '') or ''),
+        )
+        return Response({'granularity': granularity, 'results': rows}, status=status.HTTP_200_OK)
@@ -5,3 +5,6 @@ class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.users'
     verbose_name = 'Users'
+
+    def ready(self):
+        from apps.users import checks, signals  # noqa: F401
@@ -0,0 +1,142 @@
+import logging
+from functools import partial
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from apps.core.cache import CacheNamespace
+
+logger = logging.getLogger(__name__)
+
+USERNAME_CLAIM = 'username'
+STAFF_CLAIM = 'is_staff'
+
+
+#per-user auth state (active and staff flags, password fingerprint) shared by every worker
+#through the cache. only these values are cached, never the row or its password hash, and a
+#miss (expiry, eviction, another worker's locmem) reloads them from the database
+class UserAuthCache:
+    def __init__(self) -> None:
+        self.namespace = CacheNamespace('users.auth', version=3)
+
+    @property
+    def timeout(self) -> int:
+        return getattr(settings, 'JWT_USER_CACHE_TIMEOUT', 60)
+
+    def _state(self, user_id, is_active, is_staff, password) -> Dict[str, Any]:
+        return {
+            'id': str(user_id),
+            'is_active': is_active,
+            'is_staff': is_staff,
+            'fingerprint': get_md5_hash_password(password),
+        }
+
+    #None when the user no longer exists
+    def state(self, user_id) -> Optional[Dict[str, Any]]:
+        state = self.namespace.get(user_id)
+        if state is None:
+            row = (
+                get_user_model().objects
+                .filter(**{api_settings.USER_ID_FIELD: user_id})
+                .values_list('is_active', 'is_staff', 'password')
+                .first()
+            )
+            if row is None:
+                return None
+            state = self._state(user_id, *row)
+            self.namespace.set(user_id, state, self.timeout)
+        return state
+
+    #primes the state from a row that was just loaded anyway
+    def remember(self, user) -> None:
+        user_id = getattr(user, api_settings.USER_ID_FIELD)
+        self.namespace.set(user_id, self._state(user_id, user.is_active, user.is_staff, user.password), self.timeout)
+
+    #called on every save and delete; workers with their own locmem cache notice within
+    #JWT_USER_CACHE_TIMEOUT, shared backends immediately
+    def invalidate(self, user) -> None:
+        user_id = getattr(user, api_settings.USER_ID_FIELD)
+        self.namespace.delete(user_id)
+        # a read racing an uncommitted save may have cached the old state again
+        transaction.on_commit(partial(self.namespace.delete, user_id))
+
+
+user_auth_cache = UserAuthCache()
+
+
+def _user_id(validated_token):
+    try:
+        return validated_token[api_settings.USER_ID_CLAIM]
+    except KeyError as exc:
+        raise InvalidToken(_('Token contained no recognizable user identification')) from exc
+
+
+#the checks JWTAuthentication.get_user makes, against the cached auth state
+def check_auth_state(state, validated_token) -> None:
+    if state is None:
+        raise AuthenticationFailed(_('User not found'), code='user_not_found')
+    if api_settings.CHECK_USER_IS_ACTIVE and not state['is_active']:
+        raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+    if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != state['fingerprint']:
+        raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+
+
+#loads the user row like JWTAuthentication and refreshes the cached auth state with it,
+#so claim-only reads that follow don't have to
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        user_auth_cache.remember(user)
+        return user
+
+
+def _read_only_save(*args, **kwargs):
+    raise RuntimeError('Users built from token claims cannot be saved.')
+
+
+#safe-method requests get a user built from the signed claims, checked against the cached
+#auth state; writes (and tokens minted before the claims existed) load the row
+class StatelessJWTAuthentication(CachedJWTAuthentication):
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        trust_claims = (
+            getattr(settings, 'JWT_STATELESS_READS', True)
+            and request.method in SAFE_METHODS
+            and USERNAME_CLAIM in validated_token
+        )
+        if trust_claims:
+            return self.get_claims_user(validated_token), validated_token
+        return self.get_user(validated_token), validated_token
+
+    def get_claims_user(self, validated_token):
+        user_id = _user_id(validated_token)
+        state = user_auth_cache.state(user_id)
+        check_auth_state(state, validated_token)
+        User = get_user_model()
+        user = User(
+            **{api_settings.USER_ID_FIELD: user_id},
+            username=validated_token[USERNAME_CLAIM],
+            # the claim is only as fresh as the token; a demoted account must lose staff
+            # access straight away, so the durable state decides
+            is_staff=bool(state['is_staff']),
+            is_active=True,
+        )
+        # behaves like a fetched row for filters, but must never overwrite the real one
+        user._state.adding = False
+        user._state.db = 'default'
+        user.save = _read_only_save
+        return user
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher
+from django.core.checks import Error, register
+
+
+@register()
+def check_password_hasher(app_configs, **kwargs):
+    hasher = get_hasher()
+    if hasher.library is None:
+        return []
+    try:
+        hasher._load_library()
+    except ValueError as exc:
+        return [
+            Error(
+                f"PASSWORD_HASHER={getattr(settings, 'PASSWORD_HASHER', '')!r} cannot be used: {exc}",
+                hint='Install the library or choose another PASSWORD_HASHER.',
+                id='users.E001',
+            )
+        ]
+    return []
@@ -0,0 +1,24 @@
+from django import forms
+from django.contrib.auth.forms import UserCreationForm
+from django.db import IntegrityError, transaction
+
+from .models import CanonicalUsername
+
+
+#case-insensitive uniqueness through the canonical index instead of username__iexact
+class SignupForm(UserCreationForm):
+    def clean_username(self):
+        username = self.cleaned_data.get('username')
+        if username and CanonicalUsername.is_taken(username):
+            raise forms.ValidationError(self.instance.unique_error_message(self._meta.model, ['username']))
+        return username
+
+    def save(self, commit=True):
+        if not commit:
+            return super().save(commit=False)
+        try:
+            with transaction.atomic():
+                return super().save(commit=True)
+        except IntegrityError:
+            self.add_error('username', self.instance.unique_error_message(self._meta.model, ['username']))
+            return None
@@ -0,0 +1,70 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from apps.users.authentication import CachedJWTAuthentication, StatelessJWTAuthentication, user_auth_cache
+from apps.users.serializers import ClaimsTokenObtainPairSerializer
+
+BENCHMARK_USERNAME = 'jwt-benchmark'
+MODES = {
+    'db': JWTAuthentication,
+    'cached': CachedJWTAuthentication,
+    'stateless': StatelessJWTAuthentication,
+}
+
+
+def _probe_view(authentication_class):
+    class ProbeView(APIView):
+        authentication_classes = [authentication_class]
+        permission_classes = [IsAuthenticated]
+
+        def get(self, request):
+            return Response({'id': request.user.pk})
+
+    return ProbeView.as_view()
+
+
+class Command(BaseCommand):
+    help = 'Measure authenticated GET requests per second for each JWT authentication mode.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--warmup', type=int, default=50)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        user, created = User.objects.get_or_create(username=BENCHMARK_USERNAME)
+        if created:
+            user.set_unusable_password()
+            user.save()
+        token = str(ClaimsTokenObtainPairSerializer.get_token(user).access_token)
+        factory = APIRequestFactory()
+        try:
+            self.stdout.write(f"{'mode':<10} {'req/s':>10} {'queries/req':>12}")
+            for mode, authentication_class in MODES.items():
+                view = _probe_view(authentication_class)
+                user_auth_cache.invalidate(user)
+                for _ in range(options['warmup']):
+                    view(factory.get('/', HTTP_AUTHORIZATION=f"Bearer {token}"))
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    for _ in range(options['requests']):
+                        response = view(factory.get('/', HTTP_AUTHORIZATION=f"Bearer {token}"))
+                        if response.status_code != 200:
+                            self.stderr.write(f"{mode}: unexpected status {response.status_code}")
+                            return
+                    elapsed = time.perf_counter() - started
+                rate = options['requests'] / elapsed
+                per_request = len(queries) / options['requests']
+                self.stdout.write(f"{mode:<10} {rate:>10.0f} {per_request:>12.2f}")
+        finally:
+            if created:
+                user.delete()
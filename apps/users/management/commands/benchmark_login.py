@@ -0,0 +1,110 @@
+import asyncio
+import json
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from django.urls import reverse
+
+BENCHMARK_USERNAME = 'login-benchmark'
+BENCHMARK_PASSWORD = 'login-benchmark-Pa55'
+
+
+def _hashers_for(name):
+    selected = settings.PASSWORD_HASHER_PATHS[name]
+    return [selected, *(path for path in settings.PASSWORD_HASHERS if path != selected)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Fire concurrent JWT logins through Django\'s ASGI handler and report throughput '
+        'and latency percentiles per password hasher.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument(
+            '--hasher',
+            action='append',
+            choices=sorted(settings.PASSWORD_HASHER_PATHS),
+            help='Hasher to measure; repeat to compare several (default: PASSWORD_HASHER).',
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests and --concurrency must be positive.')
+        self.stdout.write(f"{'hasher':<8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for hasher in options['hasher'] or [settings.PASSWORD_HASHER]:
+            with override_settings(PASSWORD_HASHERS=_hashers_for(hasher), ALLOWED_HOSTS=['localhost']):
+                User = get_user_model()
+                User.objects.filter(username=BENCHMARK_USERNAME).delete()
+                User.objects.create_user(username=BENCHMARK_USERNAME, password=BENCHMARK_PASSWORD)
+                try:
+                    elapsed, latencies = asyncio.run(self._run(options['requests'], options['concurrency']))
+                    self._report(hasher, elapsed, latencies)
+                finally:
+                    User.objects.filter(username=BENCHMARK_USERNAME).delete()
+
+    #each login is a full ASGI request, so it runs in the per-request thread-sensitive
+    #context and middleware chain a deployed worker uses
+    async def _run(self, total, concurrency):
+        application = ASGIHandler()
+        url = reverse('login')
+        body = json.dumps({'username': BENCHMARK_USERNAME, 'password': BENCHMARK_PASSWORD}).encode()
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'POST',
+            'scheme': 'http',
+            'path': url,
+            'raw_path': url.encode(),
+            'query_string': b'',
+            'root_path': '',
+            'headers': [
+                (b'host', b'localhost'),
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode()),
+            ],
+            'client': ('127.0.0.1', 0),
+            'server': ('localhost', 80),
+        }
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def login():
+            messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+            status = {}
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                # the request is over; wait for the handler to stop listening for a disconnect
+                await asyncio.Event().wait()
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status['code'] = message['status']
+
+            async with semaphore:
+                started = time.perf_counter()
+                await application(dict(scope), receive, send)
+                latencies.append((time.perf_counter() - started) * 1000)
+            if status.get('code') != 200:
+                raise CommandError(f"Login failed with status {status.get('code')}")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(total)))
+        return time.perf_counter() - started, latencies
+
+    def _report(self, hasher, elapsed, latencies):
+        cuts = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+        self.stdout.write(
+            f"{hasher:<8} {len(latencies) / elapsed:>8.1f} "
+            f"{cuts[49]:>8.1f} {cuts[94]:>8.1f} {cuts[98]:>8.1f}"
+        )
@@ -0,0 +1,72 @@
+import logging
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import migrations, transaction
+
+BATCH_SIZE = 2000
+
+logger = logging.getLogger(__name__)
+
+
+#'#' is not allowed in usernames, so an alias can never shadow a real name
+def _alias(username, user_id):
+    suffix = f"#{user_id}"
+    return f"{username[:150 - len(suffix)]}{suffix}"
+
+
+#keyset batches, each in its own transaction, so large user tables are never locked
+#for the whole backfill. on existing case duplicates the oldest account keeps the name
+#and the others are indexed as "name#id" and logged, so they can be found and renamed
+def populate(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    CanonicalUsername = apps.get_model('users', 'CanonicalUsername')
+    username_field = get_user_model().USERNAME_FIELD
+    alias = schema_editor.connection.alias
+    last_id = 0
+    collisions = 0
+    while True:
+        rows = list(
+            User.objects.using(alias)
+            .filter(pk__gt=last_id)
+            .order_by('pk')
+            .values_list('pk', username_field)[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        with transaction.atomic(using=alias):
+            normalized = {user_id: username.strip().lower() for user_id, username in rows}
+            owners = dict(
+                CanonicalUsername.objects.using(alias)
+                .filter(username__in=set(normalized.values()))
+                .values_list('username', 'user_id')
+            )
+            canonical = []
+            for user_id, username in rows:
+                owner = owners.setdefault(normalized[user_id], user_id)
+                if owner == user_id:
+                    canonical.append(CanonicalUsername(user_id=user_id, username=normalized[user_id]))
+                    continue
+                collisions += 1
+                canonical.append(CanonicalUsername(user_id=user_id, username=_alias(normalized[user_id], user_id)))
+                logger.warning(
+                    'User %s (%r) clashes ignoring case with user %s; indexed as %r',
+                    user_id, username, owner, _alias(normalized[user_id], user_id),
+                )
+            CanonicalUsername.objects.using(alias).bulk_create(canonical, ignore_conflicts=True)
+    if collisions:
+        logger.warning('%s users share a lower-cased username with an older account', collisions)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('users', '0001_canonical_username'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,32 @@
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+
+def normalize_username(username: str) -> str:
+    return username.strip().lower()
+
+
+#lower-cased copy of auth_user.username; the unique index makes case-insensitive
+#lookups an index probe and rejects "Bob" next to "bob" at the database
+class CanonicalUsername(models.Model):
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='canonical_username'
+    )
+    username = models.CharField(max_length=150, unique=True)
+
+    def __str__(self) -> str:  # pragma: no cover - readability only
+        return self.username
+
+    @classmethod
+    def is_taken(cls, username: str) -> bool:
+        return cls.objects.filter(username=normalize_username(username)).exists()
+
+    #raises IntegrityError when another user already owns the normalized name
+    @classmethod
+    def sync(cls, user) -> None:
+        normalized = normalize_username(user.get_username())
+        updated = cls.objects.filter(user=user).exclude(username=normalized).update(username=normalized)
+        if not updated:
+            cls.objects.get_or_create(user=user, defaults={'username': normalized})
@@ -4,6 +4,11 @@ from os import read, write
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
+from django.db import IntegrityError, transaction
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+
+from .authentication import STAFF_CLAIM, USERNAME_CLAIM
+from .models import CanonicalUsername
 import logging  
 _logger = logging.getLogger(__name__)
 User = get_user_model()
@@ -34,8 +39,7 @@ class RegisterSerializer(serializers.ModelSerializer):
         }
     
     def validate_username(self,username):
-        username_exists = User.objects.filter(username__iexact= username).exists()
-        if username_exists:
+        if CanonicalUsername.is_taken(username):
             raise serializers.ValidationError("USERNAME ALREADY EXISTS!")
         return username.lower()
     
@@ -46,11 +50,16 @@ class RegisterSerializer(serializers.ModelSerializer):
         return attrs
     
     def create(self, validated_data):
-        user = User.objects.create_user(
-            username=validated_data['username'],
-            email=validated_data['email'],
-            password=validated_data['password']
-        )
+        # a concurrent signup with the same name loses on the canonical unique index
+        try:
+            with transaction.atomic():
+                user = User.objects.create_user(
+                    username=validated_data['username'],
+                    email=validated_data['email'],
+                    password=validated_data['password']
+                )
+        except IntegrityError:
+            raise serializers.ValidationError({"username": "USERNAME ALREADY EXISTS!"})
         return user
 
 class UserSerializer(serializers.ModelSerializer):
@@ -91,4 +100,14 @@ class ChangePasswordSerializer(serializers.Serializer):
         user = self.context['request'].user
         if not user. check_password(value):
             raise serializers.ValidationError("Old password is incorrect.")
-        return value
\ No newline at end of file
+        return value
+
+
+#claims read by StatelessJWTAuthentication; refreshed access tokens copy them
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token[USERNAME_CLAIM] = user.get_username()
+        token[STAFF_CLAIM] = user.is_staff
+        return token
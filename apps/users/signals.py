@@ -0,0 +1,38 @@
+import logging
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.users.authentication import user_auth_cache
+from apps.users.models import CanonicalUsername
+
+logger = logging.getLogger(__name__)
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    user_auth_cache.invalidate(instance)
+
+
+#new users must get their canonical row (a clash aborts the signup); for existing
+#accounts that predate it a clash is only logged so logins and edits keep working
+@receiver(post_save, sender=User)
+def sync_canonical_username(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'username' not in update_fields):
+        return
+    if created:
+        CanonicalUsername.sync(instance)
+        return
+    try:
+        with transaction.atomic():
+            CanonicalUsername.sync(instance)
+    except IntegrityError:
+        logger.warning('Username %r of user %s clashes with another account ignoring case', instance.get_username(), instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def invalidate_deleted_user(sender, instance, **kwargs):
+    user_auth_cache.invalidate(instance)
@@ -1,3 +1,59 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from apps.prompts.models import UsageRollup
+from apps.users.serializers import ClaimsTokenObtainPairSerializer
+
+USAGE_URL = '/api/prompts/usage/'
+
+
+#claim-only reads: the token is trusted for identity, the durable state for everything
+#that can change after it was minted
+class StatelessJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user('staffer', password='pw12345!', is_staff=True)
+        self.other = get_user_model().objects.create_user('other', password='pw12345!')
+        UsageRollup.objects.create(
+            user=self.other,
+            model_name='gpt-4o-mini',
+            granularity=UsageRollup.Granularity.DAY,
+            bucket_start='2026-01-01T00:00:00Z',
+            request_count=3,
+        )
+        self.client = APIClient()
+        token = ClaimsTokenObtainPairSerializer.get_token(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def all_users_requests(self):
+        response = self.client.get(USAGE_URL, {'all_users': '1'})
+        self.assertEqual(response.status_code, 200)
+        return sum(row['requests'] for row in response.json()['results'])
+
+    def test_staff_sees_all_users(self):
+        self.assertEqual(self.all_users_requests(), 3)
+
+    def test_demoted_staff_loses_all_users_with_an_old_token(self):
+        self.all_users_requests()
+        self.user.is_staff = False
+        self.user.save()
+        self.assertEqual(self.all_users_requests(), 0)
+
+    def test_demotion_is_seen_after_the_cached_state_is_lost(self):
+        self.all_users_requests()
+        get_user_model().objects.filter(pk=self.user.pk).update(is_staff=False)
+        cache.clear()
+        self.assertEqual(self.all_users_requests(), 0)
+
+    def test_password_change_rejects_old_tokens(self):
+        self.user.set_password('another-pw-1')
+        self.user.save()
+        cache.clear()
+        self.assertEqual(self.client.get(USAGE_URL).status_code, 401)
+
+    def test_deactivated_user_is_rejected(self):
+        get_user_model().objects.filter(pk=self.user.pk).update(is_active=False)
+        cache.clear()
+        self.assertEqual(self.client.get(USAGE_URL).status_code, 401)
@@ -8,6 +8,9 @@ from rest_framework.generics import CreateAPIView
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .authentication import user_auth_cache
 
 from .serializers import (
     RegisterSerializer,
@@ -32,7 +35,7 @@ class RegisterUser(CreateAPIView):
         user = serializer.save()
         
         
-        _logger.info(f"New user registered: {user.username}")
+        _logger.info('New user registered: %s', user.username)
         return Response(
             {
                 "id": user.id,
@@ -47,16 +50,18 @@ class UserProfile(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
-        _logger.debug(f"Fetching profile for user: {request.user.username}")
+        _logger.debug('Fetching profile for user: %s', request.user.username)
         serializer = UserSerializer(request.user)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
 class ChangePasswordView(APIView):
+    # writes the user row, so load it fresh instead of from the auth cache
+    authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
-        _logger. info(f"PASSWORD CHANGE STARTED: {request.user. username}")
+        _logger.info('PASSWORD CHANGE STARTED: %s', request.user.username)
         
         serializer = ChangePasswordSerializer(
             data=request.data,
@@ -66,8 +71,9 @@ class ChangePasswordView(APIView):
         
         request.user.set_password(serializer.validated_data['new_password'])
         request.user. save()
+        user_auth_cache.invalidate(request.user)
         
-        _logger. info(f"PASSWORD CHANGED SUCCESSFULLY: {request.user.username}")
+        _logger.info('PASSWORD CHANGED SUCCESSFULLY: %s', request.user.username)
         
         return Response(
             {"message": "CHANGED SUCCESFULLY PASSWORD"},
@@ -1,9 +1,11 @@
 from django.contrib.auth import login
-from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
+from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.views import LoginView
 from django.urls import reverse_lazy
 from django.views.generic import FormView
 
+from .forms import SignupForm
+
 
 class BootstrapFormMixin:
     field_class = 'form-control'
@@ -19,11 +21,13 @@ class BootstrapFormMixin:
 
 class UserSignupView(BootstrapFormMixin, FormView):
     template_name = 'users/signup.html'
-    form_class = UserCreationForm
+    form_class = SignupForm
     success_url = reverse_lazy('prompts:playground')
 
     def form_valid(self, form):
         user = form.save()
+        if user is None:
+            return self.form_invalid(form)
         login(self.request, user)
         return super().form_valid(form)
 
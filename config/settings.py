@@ -14,7 +14,7 @@ import os
 from datetime import timedelta
 from pathlib import Path
 
-from decouple import config
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -50,15 +50,28 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'apps.core.log.CorrelationIdMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'apps.core.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# opt-in request profiling: send PROFILING_HEADER (staff session, DEBUG or matching
+# PROFILING_SECRET) or set a sample rate; artifacts are listed under /_profiles/
+PROFILING_ENABLED = config('PROFILING_ENABLED', default=False, cast=bool)
+PROFILING_HEADER = config('PROFILING_HEADER', default='X-Profile')
+PROFILING_SECRET = config('PROFILING_SECRET', default='')
+PROFILING_SAMPLE_RATE = config('PROFILING_SAMPLE_RATE', default=0.0, cast=float)
+PROFILING_DIR = config('PROFILING_DIR', default=str(BASE_DIR / '.cache' / 'profiles'))
+PROFILING_MAX_ARTIFACTS = config('PROFILING_MAX_ARTIFACTS', default=200, cast=int)
+# what to do when a view exceeds its declared performance_budget: off, warn or raise
+PERFORMANCE_BUDGETS = config('PERFORMANCE_BUDGETS', default='warn')
+
 ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
@@ -88,10 +101,71 @@ DATABASES = {
         'NAME': BASE_DIR / 'db.sqlite3',
     }
 }
+# Cache
+# CACHE_BACKEND is one of locmem, file, database or redis. CACHE_LOCATION is
+# the locmem name, the cache directory, the cache table (create it with
+# `manage.py createcachetable`) or the redis URL respectively.
+_CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'database': 'django.core.cache.backends.db.DatabaseCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+}
+_cache_backend = config('CACHE_BACKEND', default='locmem')
+_cache_location_defaults = {
+    'locmem': 'widgera',
+    'file': str(BASE_DIR / '.cache'),
+    'database': 'django_cache',
+    'redis': 'redis://127.0.0.1:6379/1',
+}
+CACHES = {
+    'default': {
+        'BACKEND': _CACHE_BACKENDS[_cache_backend],
+        'LOCATION': config('CACHE_LOCATION', default=_cache_location_defaults[_cache_backend]),
+        'TIMEOUT': config('CACHE_TIMEOUT', default=300, cast=int),
+        'KEY_PREFIX': config('CACHE_KEY_PREFIX', default='widgera'),
+        'OPTIONS': {
+            'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=10000, cast=int),
+        } if _cache_backend != 'redis' else {},
+    }
+}
+
+PROMPT_HISTORY_LIMIT = config('PROMPT_HISTORY_LIMIT', default=5, cast=int)
+PROMPT_HISTORY_CACHE_TIMEOUT = config('PROMPT_HISTORY_CACHE_TIMEOUT', default=60 * 60 * 24, cast=int)
+# rendered playground partials; keys move on with every new execution
+PROMPT_FRAGMENT_CACHE_TIMEOUT = config('PROMPT_FRAGMENT_CACHE_TIMEOUT', default=60 * 10, cast=int)
+# execution status streams (SSE, needs ASGI). local only sees writes made in this process;
+# with several workers use poll (one query per interval per process) or postgres (LISTEN/NOTIFY)
+EXECUTION_EVENTS_BACKEND = config('EXECUTION_EVENTS_BACKEND', default='local')
+EXECUTION_EVENTS_POLL_INTERVAL = config('EXECUTION_EVENTS_POLL_INTERVAL', default=2.0, cast=float)
+EXECUTION_EVENTS_HEARTBEAT_SECONDS = config('EXECUTION_EVENTS_HEARTBEAT_SECONDS', default=15, cast=int)
+EXECUTION_EVENTS_MAX_STREAM_SECONDS = config('EXECUTION_EVENTS_MAX_STREAM_SECONDS', default=300, cast=int)
+EXECUTION_EVENTS_QUEUE_SIZE = config('EXECUTION_EVENTS_QUEUE_SIZE', default=100, cast=int)
+# admin changelists on big tables: estimated/capped counts, keyset pages, index-only search
+ADMIN_PERFORMANCE_MODE = config('ADMIN_PERFORMANCE_MODE', default=True, cast=bool)
+# unfiltered lists use the planner's row estimate once a table is at least this big
+ADMIN_ESTIMATED_COUNT_THRESHOLD = config('ADMIN_ESTIMATED_COUNT_THRESHOLD', default=100000, cast=int)
+# filtered lists count at most this many rows and show "N+"
+ADMIN_COUNT_CAP = config('ADMIN_COUNT_CAP', default=10000, cast=int)
+# digest -> id of interned prompt bodies / field sets: per-process LRU size and entry lifetime
+# (seconds), and shared cache lifetime
+PROMPT_CONTENT_HOT_SIZE = config('PROMPT_CONTENT_HOT_SIZE', default=4096, cast=int)
+PROMPT_CONTENT_HOT_TTL = config('PROMPT_CONTENT_HOT_TTL', default=300, cast=int)
+PROMPT_CONTENT_CACHE_TIMEOUT = config('PROMPT_CONTENT_CACHE_TIMEOUT', default=60 * 60 * 24, cast=int)
+# how long a repeated form submission or Idempotency-Key returns the stored result
+IDEMPOTENCY_KEY_TTL_SECONDS = config('IDEMPOTENCY_KEY_TTL_SECONDS', default=600, cast=int)
+# execution prompt/fields/result payloads past the threshold are stored compressed;
+# zstd needs the zstandard package. COMPRESSION_LEVEL empty uses the codec's default
+COMPRESSION_ALGORITHM = config('COMPRESSION_ALGORITHM', default='zlib')
+COMPRESSION_LEVEL = config('COMPRESSION_LEVEL', default='', cast=lambda value: int(value) if value else None)
+COMPRESSION_THRESHOLD_BYTES = config('COMPRESSION_THRESHOLD_BYTES', default=512, cast=int)
+# pack with the newest dictionary from train_compression_dictionary
+COMPRESSION_DICTIONARIES = config('COMPRESSION_DICTIONARIES', default=False, cast=bool)
+
 #django rest framework and simple jwt settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.users.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -103,27 +177,57 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,
     'AUTH_HEADER_TYPES': ('Bearer',),
+    # tokens carry a password fingerprint so a password change revokes them
+    'CHECK_REVOKE_TOKEN': True,
+    'TOKEN_OBTAIN_SERIALIZER': 'apps.users.serializers.ClaimsTokenObtainPairSerializer',
 }
 
+# seconds a user's active flag and password fingerprint are trusted from the cache;
+# with a per-process (locmem) cache this is how long other workers may miss a change
+JWT_USER_CACHE_TIMEOUT = config('JWT_USER_CACHE_TIMEOUT', default=60, cast=int)
+# read-only endpoints trust the signed token claims instead of loading the user
+JWT_STATELESS_READS = config('JWT_STATELESS_READS', default=True, cast=bool)
+
+# records are queued on the request thread and formatted/written by a listener thread
+LOG_LEVEL = config('LOG_LEVEL', default='INFO')
+LOG_FORMAT = config('LOG_FORMAT', default='json')  # json or text
+# per message template, INFO and below: this many records per window, then sampled out
+LOG_RATE_LIMIT_BURST = config('LOG_RATE_LIMIT_BURST', default=20, cast=int)
+LOG_RATE_LIMIT_PERIOD = config('LOG_RATE_LIMIT_PERIOD', default=60.0, cast=float)
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
     'formatters': {
         'simple': {
-            'format': '{levelname} {asctime} {module} {message}',
+            'format': '{levelname} {asctime} {module} [{correlation_id}] {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'apps.core.log.JsonFormatter',
+        },
+    },
+    'filters': {
+        'correlation_id': {
+            '()': 'apps.core.log.CorrelationIdFilter',
+        },
+        'rate_limit': {
+            '()': 'apps.core.log.RateLimitFilter',
+            'burst': LOG_RATE_LIMIT_BURST,
+            'period': LOG_RATE_LIMIT_PERIOD,
+        },
     },
     'handlers': {
-        'console': {
-            'class': 'logging.StreamHandler',
-            'formatter': 'simple',
+        'queue': {
+            '()': 'apps.core.log.QueueLogHandler',
+            'formatter': 'json' if LOG_FORMAT == 'json' else 'simple',
+            'filters': ['correlation_id', 'rate_limit'],
         },
     },
     'loggers': {
         'apps': {
-            'handlers': ['console'],
-            'level': 'DEBUG',
+            'handlers': ['queue'],
+            'level': LOG_LEVEL,
             'propagate': False,
         },
     },
@@ -131,6 +235,27 @@ LOGGING = {
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
+# new hashes use PASSWORD_HASHER; the rest stay listed so older hashes still verify
+# and are upgraded on the next login. argon2 needs the argon2-cffi package.
+PASSWORD_HASHER_PATHS = {
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'argon2': 'apps.users.hashers.TunedArgon2PasswordHasher',
+    'scrypt': 'apps.users.hashers.TunedScryptPasswordHasher',
+}
+PASSWORD_HASHER = config('PASSWORD_HASHER', default='pbkdf2')
+PASSWORD_HASHERS = [
+    PASSWORD_HASHER_PATHS[PASSWORD_HASHER],
+    *(path for name, path in PASSWORD_HASHER_PATHS.items() if name != PASSWORD_HASHER),
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+ARGON2_TIME_COST = config('ARGON2_TIME_COST', default=2, cast=int)
+ARGON2_MEMORY_COST = config('ARGON2_MEMORY_COST', default=65536, cast=int)  # KiB
+ARGON2_PARALLELISM = config('ARGON2_PARALLELISM', default=2, cast=int)
+SCRYPT_WORK_FACTOR = config('SCRYPT_WORK_FACTOR', default=2**14, cast=int)
+SCRYPT_BLOCK_SIZE = config('SCRYPT_BLOCK_SIZE', default=8, cast=int)
+SCRYPT_PARALLELISM = config('SCRYPT_PARALLELISM', default=1, cast=int)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -179,6 +304,72 @@ LOGOUT_REDIRECT_URL = '/auth/login/'
 OPENAI_API_KEY = config('OPENAI_API_KEY', default='')
 OPENAI_API_BASE = config('OPENAI_API_BASE', default='https://api.openai.com/v1')
 OPENAI_MODEL = config('OPENAI_MODEL', default='gpt-4o-mini')
+# send a per-template prompt_cache_key; disable for OpenAI-compatible APIs that reject it
+OPENAI_PROMPT_CACHE_KEY = config('OPENAI_PROMPT_CACHE_KEY', default=True, cast=bool)
+# strict json_schema response format; set False for APIs that only know json_object
+OPENAI_STRICT_JSON_SCHEMA = config('OPENAI_STRICT_JSON_SCHEMA', default=True, cast=bool)
+# pooled transport shared by all request threads; HTTP/2 is opt-in since it needs
+# the h2 package (pip install "httpx[http2]"), which requirements.txt does not pull in
+OPENAI_HTTP2 = config('OPENAI_HTTP2', default=False, cast=bool)
+OPENAI_MAX_CONNECTIONS = config('OPENAI_MAX_CONNECTIONS', default=50, cast=int)
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = config('OPENAI_MAX_KEEPALIVE_CONNECTIONS', default=20, cast=int)
+OPENAI_KEEPALIVE_EXPIRY = config('OPENAI_KEEPALIVE_EXPIRY', default=60.0, cast=float)
+# wsgi/asgi workers build the OpenAI and S3 clients and connect in the background on their
+# first request, after any fork by a preloading server
+SERVICE_WARMUP = config('SERVICE_WARMUP', default=True, cast=bool)
+# follow-up requests for fields that fail validation
+LLM_REPAIR_ATTEMPTS = config('LLM_REPAIR_ATTEMPTS', default=1, cast=int)
+
+# Token budgets (checked locally before any request is sent)
+# LLM_TOKENIZER: auto (tiktoken when installed), heuristic, tiktoken or a dotted path
+LLM_TOKENIZER = config('LLM_TOKENIZER', default='auto')
+LLM_PROMPT_TOKEN_BUDGET = config('LLM_PROMPT_TOKEN_BUDGET', default=8000, cast=int)
+# per-user overrides as "username:tokens,username:tokens"
+LLM_USER_PROMPT_TOKEN_BUDGETS = dict(
+    item.split(':', 1) for item in config('LLM_USER_PROMPT_TOKEN_BUDGETS', default='', cast=Csv())
+)
+# reject or truncate prompts over budget
+LLM_PROMPT_OVERFLOW = config('LLM_PROMPT_OVERFLOW', default='reject')
+LLM_COMPLETION_TOKENS_BASE = config('LLM_COMPLETION_TOKENS_BASE', default=256, cast=int)
+LLM_COMPLETION_TOKENS_PER_FIELD = config('LLM_COMPLETION_TOKENS_PER_FIELD', default=64, cast=int)
+LLM_MAX_COMPLETION_TOKENS = config('LLM_MAX_COMPLETION_TOKENS', default=4096, cast=int)
+
+# Per-user quotas per fixed window, counted in the database so every worker shares
+# them; 0 means unlimited
+LLM_QUOTA_WINDOW_SECONDS = config('LLM_QUOTA_WINDOW_SECONDS', default=3600, cast=int)
+LLM_QUOTA_REQUESTS = config('LLM_QUOTA_REQUESTS', default=0, cast=int)
+LLM_QUOTA_TOKENS = config('LLM_QUOTA_TOKENS', default=0, cast=int)
+# per-user overrides as "username:requests:tokens,username:requests:tokens"
+LLM_USER_QUOTAS = dict(
+    item.split(':', 1) for item in config('LLM_USER_QUOTAS', default='', cast=Csv())
+)
+
+# Semantic response cache (hashed n-gram embeddings, cosine similarity)
+LLM_SEMANTIC_CACHE_ENABLED = config('LLM_SEMANTIC_CACHE_ENABLED', default=False, cast=bool)
+# a hit returns another request's answer. n-gram similarity barely moves when only the
+# extracted values change (two invoices differing in the total score ~0.98), so hits also
+# need identical numbers, quoted strings and capitalised names; lowering the threshold
+# still risks answers for a differently worded question
+LLM_SEMANTIC_CACHE_THRESHOLD = config('LLM_SEMANTIC_CACHE_THRESHOLD', default=0.92, cast=float)
+# 'user' keeps one index per user, 'global' shares answers between users
+LLM_SEMANTIC_CACHE_SCOPE = config('LLM_SEMANTIC_CACHE_SCOPE', default='user')
+# index files; workers sharing it merge on flush, but a racing flush can drop the other
+# worker's newest entries until that worker flushes again
+LLM_SEMANTIC_CACHE_DIR = config('LLM_SEMANTIC_CACHE_DIR', default=str(BASE_DIR / '.cache' / 'semantic'))
+# entries per shared index and per user index; about 4 KB each at the default dim
+LLM_SEMANTIC_CACHE_MAX_ENTRIES = config('LLM_SEMANTIC_CACHE_MAX_ENTRIES', default=5000, cast=int)
+LLM_SEMANTIC_CACHE_MAX_USER_ENTRIES = config('LLM_SEMANTIC_CACHE_MAX_USER_ENTRIES', default=200, cast=int)
+# indexes held in memory per process (least recently used are dropped) and files kept on disk
+LLM_SEMANTIC_CACHE_MAX_INDEXES = config('LLM_SEMANTIC_CACHE_MAX_INDEXES', default=64, cast=int)
+LLM_SEMANTIC_CACHE_MAX_FILES = config('LLM_SEMANTIC_CACHE_MAX_FILES', default=2000, cast=int)
+LLM_SEMANTIC_CACHE_FLUSH_EVERY = config('LLM_SEMANTIC_CACHE_FLUSH_EVERY', default=20, cast=int)
+
+# Replays of past executions (manage.py replay_executions)
+REPLAY_DIR = config('REPLAY_DIR', default=str(BASE_DIR / '.cache' / 'replay'))
+# USD per million tokens as "model:input:output,model:input:output"
+LLM_MODEL_PRICES = dict(
+    item.split(':', 1) for item in config('LLM_MODEL_PRICES', default='', cast=Csv())
+)
 
 # AWS / S3 storage configuration
 USE_S3 = config('USE_S3', default=False, cast=bool)
@@ -186,3 +377,5 @@ AWS_ACCESS_KEY_ID = config('AWS_ACCESS_KEY_ID', default='')
 AWS_SECRET_ACCESS_KEY = config('AWS_SECRET_ACCESS_KEY', default='')
 AWS_STORAGE_BUCKET_NAME = config('AWS_STORAGE_BUCKET_NAME', default='')
 AWS_S3_REGION_NAME = config('AWS_S3_REGION_NAME', default='us-east-1')
+AWS_S3_MAX_POOL_CONNECTIONS = config('AWS_S3_MAX_POOL_CONNECTIONS', default=20, cast=int)
+AWS_S3_TCP_KEEPALIVE = config('AWS_S3_TCP_KEEPALIVE', default=True, cast=bool)
@@ -22,8 +22,10 @@ from django.urls import include, path
 urlpatterns = [
     path('', include('apps.prompts.urls', namespace='prompts')),
     path('auth/', include(('apps.users.web_urls', 'users_web'), namespace='users_web')),
+    path('_profiles/', include('apps.core.urls', namespace='core')),
     path('admin/', admin.site.urls),
     path('api/users/', include('apps.users.urls')),
+    path('api/prompts/', include('apps.prompts.api_urls')),
 ]
 
 if settings.DEBUG: